@@ -5,14 +5,426 @@ Created on Tue Nov  3 16:25:45 2020
 
 @author: luana and Widmark
 """
+import itertools
+import os
+import time
 import numpy as np
+
+try:
+    import scipy.linalg as scipyLinalg
+except ImportError:
+    scipyLinalg = None
+#%%
+############################Tabelas de Butcher e passo genérico#############################
+
+class Tableau:
+    """
+    Tabela de Butcher de um método de Runge-Kutta explícito.
+
+    Parameters
+    ----------
+    nome : String
+        Nome do método.
+    A : Array
+        Matriz (s, s) estritamente triangular inferior com os coeficientes dos estágios.
+    b : Array
+        Pesos do método propagado.
+    c : Array
+        Nós dos estágios.
+    ordem : Int
+        Ordem do método propagado.
+    bErro : Array, optional
+        Pesos do método embutido, usados para estimar o erro local. The default is None.
+    ordemErro : Int, optional
+        Ordem do método embutido. The default is None.
+
+    """
+    def __init__(self, nome, A, b, c, ordem, bErro = None, ordemErro = None):
+        self.nome = nome
+        self.A = np.array(A, dtype = np.float64)
+        self.b = np.array(b, dtype = np.float64)
+        self.c = np.array(c, dtype = np.float64)
+        self.s = len(self.b) #número de estágios
+        self.ordem = ordem
+        self.ordemErro = ordemErro
+        self.bErro = None if bErro is None else np.array(bErro, dtype = np.float64)
+        self.adaptativo = self.bErro is not None
+
+        #FSAL: o último estágio é avaliado no próprio ponto y(n+1), então vale f(t+h, y(n+1))
+        self.fsal = self.c[-1] == 1 and np.array_equal(self.A[-1], self.b)
+
+        #Apenas os coeficientes não nulos entram no laço interno
+        self.coefA = [[(j, a) for j, a in enumerate(self.A[i, :i]) if a != 0] for i in range(self.s)]
+        self.coefB = [(j, bj) for j, bj in enumerate(self.b) if bj != 0]
+        if self.adaptativo:
+            self.coefErro = [(j, d) for j, d in enumerate(self.b - self.bErro) if d != 0]
+
+    def __repr__(self):
+        return "Tableau(%s)" % self.nome
+
+class PassoRK:
+    """
+    Executa passos de um Tableau reutilizando buffers pré-alocados.
+    Os estágios e as combinações lineares são calculados em arrays float64 fixos,
+    com np.multiply/np.add usando "out=", sem criar temporários a cada passo.
+
+    Parameters
+    ----------
+    tableau : Tableau
+        Método utilizado.
+    shape : Tuple
+        Forma do estado: () para uma EDO, (n,) para um sistema ou (M, n) para um lote.
+
+    """
+    def __init__(self, tableau, shape):
+        self.tableau = tableau
+        self.K = np.zeros((tableau.s,) + tuple(shape), dtype = np.float64) #estágios
+        self.yEstagio = np.zeros(shape, dtype = np.float64) #argumento de cada estágio
+        self.aux = np.zeros(shape, dtype = np.float64) #produto a*h*K
+        self.erro = np.zeros(shape, dtype = np.float64) #estimativa do erro local
+
+    def _combina(self, y, h, coeficientes, out):
+        """
+        out = y + h*sum(a_j*K_j), em que coeficientes é uma lista de pares (j, a_j).
+        """
+        np.copyto(out, y)
+        for j, a in coeficientes:
+            np.multiply(self.K[j], a*h, out = self.aux)
+            np.add(out, self.aux, out = out)
+        return out
+
+    def estagios(self, f, t, y, h, dy = None):
+        """
+        Calcula todos os estágios K do passo de t a t+h. Se dy = f(t, y) já for conhecido,
+        ele é usado como primeiro estágio.
+        """
+        tab = self.tableau
+        self.K[0] = f(t, y) if dy is None else dy
+        for i in range(1, tab.s):
+            self._combina(y, h, tab.coefA[i], self.yEstagio)
+            self.K[i] = f(t + tab.c[i]*h, self.yEstagio)
+        return self.K
+
+    def passo(self, f, t, y, h, out, dy = None):
+        """
+        Avança de t a t+h e escreve y(t+h) em out.
+        """
+        self.estagios(f, t, y, h, dy)
+        return self._combina(y, h, self.tableau.coefB, out)
+
+    def estimaErro(self, h):
+        """
+        Diferença entre o método propagado e o embutido, h*sum((b_j - bErro_j)*K_j),
+        calculada a partir dos estágios do último passo.
+        """
+        self.erro.fill(0)
+        return self._combina(self.erro, h, self.tableau.coefErro, self.erro)
+
+EULER = Tableau("Euler", [[0]], [1], [0], ordem = 1)
+
+HEUN = Tableau("Heun", [[0, 0],
+                        [1, 0]],
+               [1/2, 1/2], [0, 1], ordem = 2)
+
+RK4 = Tableau("Runge-Kutta", [[0, 0, 0, 0],
+                              [1/2, 0, 0, 0],
+                              [0, 1/2, 0, 0],
+                              [0, 0, 1, 0]],
+              [1/6, 1/3, 1/3, 1/6], [0, 1/2, 1/2, 1], ordem = 4)
+
+RKF45 = Tableau("Runge-Kutta-Fehlberg", [[0, 0, 0, 0, 0, 0],
+                                          [1/4, 0, 0, 0, 0, 0],
+                                          [3/32, 9/32, 0, 0, 0, 0],
+                                          [1932/2197, -7200/2197, 7296/2197, 0, 0, 0],
+                                          [439/216, -8, 3680/513, -845/4104, 0, 0],
+                                          [-8/27, 2, -3544/2565, 1859/4104, -11/40, 0]],
+                [16/135, 0, 6656/12825, 28561/56430, -9/50, 2/55],
+                [0, 1/4, 3/8, 12/13, 1, 1/2], ordem = 5,
+                bErro = [25/216, 0, 1408/2565, 2197/4104, -1/5, 0], ordemErro = 4)
+
+DOPRI54 = Tableau("Dormand-Prince", [[0, 0, 0, 0, 0, 0, 0],
+                                     [1/5, 0, 0, 0, 0, 0, 0],
+                                     [3/40, 9/40, 0, 0, 0, 0, 0],
+                                     [44/45, -56/15, 32/9, 0, 0, 0, 0],
+                                     [19372/6561, -25360/2187, 64448/6561, -212/729, 0, 0, 0],
+                                     [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656, 0, 0],
+                                     [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0]],
+                  [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0],
+                  [0, 1/5, 3/10, 4/5, 8/9, 1, 1], ordem = 5,
+                  bErro = [5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40], ordemErro = 4)
+
+CASH_KARP = Tableau("Cash-Karp", [[0, 0, 0, 0, 0, 0],
+                                  [1/5, 0, 0, 0, 0, 0],
+                                  [3/40, 9/40, 0, 0, 0, 0],
+                                  [3/10, -9/10, 6/5, 0, 0, 0],
+                                  [-11/54, 5/2, -70/27, 35/27, 0, 0],
+                                  [1631/55296, 175/512, 575/13824, 44275/110592, 253/4096, 0]],
+                    [37/378, 0, 250/621, 125/594, 0, 512/1771],
+                    [0, 1/5, 3/10, 3/5, 1, 7/8], ordem = 5,
+                    bErro = [2825/27648, 0, 18575/48384, 13525/55296, 277/14336, 1/4], ordemErro = 4)
+
+BS32 = Tableau("Bogacki-Shampine", [[0, 0, 0, 0],
+                                    [1/2, 0, 0, 0],
+                                    [0, 3/4, 0, 0],
+                                    [2/9, 1/3, 4/9, 0]],
+               [2/9, 1/3, 4/9, 0], [0, 1/2, 3/4, 1], ordem = 3,
+               bErro = [7/24, 1/4, 1/3, 1/8], ordemErro = 2)
+
+#Métodos disponíveis, indexados pelo nome
+TABLEAUS = {tab.nome: tab for tab in (EULER, HEUN, RK4, RKF45, DOPRI54, CASH_KARP, BS32)}
+
+class Estatisticas:
+    """
+    Contadores de uma integração: avaliações de f, passos aceitos e rejeitados, histograma
+    do passo h e divisão do tempo entre f e o restante do laço (o "overhead" do método).
+    O mesmo objeto pode ser passado a várias integrações, que acumulam nele.
+
+    Parameters
+    ----------
+    divisoes : Int, optional
+        Classes do histograma por década de h, entre 1E-16 e 1E4. The default is 4.
+
+    """
+    DECADAS = (-16, 4)
+
+    def __init__(self, divisoes = 4):
+        self.divisoes = divisoes
+        self.avaliacoes = 0
+        self.aceitos = 0
+        self.rejeitados = 0
+        self.hMin = np.inf
+        self.hMax = 0.0
+        self.contagens = np.zeros((self.DECADAS[1] - self.DECADAS[0])*divisoes, dtype = np.int64)
+        self.tempoF = 0.0 #segundos dentro de f
+        self.tempoTotal = 0.0 #segundos dentro do integrador, incluindo f
+        self.jacobianos = 0 #apenas nos métodos implícitos
+        self.fatoracoes = 0
+
+    @property
+    def tempoPasso(self):
+        """
+        Tempo gasto fora de f: combinações dos estágios, controle do passo, eventos e instrumentação.
+        """
+        return self.tempoTotal - self.tempoF
+
+    def envolve(self, f):
+        """
+        Retorna f envolvida por um contador de avaliações e um cronômetro.
+        """
+        relogio = time.perf_counter
+
+        def fContada(*args):
+            inicio = relogio()
+            resultado = f(*args)
+            self.tempoF += relogio() - inicio
+            self.avaliacoes += 1
+            return resultado
+
+        return fContada
+
+    def registraPasso(self, h):
+        """
+        Registra um ou vários (array) passos aceitos de tamanho h.
+        """
+        h = np.abs(np.atleast_1d(np.asarray(h, dtype = np.float64)))
+        if h.size == 0:
+            return
+        self.aceitos += h.size
+        self.hMin = min(self.hMin, float(h.min()))
+        self.hMax = max(self.hMax, float(h.max()))
+        classe = np.floor((np.log10(np.maximum(h, 1E-300)) - self.DECADAS[0])*self.divisoes)
+        classe = np.clip(classe, 0, len(self.contagens) - 1).astype(np.int64)
+        self.contagens += np.bincount(classe, minlength = len(self.contagens))
+
+    def registraRejeicao(self, h):
+        """
+        Registra uma ou várias (array) tentativas rejeitadas com passo h.
+        """
+        self.rejeitados += np.size(h)
+
+    def histograma(self):
+        """
+        Retorna (bordas, contagens) do histograma de h, cortado nas classes ocupadas.
+        As bordas estão em segundos, com len(bordas) = len(contagens) + 1.
+        """
+        bordas = 10.0**(self.DECADAS[0] + np.arange(len(self.contagens) + 1)/self.divisoes)
+        ocupadas = np.nonzero(self.contagens)[0]
+        if ocupadas.size == 0:
+            return bordas[:1], self.contagens[:0]
+        a, b = ocupadas[0], ocupadas[-1] + 1
+        return bordas[a:b+1], self.contagens[a:b]
+
+    def resumo(self):
+        """
+        Dicionário com os contadores e os tempos, pronto para gravar em JSON.
+        """
+        return {"avaliacoes": self.avaliacoes, "aceitos": self.aceitos, "rejeitados": self.rejeitados,
+                "hMin": self.hMin if self.aceitos else None, "hMax": self.hMax if self.aceitos else None,
+                "tempoF": self.tempoF, "tempoPasso": self.tempoPasso, "tempoTotal": self.tempoTotal,
+                "jacobianos": self.jacobianos, "fatoracoes": self.fatoracoes}
+
+    def __repr__(self):
+        return ("Estatisticas(avaliacoes=%d, aceitos=%d, rejeitados=%d, hMin=%.3g, hMax=%.3g, tempoF=%.3gs, tempoPasso=%.3gs)"
+                % (self.avaliacoes, self.aceitos, self.rejeitados, self.hMin, self.hMax, self.tempoF, self.tempoPasso))
+
+def _instrumenta(passos, stats = None, callback = None):
+    """
+    Repassa os passos (t, y, dy, h) de um gerador medindo o tempo gasto dentro dele,
+    registrando os passos aceitos em stats e chamando callback(t, y, dy, h) a cada passo.
+    Sem stats e sem callback, retorna o próprio gerador.
+    """
+    if stats is None and callback is None:
+        return passos
+    return _instrumentaPassos(passos, stats, callback)
+
+def _instrumentaPassos(passos, stats, callback):
+    relogio = time.perf_counter
+    while (True):
+        inicio = relogio()
+        try:
+            item = next(passos)
+        except StopIteration:
+            return
+        finally:
+            if stats is not None:
+                stats.tempoTotal += relogio() - inicio
+        if stats is not None and item[3] != 0:
+            stats.registraPasso(item[3])
+        if callback is not None:
+            callback(*item)
+        yield item
+
+def _passosFixos(f, r0, t0, h, tableau, NUMBER_OF_STEPS = None, stats = None, n0 = 0):
+    """
+    Gerador com o laço de passo fixo. Produz (t, y, dy, h) para o ponto inicial (h = 0)
+    e para cada passo, em que dy = f(t, y). y e dy são buffers do gerador: quem consome
+    deve copiá-los. Sem NUMBER_OF_STEPS, a integração continua indefinidamente.
+    Se stats for dado, as avaliações de f são contadas nele.
+
+    O tempo é calculado como t0 + n*h, sem acumular o erro de arredondamento das somas.
+    Para retomar uma integração a partir do seu n0-ésimo ponto r0, passe o t0 original e n0.
+    """
+    if stats is not None:
+        f = stats.envolve(f)
+    y = np.array(r0, dtype = np.float64) #estado corrente em precisão dupla
+    yNovo = np.empty_like(y)
+    passo = PassoRK(tableau, y.shape)
+
+    t0 = float(t0)
+    t = t0 + n0*h
+    dy = np.array(f(t, y), dtype = np.float64)
+    yield t, y, dy, 0.0
+
+    n = 1
+    while (NUMBER_OF_STEPS is None or n < NUMBER_OF_STEPS):
+        passo.passo(f, t, y, h, yNovo, dy)
+        y, yNovo = yNovo, y
+        t = t0 + (n0 + n)*h
+        #f(t, y) no novo ponto: sai de graça nos métodos FSAL e é o primeiro estágio do próximo passo
+        dy = passo.K[-1] if tableau.fsal else np.asarray(f(t, y), dtype = np.float64)
+        yield t, y, dy, h
+        n += 1
+
+def odeTableau(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01, tableau = RK4, stats = None, callback = None, dtype = np.float32):
+    """
+    Resolve EDOs de primeira ordem por um método de Runge-Kutta explícito de passo fixo.
+
+    Parameters
+    ----------
+    f : Function
+        EDO na forma padrão "y' = f(t, y)".
+    y0 : Float
+        Valor da função para o P.V.I.
+    t0 : Float
+        Ponto inicial em que a função é conhecida.
+    NUMBER_OF_STEPS : Int, optional
+        Número de passos executados pelo método. The default is 100.
+    h : Float, optional
+        Passo em que o vetor t é atualizado. The default is 0.01.
+    tableau : Tableau, optional
+        Tabela de Butcher do método. The default is RK4.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Vetor com valores da abcissa.
+    y : Array
+        Vetor com as imagens correspondentes de t.
+
+    """
+    return odeTableauSys(f, y0, t0, NUMBER_OF_STEPS, h, tableau, stats = stats, callback = callback, dtype = dtype)
+
+def odeTableauSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01, tableau = RK4, saida = None, stats = None, callback = None, dtype = np.float32):
+    """
+    Resolve sistema de EDOs de primeira ordem por um método de Runge-Kutta explícito de passo fixo.
+    Os parâmetros stats, callback e dtype descritos aqui valem para os demais integradores
+    do módulo, que remetem a esta descrição.
+
+    Parameters
+    ----------
+    f :  Function
+        EDOs escritas na forma padrão "r' =  f(t,r)", em que r é um vetor com "n" EDOs do sistema.
+    r0 : Array
+        Condições de contorno para as "n" equações. Também aceita um escalar (uma EDO)
+        ou uma matriz (M, n) (lote de trajetórias).
+    t0 : Float
+        Ponto inicial em que as funções são conhecidas.
+    NUMBER_OF_STEPS : Int, optional
+         Número de passos executados pelo método. The default is 100.
+    h : Float, optional
+        Passo em que o vetor t é atualizado. The default is 0.01.
+    tableau : Tableau, optional
+        Tabela de Butcher do método. The default is RK4.
+    saida : GravadorTrajetoria, optional
+        Se dado, a trajetória é gravada em disco em vez de ficar na memória. The default is None.
+    stats : Estatisticas, optional
+        Se dado, acumula as avaliações de f, os passos aceitos e rejeitados, o histograma
+        de h e os tempos da integração. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h), chamada no ponto inicial (h = 0) e a cada passo aceito, com
+        dy = f(t, y). y e dy são buffers reaproveitados: copie-os para guardar. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados. O estado é sempre integrado em float64 e o tempo não
+        acumula arredondamento, então float32 apenas reduz a memória pela metade.
+        The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Vetor com valores da abcissa.
+    r : Array
+        Matriz (NUMBER_OF_STEPS,) + forma de r0 com as imagens correspondentes de t.
+        Se saida for dado, retorna apenas o GravadorTrajetoria, já fechado.
+
+    """
+    shape = np.shape(r0)
+    passos = _instrumenta(_passosFixos(f, r0, t0, h, tableau, NUMBER_OF_STEPS, stats), stats, callback)
+
+    if saida is not None:
+        return saida.grava(passos, shape, NUMBER_OF_STEPS)
+
+    r = np.zeros((NUMBER_OF_STEPS,) + shape, dtype = dtype)
+    t = np.zeros(NUMBER_OF_STEPS, dtype = dtype)
+
+    for n, (tn, y, dy, hn) in enumerate(passos):
+        t[n] = tn
+        r[n] = y
+
+    return t, r
+
 #%%
 ############################Métodos de Resolução de EDOs####################################
 
 """
 Implementação do método de Euler    
 """
-def odeEuler(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01):
+def odeEuler(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01, stats = None, callback = None, dtype = np.float32):
     """
     Resolve EDOs de primeira ordem pelo método de Euler.
     
@@ -28,6 +440,12 @@ def odeEuler(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01):
         Número de passos executados pelo método. The default is 100.
     h : Float, optional
         Passo em que o vetor t é atualizado. The default is 0.01.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
 
     Returns
     -------
@@ -37,21 +455,9 @@ def odeEuler(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01):
         Vetor com as imagens correspondentes de t.
 
     """
-    y = np.zeros(NUMBER_OF_STEPS, dtype = np.float32)
-    t = np.zeros(NUMBER_OF_STEPS, dtype = np.float32)
-    
-    #Passandos as condições de contorno
-    y[0] = y0
-    t[0] = t0
-
-    for n in range(0, NUMBER_OF_STEPS-1):
-        k1 = f(t[n], y[n])
-        y[n+1] = y[n] + k1*h
-        t[n+1] = t[n]+h
-        
-    return t, y
+    return odeTableau(f, y0, t0, NUMBER_OF_STEPS, h, EULER, stats, callback, dtype = dtype)
 
-def odeEulerSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01):
+def odeEulerSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01, saida = None, stats = None, callback = None, dtype = np.float32):
     """
     Resolve sistema de EDOs de primeira ordem pelo método de Euler.
 
@@ -67,6 +473,14 @@ def odeEulerSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01):
          Número de passos executados pelo método. The default is 100.
     h : Float, optional
         Passo em que o vetor t é atualizado. The default is 0.01.
+    saida : GravadorTrajetoria, optional
+        Se dado, a trajetória é gravada em disco em vez de ficar na memória. The default is None.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
 
     Returns
     -------
@@ -74,29 +488,16 @@ def odeEulerSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01):
         Vetor com valores da abcissa.
     r : Array
         Vetor com as imagens correspondentes de t para cada função.
+        Se saida for dado, retorna apenas o GravadorTrajetoria, já fechado.
 
     """
-    NUMBER_OF_EQUATIONS =  len(r0) #verificando o número de equações diferenciais
-    
-   #matriz com as funções x, y, z ...
-    r = np.zeros([NUMBER_OF_STEPS, NUMBER_OF_EQUATIONS], dtype = np.float32) 
-    t = np.zeros(NUMBER_OF_STEPS, dtype = np.float32) #vetor com valores de tempo
-    
-    r[0] = r0 #passando as condições de contorno para a linha zero da matriz de funções
-    t[0] = t0 #passando a condição de contorno para o vetor de tempo
-
-    for n in range(0, NUMBER_OF_STEPS-1):
-       t[n+1] = t[n]+h #Atualiza o vetor de tempo de acordo com o passo
-       K1 = f(t[n], r[n]) #retorna k1x, k1y, k1z,... dentro de um vetor K
-       r[n+1] = r[n] + K1*h #armazena os novos valores das funções na próxima linha da matriz
-       
-    return t, r
+    return odeTableauSys(f, r0, t0, NUMBER_OF_STEPS, h, EULER, saida, stats, callback, dtype = dtype)
 
 """
 Implementação do método de Euler melhorado, ou método de Heun    
 """
 
-def odeHeun(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01):
+def odeHeun(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01, stats = None, callback = None, dtype = np.float32):
     """
     Resolve EDOs de primeira ordem pelo método de Euler melhorado ou método de Heun.
     
@@ -112,6 +513,12 @@ def odeHeun(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01):
         Número de passos executados pelo método. The default is 100.
     h : Float, optional
         Passo em que o vetor t é atualizado. The default is 0.01.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
 
     Returns
     -------
@@ -121,23 +528,9 @@ def odeHeun(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01):
         Vetor com as imagens correspondentes de t.
 
     """
-    y = np.zeros(NUMBER_OF_STEPS, dtype = np.float32)
-    t = np.zeros(NUMBER_OF_STEPS, dtype = np.float32)
-    
-    #Passandos as condições de contorno
-    y[0] = y0
-    t[0] = t0
+    return odeTableau(f, y0, t0, NUMBER_OF_STEPS, h, HEUN, stats, callback, dtype = dtype)
 
-    for n in range(0, NUMBER_OF_STEPS-1):
-        t[n+1] = t[n]+h
-        k1 = f(t[n], y[n])
-        k2 = f(t[n+1], y[n] + k1*h)
-        y[n+1] = y[n] + 0.5*(k1+k2)*h
-        
-    return t, y
-
-
-def odeHeunSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01):
+def odeHeunSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01, saida = None, stats = None, callback = None, dtype = np.float32):
     """
     Resolve sistema de EDOs de primeira ordem pelo método de Euler melhorado ou método de Heun.
 
@@ -153,6 +546,14 @@ def odeHeunSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01):
          Número de passos executados pelo método. The default is 100.
     h : Float, optional
         Passo em que o vetor t é atualizado. The default is 0.01.
+    saida : GravadorTrajetoria, optional
+        Se dado, a trajetória é gravada em disco em vez de ficar na memória. The default is None.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
 
     Returns
     -------
@@ -160,31 +561,15 @@ def odeHeunSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01):
         Vetor com valores da abcissa.
     r : Array
         Vetor com as imagens correspondentes de t para cada função.
+        Se saida for dado, retorna apenas o GravadorTrajetoria, já fechado.
 
     """
-    NUMBER_OF_EQUATIONS =  len(r0) #verificando o número de equações diferenciais
-    
-    #matriz com as funções x, y, z ...
-    r = np.zeros([NUMBER_OF_STEPS, NUMBER_OF_EQUATIONS], dtype = np.float32) 
-    t = np.zeros(NUMBER_OF_STEPS, dtype = np.float32) #vetor com valores de tempo
-    
-
-    
-    r[0] = r0 #passando as condições de contorno para a linha zero da matriz de funções
-    t[0] = t0 #passando a condição de contorno para o vetor de tempo
-
-    for n in range(0, NUMBER_OF_STEPS-1):
-        t[n+1] = t[n]+h #Atualiza o vetor de tempo de acordo com o passo
-        K1 = f(t[n], r[n]) #retorna k1x, k1y, k1z,... dentro de um vetor K1
-        K2 = f(t[n+1], r[n] + K1*h) #retorna k2x, k2y, k2z, ... dentro de vetor K2
-        r[n+1] = r[n] +0.5*(K1 + K2)*h #armazena os novos valores das funções na próxima linha da matriz
-        
-    return t, r
+    return odeTableauSys(f, r0, t0, NUMBER_OF_STEPS, h, HEUN, saida, stats, callback, dtype = dtype)
 
 """
 Implementação do método de Runge-Kutta    
 """
-def odeRunge_Kutta(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01):
+def odeRunge_Kutta(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01, stats = None, callback = None, dtype = np.float32):
     """
     Resolve EDOs de primeira ordem pelo método de Runge-Kutta de quarta ordem ou método de clássico de Runge-Kutta.
     
@@ -200,6 +585,12 @@ def odeRunge_Kutta(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01):
         Número de passos executados pelo método. The default is 100.
     h : Float, optional
         Passo em que o vetor t é atualizado. The default is 0.01.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
 
     Returns
     -------
@@ -209,24 +600,9 @@ def odeRunge_Kutta(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01):
         Vetor com as imagens correspondentes de t.
 
     """
-    y = np.zeros(NUMBER_OF_STEPS, dtype = np.float32)
-    t = np.zeros(NUMBER_OF_STEPS, dtype = np.float32)
-    
-    #Passandos as condições de contorno
-    y[0] = y0
-    t[0] = t0
-
-    for n in range(0, NUMBER_OF_STEPS-1):
-        t[n+1] = t[n] + h
-        k1 = f(t[n], y[n])
-        k2 = f(t[n] + 0.5*h , y[n] + 0.5*k1*h)
-        k3 = f(t[n] + 0.5*h , y[n] + 0.5*k2*h)
-        k4 = f(t[n+1], y[n] + k3*h)
-        y[n+1] = y[n] + (k1 + 2*k2 + 2*k3 + k4)*(h/6)
-        
-    return t, y
-
-def odeRunge_KuttaSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01):
+    return odeTableau(f, y0, t0, NUMBER_OF_STEPS, h, RK4, stats, callback, dtype = dtype)
+
+def odeRunge_KuttaSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01, saida = None, stats = None, callback = None, dtype = np.float32):
     """
     Resolve sistema de EDOs de primeira ordem pelo método de Runge-Kutta de quarta ordem.
     Parameters
@@ -241,6 +617,14 @@ def odeRunge_KuttaSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01):
          Número de passos executados pelo método. The default is 100.
     h : Float, optional
         Passo em que o vetor t é atualizado. The default is 0.01.
+    saida : GravadorTrajetoria, optional
+        Se dado, a trajetória é gravada em disco em vez de ficar na memória. The default is None.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
 
     Returns
     -------
@@ -248,33 +632,16 @@ def odeRunge_KuttaSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01):
         Vetor com valores da abcissa.
     r : Array
         Vetor com as imagens correspondentes de t para cada função.
+        Se saida for dado, retorna apenas o GravadorTrajetoria, já fechado.
 
     """
-    NUMBER_OF_EQUATIONS =  len(r0) #verificando o número de equações diferenciais
-    
-    #matriz com as funções x, y, z ...
-    r = np.zeros([NUMBER_OF_STEPS, NUMBER_OF_EQUATIONS], dtype = np.float32) 
-    t = np.zeros(NUMBER_OF_STEPS, dtype = np.float32) #vetor com valores de tempo
-    
-
-    
-    r[0] = r0 #passando as condições de contorno para a linha zero da matriz de funções
-    t[0] = t0 #passando a condição de contorno para o vetor de tempo
-
-    for n in range(0, NUMBER_OF_STEPS-1):
-        t[n+1] = t[n]+h #Atualiza o vetor de tempo de acordo com o passo
-        K1 = f(t[n], r[n]) #retorna k1x, k1y, k1z,... dentro de um vetor K1
-        K2 = f(t[n] + 0.5*h, r[n] + 0.5*K1*h) #retorna k2x, k2y, k2z, ... dentro de vetor K2
-        K3 = f(t[n] + 0.5*h, r[n] + 0.5*K2*h) #retorna k3x, k3y, k3z,... dentro de um vetor K3
-        K4 = f(t[n+1], r[n] + K3*h) #retorna k4x, k4y, k4z, ... dentro de vetor K4
-        r[n+1] = r[n] + (K1 + 2*K2 + 2*K3 + K4)*(h/6) #armazena os novos valores das funções na próxima linha da matriz
-        
-    return t, r
+    return odeTableauSys(f, r0, t0, NUMBER_OF_STEPS, h, RK4, saida, stats, callback, dtype = dtype)
 
 """
 Implementação do método de Runge-Kutta-Fehlberg    
 """
-def odeRunge_Kutta_Fehlberg(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01, alpha = 0.9, e = 1E-3):
+def odeRunge_Kutta_Fehlberg(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01, alpha = 0.9, e = 1E-3, tableau = RKF45,
+                            stats = None, callback = None, dtype = np.float32, controlador = None):
     """
      Resolve EDOs de primeira ordem pelo método de Runge-Kutta-Fehlberg.
      Método adaptativo que consiste em máximizar h de acordo com o comportamento da solução
@@ -296,6 +663,18 @@ def odeRunge_Kutta_Fehlberg(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01, alpha = 0.
         Magnitude na qual q deve ser menor que uma dada expressão para que h seja adpatado.
     e: Float, optional
         Tolerância máxima de erro admissível para um determinado passo.
+    tableau : Tableau, optional
+        Par embutido usado no passo e na estimativa do erro. The default is RKF45.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
+    controlador : ControladorPI, optional
+        Controle do passo pela norma RMS com rtol/atol por componente e realimentação PI.
+        Se dado, alpha e e são ignorados. Com h = None, o primeiro passo é estimado
+        automaticamente. The default is None.
 
     Returns
     -------
@@ -303,63 +682,14 @@ def odeRunge_Kutta_Fehlberg(f, y0, t0, NUMBER_OF_STEPS = 100, h=0.01, alpha = 0.
         Vetor com valores da abcissa.
     y : Array
         Vetor com as imagens correspondentes de t.
+    H : Array
+        Passo aceito que levou a cada ponto (H[0] = 0), já depois das rejeições.
 
     """
-    y = np.zeros(NUMBER_OF_STEPS, dtype = np.float32) #vetor para a função de 4º ordem
-    t = np.zeros(NUMBER_OF_STEPS, dtype = np.float32) #passo de tempo
-    H = np.zeros(NUMBER_OF_STEPS, dtype = np.float32) #variável auxiliar para monitorar variável h
-    
-    #Passandos as condições de contorno
-    y[0] = y0
-    t[0] = t0
-
+    return _odeRKF(f, y0, t0, NUMBER_OF_STEPS, h, alpha, e, tableau, stats, callback, dtype, controlador)
 
-    for n in range(0, NUMBER_OF_STEPS - 1):
-        H[n] = h
-        
-        while (True):
-            #Cálculos dos parâmetros Ks
-            k1 = f(t[n], y[n])
-            k2 = f(t[n] + h/4, y[n] + (k1/4)*h)
-            k3 = f(t[n] + (3/8)*h , y[n] + h*((3*k1 + 9*k2)/32))
-            k4 = f(t[n] + (12/13)*h, y[n] + h*((1932*k1 - 7200*k2 + 7296*k3)/2197))
-            k5 = f(t[n] + h, y[n] + h*((439/216)*k1 - 8*k2 + (3680/513)*k3 - (845/4104)*k4))
-            k6 = f(t[n] + 0.5*h, y[n] + h*(-(8/27)*k1 + 2*k2 - (3544/2565)*k3 + (1859/4104)*k4 - (11/40)*k5))
-            
-            #Cálculando o valor das funções no tempo n+1
-            y5 = y[n] + ((16/135)*k1 + (6656/12825)*k3 + (28561/56430)*k4 - (9/50)*k5 + (2/55)*k6)*h #Runge-Kutta de 5º ordem
-        
-            y4 = y[n] + ((25/216)*k1 + (1408/2565)*k3 + (2197/4104)*k4 - (1/5)*k5)*h #Runge-Kutta de 4º ordem
-            
-              
-            #Verificando se o erro está dentro da tolerância
-            Num = e*h
-               
-            Den = abs(y4 - y5)
-            
-            if (Den != 0):
-                q = alpha*((Num/Den)**(1/4)) #Problema: O valor não está sendo atualizado corretamente
-                
-                if (q < 1):
-                    h = q*h  #diminui o passo h para uma fração de h que esteja dentro da tolerância.
-
-                else:
-                    break
-            else:
-             break
-        
-        y[n+1] = y5 #Atualiza a função.
-        
-        t[n+1] = t[n] + h #Atualização do vetor de tempo.
-        
-        if (Den !=0): #verifica se o q foi calculado
-            h = q*h #aumenta o passso h para o próximo passo
-        
-        H[n] = h
-        
-    return t, y, H
-
-def odeRunge_Kutta_FehlbergSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01, alpha = 0.9, e = 1E-3):
+def odeRunge_Kutta_FehlbergSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01, alpha = 0.9, e = 1E-3, tableau = RKF45,
+                               stats = None, callback = None, dtype = np.float32, controlador = None):
     """
      Resolve Sistema de EDOs de primeira ordem pelo método de Runge-Kutta-Fehlberg.
      Método adaptativo que consiste em máximizar h de acordo com o comportamento da solução
@@ -381,6 +711,18 @@ def odeRunge_Kutta_FehlbergSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01, alpha =
         Magnitude na qual q deve ser menor que uma dada expressão para que h seja adpatado.
     e: Float, optional
         Tolerância máxima de erro admissível para um determinado passo.
+    tableau : Tableau, optional
+        Par embutido usado no passo e na estimativa do erro. The default is RKF45.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
+    controlador : ControladorPI, optional
+        Controle do passo pela norma RMS com rtol/atol por componente e realimentação PI.
+        Se dado, alpha e e são ignorados. Com h = None, o primeiro passo é estimado
+        automaticamente. The default is None.
 
     Returns
     -------
@@ -388,79 +730,1505 @@ def odeRunge_Kutta_FehlbergSys(f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01, alpha =
         Vetor com valores da abcissa.
     y : Array
         Vetor com as imagens correspondentes de t.
+    H : Array
+        Passo aceito que levou a cada ponto (H[0] = 0), já depois das rejeições.
 
     """
-    NUMBER_OF_EQUATIONS =  len(r0) #verificando o número de equações diferenciais
-    
-    
-    #matriz com as funções x, y, z ...
-    r = np.zeros([NUMBER_OF_STEPS, NUMBER_OF_EQUATIONS], dtype = np.float32) 
-    t = np.zeros(NUMBER_OF_STEPS, dtype = np.float32) #vetor com valores de tempo
-    H = np.zeros(NUMBER_OF_STEPS, dtype = np.float32) #variável auxiliar para monitorar variável h
-    
-    #Passandos as condições de contorno
-    r[0] = r0
-    t[0] = t0
+    return _odeRKF(f, r0, t0, NUMBER_OF_STEPS, h, alpha, e, tableau, stats, callback, dtype, controlador)
 
+def _odeRKF(f, r0, t0, NUMBER_OF_STEPS, h, alpha, e, tableau, stats = None, callback = None, dtype = np.float32,
+            controlador = None):
+    """
+    Laço adaptativo comum às versões escalar e de sistema do Runge-Kutta-Fehlberg: os
+    NUMBER_OF_STEPS primeiros pontos do mesmo gerador usado pelo odeAdaptativoSys, sem tempo final.
+    """
+    shape = np.shape(r0)
+
+    r = np.zeros((NUMBER_OF_STEPS,) + shape, dtype = dtype)
+    t = np.zeros(NUMBER_OF_STEPS, dtype = dtype) #vetor com valores de tempo
+    H = np.zeros(NUMBER_OF_STEPS, dtype = dtype) #passo aceito que levou a cada ponto
+
+    passos = _passosAdaptativos(f, r0, t0, np.inf, h, alpha, e, tableau, stats = stats, controlador = controlador)
+    passos = _instrumenta(itertools.islice(passos, NUMBER_OF_STEPS), stats, callback)
+
+    for n, (tn, y, dy, hn) in enumerate(passos):
+        t[n] = tn
+        r[n] = y
+        H[n] = hn
 
-    for n in range(0, NUMBER_OF_STEPS - 1):
-     
-        H[n] = h
-        
-        
-        while (True):
-            
-            #Cálculos dos parâmetros Ks
-            K1 = f(t[n], r[n])
-            K2 = f(t[n] + h/4, r[n] + (K1/4)*h)
-            K3 = f(t[n] + (3/8)*h , r[n] + h*((3*K1 + 9*K2)/32))
-            K4 = f(t[n] + (12/13)*h, r[n] + h*((1932*K1 - 7200*K2 + 7296*K3)/2197))
-            K5 = f(t[n] + h, r[n] + h*((439/216)*K1 - 8*K2 + (3680/513)*K3 - (845/4104)*K4))
-            K6 = f(t[n] + 0.5*h, r[n] + h*(-(8/27)*K1 + 2*K2 - (3544/2565)*K3 + (1859/4104)*K4 - (11/40)*K5))
-            
-            #Cálculando o valor das funções no tempo n+1
-            r5 = r[n] + ((16/135)*K1 + (6656/12825)*K3 + (28561/56430)*K4 - (9/50)*K5 + (2/55)*K6)*h #Runge-Kutta de 5º ordem
-        
-            r4 = r[n] + ((25/216)*K1 + (1408/2565)*K3 + (2197/4104)*K4 - (1/5)*K5)*h #Runge-Kutta de 4º ordem
-            
-
-              
-            #Verificando se o erro está dentro da tolerância
-            Num = e*h
-               
-            Den = abs(r4 - r5)
-            
-# =============================================================================
-#  Para o caso em que algum dos valores de Den são igual a zero, esse valor é substituido
-#  por um valor específico para que quando q seja calculado o valor dê igual 459.
-# =============================================================================
-            
-            for i in range (len (Den)): #verifica se existe algum valor nulo no vetor Den.
-               if (Den[i] == 0):
-                   Den[i] = (e*Num)/((459/alpha)**(4)) #Possibilita o cálculo do q.
-                
-            q = alpha*((Num/Den)**(1/4)) #calcula o q
-                
-            if any(i < 1 for i in q): #verifica se algum valor do vetor q é menor que 1.
-                
-                h = min(q)*h  #utiliza o menor valor de q para diminuir o passo h para uma fração de h que esteja dentro da tolerância.
-                
-            else:
-                break
-            
-        
-        r[n+1] = r5 #Atualiza a função.
-        
-        t[n+1] = t[n] + h #Atualização do vetor de tempo.
-        
-        if not all (i == 459 for i in q): #verifica se o passo h pode ser aumentado
-            h = min(q)*h #aumenta o passso h para o próximo passo
-        
     return t, r, H
 
+
 #%%
 ################################################################################################
 
+#%%
+############################Integração adaptativa até um tempo final#########################
+
+class _BufferCrescente:
+    """
+    Armazena linhas em blocos de tamanho fixo, alocados conforme a necessidade.
+    Ao final, "corta" junta os blocos descartando as linhas não utilizadas.
+    """
+    def __init__(self, shape = (), dtype = np.float32, bloco = 4096):
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.bloco = bloco
+        self.blocos = []
+        self.n = 0 #linhas ocupadas no último bloco
+
+    def adiciona(self, linha):
+        if not self.blocos or self.n == self.bloco:
+            self.blocos.append(np.empty((self.bloco,) + self.shape, dtype = self.dtype))
+            self.n = 0
+        self.blocos[-1][self.n] = linha
+        self.n += 1
+
+    def __len__(self):
+        return 0 if not self.blocos else (len(self.blocos) - 1)*self.bloco + self.n
+
+    def corta(self, dtype = None):
+        if not self.blocos:
+            return np.empty((0,) + self.shape, dtype = dtype or self.dtype)
+        partes = self.blocos[:-1] + [self.blocos[-1][:self.n]]
+        return np.concatenate(partes, dtype = dtype or self.dtype)
+
+def interpolaHermite(s, h, y0, dy0, y1, dy1):
+    """
+    Interpolação cúbica de Hermite no intervalo [t0, t0 + h], com s = (t - t0)/h em [0, 1].
+    Usa os valores e as derivadas dos dois extremos do passo.
+    """
+    s2 = s*s
+    h00 = (1 + 2*s)*(1 - s)**2
+    h10 = s*(1 - s)**2
+    h01 = s2*(3 - 2*s)
+    h11 = s2*(s - 1)
+    return h00*y0 + h10*h*dy0 + h01*y1 + h11*h*dy1
+
+class SolucaoDensa:
+    """
+    Saída densa de uma integração adaptativa: avalia a solução em qualquer instante
+    entre t[0] e t[-1] por interpolação de Hermite entre os passos aceitos.
+
+    Parameters
+    ----------
+    t : Array
+        Instantes dos passos aceitos (N,).
+    r : Array
+        Solução nos passos aceitos (N,) + forma do estado.
+    dr : Array
+        Derivadas f(t, r) nos passos aceitos, com a mesma forma de r.
+
+    """
+    def __init__(self, t, r, dr):
+        self.t = np.asarray(t, dtype = np.float64)
+        self.r = r
+        self.dr = dr
+
+    def __call__(self, tq):
+        tq = np.asarray(tq, dtype = np.float64)
+        i = np.clip(np.searchsorted(self.t, tq, side = "right") - 1, 0, len(self.t) - 2)
+        h = self.t[i+1] - self.t[i]
+        s = (tq - self.t[i])/h
+        #s e h ganham eixos extras para multiplicar cada componente do estado
+        extra = (1,)*(self.r.ndim - 1)
+        s = s.reshape(s.shape + extra)
+        h = h.reshape(h.shape + extra)
+        return interpolaHermite(s, h, self.r[i], self.dr[i], self.r[i+1], self.dr[i+1])
+
+def _somaCompensada(t, c, h):
+    """
+    Soma compensada de Kahan: retorna (t + h, nova compensação), com c guardando o
+    arredondamento perdido nas somas anteriores. Aceita escalares ou arrays.
+    """
+    y = h - c
+    s = t + y
+    return s, (s - t) - y
+
+def normaRMS(erro, y, yNovo, rtol, atol):
+    """
+    Norma RMS ponderada do erro local: sqrt(mean((erro/(atol + rtol*max(|y|, |yNovo|)))**2)).
+    rtol e atol podem ser escalares ou arrays com uma tolerância por componente.
+    Um valor <= 1 significa que o passo está dentro da tolerância.
+    """
+    escala = atol + rtol*np.maximum(np.abs(y), np.abs(yNovo))
+    return float(np.sqrt(np.mean(np.square(erro/escala))))
+
+def passoInicial(f, t0, y0, dy0, ordem, rtol, atol):
+    """
+    Estimativa automática do primeiro passo (Hairer, Nørsett e Wanner, Solving ODEs I, II.4),
+    a partir das normas de y0, de f(t0, y0) e de uma estimativa da segunda derivada.
+    Custa uma avaliação de f.
+    """
+    y0 = np.asarray(y0, dtype = np.float64)
+    dy0 = np.asarray(dy0, dtype = np.float64)
+    escala = atol + rtol*np.abs(y0)
+    d0 = np.sqrt(np.mean(np.square(y0/escala)))
+    d1 = np.sqrt(np.mean(np.square(dy0/escala)))
+    h0 = 1E-6 if (d0 < 1E-5 or d1 < 1E-5) else 0.01*d0/d1
+
+    dy1 = np.asarray(f(t0 + h0, y0 + h0*dy0), dtype = np.float64)
+    d2 = np.sqrt(np.mean(np.square((dy1 - dy0)/escala)))/h0
+
+    if max(d1, d2) <= 1E-15:
+        h1 = max(1E-6, 1E-3*h0)
+    else:
+        h1 = (0.01/max(d1, d2))**(1/(ordem + 1))
+    return float(min(100*h0, h1))
+
+class ControladorPI:
+    """
+    Controlador PI (Gustafsson) do passo dos integradores adaptativos.
+
+    O erro local é medido pela norma RMS ponderada por rtol e atol (veja normaRMS) e o
+    próximo passo é h*seguranca*err**(-beta1)*errAnterior**beta2, limitado entre fatorMin
+    e fatorMax vezes o passo atual. Um passo rejeitado usa apenas o termo integral, e o
+    passo seguinte a uma rejeição não pode crescer.
+
+    Parameters
+    ----------
+    rtol : Float ou Array, optional
+        Tolerância relativa, escalar ou por componente. The default is 1E-6.
+    atol : Float ou Array, optional
+        Tolerância absoluta, escalar ou por componente. The default is 1E-8.
+    beta1 : Float, optional
+        Ganho do termo integral, multiplicado por 1/k com k = ordemErro + 1. The default is 0.7.
+    beta2 : Float, optional
+        Ganho do termo proporcional, multiplicado por 1/k. The default is 0.4.
+    seguranca : Float, optional
+        Fator de segurança. The default is 0.9.
+    fatorMin : Float, optional
+        Menor redução do passo em uma tentativa. The default is 0.2.
+    fatorMax : Float, optional
+        Maior aumento do passo entre dois passos aceitos. The default is 5.0.
+
+    """
+    def __init__(self, rtol = 1E-6, atol = 1E-8, beta1 = 0.7, beta2 = 0.4, seguranca = 0.9, fatorMin = 0.2, fatorMax = 5.0):
+        self.rtol = np.asarray(rtol, dtype = np.float64)
+        self.atol = np.asarray(atol, dtype = np.float64)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.seguranca = seguranca
+        self.fatorMin = fatorMin
+        self.fatorMax = fatorMax
+        self.reinicia()
+
+    def reinicia(self, ordemErro = 4):
+        """
+        Esquece o histórico do erro. Chamado no início de cada integração, com a ordem
+        do método embutido que estima o erro.
+        """
+        self.k = ordemErro + 1
+        self.errAnterior = 1.0
+        self.rejeitou = False
+
+    def norma(self, erro, y, yNovo):
+        return normaRMS(erro, y, yNovo, self.rtol, self.atol)
+
+    def passoInicial(self, f, t0, y0, dy0):
+        return passoInicial(f, t0, y0, dy0, self.k - 1, self.rtol, self.atol)
+
+    def avalia(self, err):
+        """
+        Decide sobre uma tentativa com norma do erro err. Retorna (aceito, fator), em que
+        fator multiplica o passo da tentativa: para refazê-la, se rejeitada, ou para o
+        próximo passo, se aceita.
+        """
+        if err <= 1:
+            if err == 0:
+                fator = self.fatorMax
+            else:
+                fator = self.seguranca*err**(-self.beta1/self.k)*self.errAnterior**(self.beta2/self.k)
+            fator = min(self.fatorMax, max(self.fatorMin, fator))
+            if self.rejeitou:
+                fator = min(1.0, fator)
+            self.errAnterior = max(err, 1E-4)
+            self.rejeitou = False
+            return True, fator
+
+        self.rejeitou = True
+        return False, max(self.fatorMin, self.seguranca*err**(-1/self.k))
+
+def _localizaEvento(g, ga, t, h, y0, dy0, y1, dy1, tol = 1E-12):
+    """
+    Posição relativa s em [0, 1] do passo em que g(t, y) troca de sinal, por bisseção sobre
+    a interpolação de Hermite do passo. Retorna a extremidade direita do intervalo final,
+    isto é, um ponto já do outro lado da raiz.
+    """
+    a, b = 0.0, 1.0
+    while (b - a > tol):
+        s = 0.5*(a + b)
+        gs = g(t + s*h, interpolaHermite(s, h, y0, dy0, y1, dy1))
+        if gs != 0 and (gs > 0) == (ga > 0):
+            a = s
+        else:
+            b = s
+    return b
+
+def _fracaoEvento(eventos, gAnt, t, h, yNovo):
+    """
+    Posição relativa s em (0, 1) da primeira troca de sinal de um evento em uma tentativa
+    rejeitada, por interpolação linear de g entre as extremidades. Retorna None se nenhum
+    evento troca de sinal na tentativa.
+    """
+    s = None
+    for i, g in enumerate(eventos):
+        gNovo = g(t + h, yNovo)
+        if gAnt[i] != 0 and (gNovo == 0 or (gNovo > 0) != (gAnt[i] > 0)):
+            si = gAnt[i]/(gAnt[i] - gNovo)
+            s = si if s is None else min(s, si)
+    return s
+
+def _passosAdaptativos(f, r0, t0, t_end, h, alpha, e, tableau, eventos = None, tEventos = None, stats = None,
+                       controlador = None):
+    """
+    Gerador com o laço adaptativo controlado pelo tempo final t_end.
+    Produz (t, y, dy, hUsado) para o ponto inicial (hUsado = 0) e para cada passo aceito,
+    em que dy = f(t, y). y e dy são buffers do gerador: quem consome deve copiá-los.
+
+    Se "eventos" for uma lista de funções g(t, y), o passo em que alguma delas troca de sinal
+    é refeito para terminar exatamente na raiz, e a integração recomeça dali com novos estágios
+    e com o passo aceito antes do corte. No controle original, uma tentativa rejeitada que
+    atravessa um evento é refeita (uma vez por passo) terminando perto dele, se isso encurtar
+    menos o passo que q: a descontinuidade é o que faz o erro estimado crescer.
+    Os instantes e os índices dos eventos são anexados à lista tEventos, se fornecida.
+    Se stats for dado, as avaliações de f e as tentativas rejeitadas são contadas nele.
+
+    O tempo é acumulado com soma compensada, de modo que o arredondamento não cresce
+    com o número de passos.
+
+    Com um ControladorPI, o passo é controlado por ele (e alpha e e são ignorados);
+    sem ele, vale o controle original do Runge-Kutta-Fehlberg. Se h for None, o primeiro
+    passo é estimado automaticamente.
+    """
+    if stats is not None:
+        f = stats.envolve(f)
+
+    y = np.array(r0, dtype = np.float64)
+    yNovo = np.empty_like(y)
+    dyNovo = np.empty_like(y)
+    passo = PassoRK(tableau, y.shape)
+    expoente = 1/tableau.ordemErro
+
+    t = float(t0)
+    compensacao = 0.0 #arredondamento acumulado em t
+    dy = np.array(f(t, y), dtype = np.float64)
+    gAnt = [g(t, y) for g in eventos] if eventos else None
+    yield t, y, dy, 0.0
+
+    if controlador is not None:
+        controlador.reinicia(tableau.ordemErro)
+    if h is None:
+        if controlador is not None:
+            h = controlador.passoInicial(f, t, y, dy)
+        else:
+            h = passoInicial(f, t, y, dy, tableau.ordemErro, 0.0, e)
+
+    folga = 1E-12*max(1.0, abs(t_end)) if np.isfinite(t_end) else 0.0 #sem t_end finito, não para
+    while (t_end - t > folga):
+        final = h >= t_end - t
+        hPasso = t_end - t if final else h #o último passo cai exatamente em t_end
+        mirou = not eventos #a tentativa já foi mirada em um evento neste passo
+
+        while (controlador is not None):
+            passo.passo(f, t, y, hPasso, yNovo, dy)
+            aceito, fator = controlador.avalia(controlador.norma(passo.estimaErro(hPasso), y, yNovo))
+            if aceito:
+                h = fator*hPasso
+                break
+            if stats is not None:
+                stats.registraRejeicao(hPasso)
+            hPasso = fator*hPasso
+            final = False
+
+        while (controlador is None):
+            passo.passo(f, t, y, hPasso, yNovo, dy) #dy é o primeiro estágio, mesmo se o passo for refeito
+
+            #Componentes com erro nulo não limitam o passo; o menor q corresponde ao maior erro.
+            Den = np.max(np.abs(passo.estimaErro(hPasso)))
+
+            if (Den == 0):
+                h = hPasso
+                break
+
+            q = alpha*((e*hPasso/Den)**expoente)
+
+            if (q < 1):
+                if stats is not None:
+                    stats.registraRejeicao(hPasso)
+                if not mirou:
+                    mirou = True
+                    sEvento = _fracaoEvento(eventos, gAnt, t, hPasso, yNovo)
+                    if sEvento is not None and q < sEvento < 1:
+                        q = sEvento
+                hPasso = q*hPasso #diminui o passo e refaz os estágios
+                final = False
+            else:
+                h = q*hPasso #aumenta o passo h para o próximo passo
+                break
+
+        tNovo, compNovo = (t_end, 0.0) if final else _somaCompensada(t, compensacao, hPasso)
+        #f(t, y) no novo ponto: sai de graça nos métodos FSAL e é o primeiro estágio do próximo passo
+        np.copyto(dyNovo, passo.K[-1] if tableau.fsal else f(tNovo, yNovo))
+
+        if eventos:
+            gNovo = [g(tNovo, yNovo) for g in eventos]
+            sEvento, iEvento = 1.0, None
+            for i, g in enumerate(eventos):
+                if gAnt[i] != 0 and (gNovo[i] == 0 or (gNovo[i] > 0) != (gAnt[i] > 0)):
+                    s = _localizaEvento(g, gAnt[i], t, hPasso, y, dy, yNovo, dyNovo)
+                    if iEvento is None or s < sEvento:
+                        sEvento, iEvento = s, i
+
+            if iEvento is not None and sEvento < 1:
+                #refaz o passo terminando no evento; o aumento sugerido pelo passo que atravessou
+                #a descontinuidade não vale do outro lado, e o próximo recomeça do passo aceito
+                h = hPasso
+                hPasso = sEvento*hPasso
+                passo.passo(f, t, y, hPasso, yNovo, dy)
+                tNovo, compNovo = _somaCompensada(t, compensacao, hPasso)
+                np.copyto(dyNovo, passo.K[-1] if tableau.fsal else f(tNovo, yNovo))
+                #o evento localizado fica com o sinal do outro lado; os demais são reavaliados
+                gNovo = [gNovo[i] if i == iEvento else g(tNovo, yNovo) for i, g in enumerate(eventos)]
+
+            if iEvento is not None and tEventos is not None:
+                tEventos.append((tNovo, iEvento))
+            gAnt = gNovo
+
+        t, compensacao = tNovo, compNovo
+        y, yNovo = yNovo, y
+        dy, dyNovo = dyNovo, dy
 
+        yield t, y, dy, hPasso
 
+def odeAdaptativoSys(f, r0, t0, t_end, h=0.01, alpha = 0.9, e = 1E-3, tableau = RKF45, t_eval = None, densa = False, bloco = 4096, saida = None,
+                     eventos = None, tEventos = None, stats = None, callback = None, dtype = np.float32,
+                     controlador = None):
+    """
+     Resolve sistema de EDOs de primeira ordem por um par de Runge-Kutta embutido até o tempo t_end.
+     O número de passos não precisa ser conhecido: os resultados são guardados em blocos
+     que crescem durante a integração e são cortados no final.
+
+    Parameters
+    ----------
+    f : Function
+        EDOs escritas na forma padrão "r' =  f(t,r)".
+    r0 : Array, lista ou tupla
+        Condições de contorno para as "n" equações.
+    t0 : Float
+        Ponto inicial em que a função é conhecida.
+    t_end : Float
+        Tempo final da integração. O último passo é ajustado para terminar exatamente em t_end.
+    h : Float, optional
+        Passo inicial. The default is 0.01.
+    alpha: Float optional
+        Magnitude na qual q deve ser menor que uma dada expressão para que h seja adpatado.
+    e: Float, optional
+        Tolerância máxima de erro admissível para um determinado passo.
+    tableau : Tableau, optional
+        Par embutido usado no passo e na estimativa do erro. The default is RKF45.
+    t_eval : Array, optional
+        Instantes em que a solução deve ser retornada, obtidos por interpolação de Hermite
+        entre os passos aceitos (sem forçar passos menores). The default is None.
+    densa : Bool, optional
+        Se True, retorna também um objeto SolucaoDensa. The default is False.
+    bloco : Int, optional
+        Número de linhas de cada bloco de armazenamento. The default is 4096.
+    saida : GravadorTrajetoria, optional
+        Se dado, a trajetória é gravada em disco em vez de ficar na memória; t_eval e densa
+        são ignorados. The default is None.
+    eventos : Lista, optional
+        Funções g(t, r) cujas trocas de sinal marcam descontinuidades do sistema. O passo que
+        contém uma troca é refeito para terminar exatamente nela, e os estágios recomeçam do
+        outro lado. The default is None.
+    tEventos : Lista, optional
+        Se dada, recebe um par (t, índice do evento) para cada evento localizado. The default is None.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
+    controlador : ControladorPI, optional
+        Controle do passo pela norma RMS com rtol/atol por componente e realimentação PI.
+        Se dado, alpha e e são ignorados. Com h = None, o primeiro passo é estimado
+        automaticamente. The default is None.
+
+    Returns
+    -------
+    t : Array
+        Vetor com os passos aceitos, ou t_eval quando fornecido.
+    r : Array
+        Matriz com as imagens correspondentes de t.
+    H : Array
+        Passo utilizado para chegar a cada ponto aceito (H[0] = 0).
+    sol : SolucaoDensa
+        Apenas se densa = True.
+    Se saida for dado, retorna apenas o GravadorTrajetoria, já fechado.
+
+    """
+    passos = _passosAdaptativos(f, r0, t0, t_end, h, alpha, e, tableau, eventos, tEventos, stats, controlador)
+    passos = _instrumenta(passos, stats, callback)
+
+    if saida is not None:
+        return saida.grava(passos, np.shape(r0))
+
+    interpola = densa or t_eval is not None
+    shape = np.shape(r0)
+
+    tb = _BufferCrescente((), np.float64, bloco) #tempo em precisão dupla para a interpolação
+    rb = _BufferCrescente(shape, dtype, bloco)
+    Hb = _BufferCrescente((), dtype, bloco)
+    drb = _BufferCrescente(shape, dtype, bloco) if interpola else None
 
+    for tn, y, dy, hn in passos:
+        tb.adiciona(tn)
+        rb.adiciona(y)
+        Hb.adiciona(hn)
+        if interpola:
+            drb.adiciona(dy)
+
+    r = rb.corta()
+    H = Hb.corta()
+
+    if not interpola:
+        return tb.corta(dtype), r, H
+
+    sol = SolucaoDensa(tb.corta(), r, drb.corta())
+
+    if t_eval is not None:
+        t = np.asarray(t_eval, dtype = dtype)
+        r = sol(t_eval).astype(dtype)
+    else:
+        t = sol.t.astype(dtype)
+
+    if densa:
+        return t, r, H, sol
+    return t, r, H
+
+#%%
+################################################################################################
+
+#%%
+############################Integração implícita (Rosenbrock-W)##############################
+
+def jacobianoNumerico(f, t, y, fy = None):
+    """
+    Jacobiano df/dy por diferenças finitas progressivas, uma coluna por componente de y.
+    fy = f(t, y), se já for conhecido, economiza uma avaliação.
+    """
+    y = np.array(y, dtype = np.float64)
+    fy = np.asarray(f(t, y) if fy is None else fy, dtype = np.float64)
+    J = np.empty((fy.size, y.size))
+    for j in range(y.size):
+        delta = np.sqrt(np.finfo(np.float64).eps)*max(1.0, abs(y.flat[j]))
+        yj = y.flat[j]
+        y.flat[j] = yj + delta
+        J[:, j] = (np.asarray(f(t, y), dtype = np.float64) - fy).ravel()/delta
+        y.flat[j] = yj
+    return J
+
+def fatoraLU(M):
+    """
+    Fatoração LU com pivoteamento parcial, por scipy.linalg.lu_factor quando o SciPy está
+    instalado. Retorna o objeto aceito por resolveLU.
+    """
+    if scipyLinalg is not None:
+        return scipyLinalg.lu_factor(M)
+
+    LU = np.array(M, dtype = np.float64)
+    n = LU.shape[0]
+    piv = np.arange(n)
+    for k in range(n - 1):
+        p = k + int(np.argmax(np.abs(LU[k:, k])))
+        if p != k:
+            LU[[k, p]] = LU[[p, k]]
+            piv[[k, p]] = piv[[p, k]]
+        LU[k+1:, k] /= LU[k, k]
+        LU[k+1:, k+1:] -= np.outer(LU[k+1:, k], LU[k, k+1:])
+    return LU, piv
+
+def resolveLU(fatoracao, b):
+    """
+    Resolve M x = b com a fatoração de fatoraLU.
+    """
+    if scipyLinalg is not None:
+        return scipyLinalg.lu_solve(fatoracao, b)
+
+    LU, piv = fatoracao
+    x = np.array(b, dtype = np.float64)[piv]
+    n = len(x)
+    for i in range(1, n): #L tem diagonal unitária
+        x[i] -= LU[i, :i] @ x[:i]
+    for i in range(n - 1, -1, -1):
+        x[i] = (x[i] - LU[i, i+1:] @ x[i+1:])/LU[i, i]
+    return x
+
+#Parâmetro do ROS2 (Verwer et al., 1999): L-estável, segunda ordem para qualquer aproximação do jacobiano
+GAMMA_ROS2 = 1 + 1/np.sqrt(2)
+
+def _passosRosenbrock(f, r0, t0, t_end, h, controlador, jacobiano = None, idadeMax = 20, congela = 1.2, stats = None):
+    """
+    Gerador com o laço do método de Rosenbrock-W ROS2, com o mesmo protocolo (t, y, dy, hUsado)
+    de _passosAdaptativos. Em cada passo, com W = I - gamma*h*J:
+
+        W k1 = f(t, y)
+        W k2 = f(t + h, y + h*k1) - 2*k1
+        y(n+1) = y + h*(3/2*k1 + 1/2*k2),   erro = h*(k1 + k2)/2 (contra Euler, y + h*k1)
+
+    Por ser um método W, a ordem não depende de J ser exato: o jacobiano só é recalculado
+    depois de "idadeMax" passos aceitos ou quando um passo é rejeitado com um jacobiano
+    antigo, e a fatoração LU de W é reaproveitada enquanto h não muda. Para isso, aumentos
+    do passo menores que "congela" são descartados. f deve ser autônoma (df/dt não entra).
+    """
+    if jacobiano is None:
+        jacobiano = getattr(f, "jacobiano", None)
+    if stats is not None:
+        f = stats.envolve(f)
+    if jacobiano is None:
+        jacobiano = lambda t, y: jacobianoNumerico(f, t, y)
+
+    y = np.array(r0, dtype = np.float64)
+    forma = y.shape
+    n = y.size
+
+    def avaliaJacobiano(t, y):
+        if stats is not None:
+            stats.jacobianos += 1
+        return np.asarray(jacobiano(t, y.reshape(forma)), dtype = np.float64).reshape(n, n)
+
+    t = float(t0)
+    compensacao = 0.0
+    dy = np.array(f(t, y), dtype = np.float64)
+    yield t, y, dy, 0.0
+
+    controlador.reinicia(1) #o erro é estimado contra o método de Euler
+    if h is None:
+        h = controlador.passoInicial(f, t, y, dy)
+
+    J = avaliaJacobiano(t, y)
+    idade = 0 #passos aceitos desde o cálculo de J
+    W, hW = None, None #fatoração de I - gamma*h*J e o h usado nela
+    identidade = np.eye(n)
+
+    folga = 1E-12*max(1.0, abs(t_end)) if np.isfinite(t_end) else 0.0
+    while (t_end - t > folga):
+        final = h >= t_end - t
+        hPasso = t_end - t if final else h
+
+        while (True):
+            if W is None or hPasso != hW:
+                W, hW = fatoraLU(identidade - GAMMA_ROS2*hPasso*J), hPasso
+                if stats is not None:
+                    stats.fatoracoes += 1
+
+            k1 = resolveLU(W, dy.ravel()).reshape(forma)
+            f2 = np.asarray(f(t + hPasso, y + hPasso*k1), dtype = np.float64)
+            k2 = resolveLU(W, (f2 - 2*k1).ravel()).reshape(forma)
+            yNovo = y + hPasso*(1.5*k1 + 0.5*k2)
+
+            aceito, fator = controlador.avalia(controlador.norma(0.5*hPasso*(k1 + k2), y, yNovo))
+            if aceito:
+                break
+            if stats is not None:
+                stats.registraRejeicao(hPasso)
+            if idade > 0: #a rejeição pode ser culpa de um jacobiano velho
+                J, idade, W = avaliaJacobiano(t, y), 0, None
+            hPasso = fator*hPasso
+            final = False
+
+        t, compensacao = (t_end, 0.0) if final else _somaCompensada(t, compensacao, hPasso)
+        y = yNovo
+        dy = np.asarray(f(t, y), dtype = np.float64)
+
+        idade += 1
+        if idade >= idadeMax:
+            J, idade, W = avaliaJacobiano(t, y), 0, None
+
+        #congela h (e a fatoração) quando o aumento sugerido é pequeno
+        h = hPasso if 1 <= fator <= congela else fator*hPasso
+
+        yield t, y, dy, hPasso
+
+def odeRosenbrockSys(f, r0, t0, t_end, h = None, controlador = None, jacobiano = None, idadeMax = 20, congela = 1.2,
+                     bloco = 4096, stats = None, callback = None, dtype = np.float32):
+    """
+     Resolve sistema de EDOs rígido de primeira ordem pelo método de Rosenbrock-W ROS2 até o tempo t_end.
+     Cada passo resolve dois sistemas lineares com a mesma matriz I - gamma*h*J, em vez de
+     fazer iterações de Newton, e o passo é controlado por um ControladorPI.
+
+    Parameters
+    ----------
+    f : Function
+        EDOs autônomas escritas na forma padrão "r' =  f(t,r)".
+    r0 : Array, lista ou tupla
+        Condições de contorno para as "n" equações.
+    t0 : Float
+        Ponto inicial em que a função é conhecida.
+    t_end : Float
+        Tempo final da integração.
+    h : Float, optional
+        Passo inicial. The default is None, que estima o passo automaticamente.
+    controlador : ControladorPI, optional
+        Controle do passo. The default is None, que usa ControladorPI(rtol = 1E-6, atol = 1E-8).
+    jacobiano : Function, optional
+        J(t, r) com a matriz df/dr. The default is None, que usa f.jacobiano se existir
+        (por exemplo MotorDoisTempos.jacobiano) ou diferenças finitas.
+    idadeMax : Int, optional
+        Número de passos aceitos entre dois cálculos do jacobiano. The default is 20.
+    congela : Float, optional
+        Aumentos do passo até este fator são descartados, para reaproveitar a fatoração LU.
+        The default is 1.2.
+    bloco : Int, optional
+        Número de linhas de cada bloco de armazenamento. The default is 4096.
+    stats : Estatisticas, optional
+        Se dado, acumula também os jacobianos calculados e as fatorações. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados. The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Vetor com os passos aceitos.
+    r : Array
+        Matriz com as imagens correspondentes de t.
+    H : Array
+        Passo utilizado para chegar a cada ponto aceito (H[0] = 0).
+
+    """
+    controlador = ControladorPI() if controlador is None else controlador
+    passos = _passosRosenbrock(f, r0, t0, t_end, h, controlador, jacobiano, idadeMax, congela, stats)
+    passos = _instrumenta(passos, stats, callback)
+
+    shape = np.shape(r0)
+    tb = _BufferCrescente((), np.float64, bloco)
+    rb = _BufferCrescente(shape, dtype, bloco)
+    Hb = _BufferCrescente((), dtype, bloco)
+
+    for tn, y, dy, hn in passos:
+        tb.adiciona(tn)
+        rb.adiciona(y)
+        Hb.adiciona(hn)
+
+    return tb.corta(dtype), rb.corta(), Hb.corta()
+
+#%%
+################################################################################################
+
+#%%
+############################Extrapolação (Gragg-Bulirsch-Stoer)##############################
+
+SEQUENCIA_GBS = (2, 4, 6, 8, 10, 12, 14, 16, 18, 20) #número de subpassos de cada linha (Deuflhard)
+
+def pontoMedioModificado(f, t, y, dy, H, n):
+    """
+    Regra do ponto médio modificado de Gragg com n (par) subpassos de H/n:
+
+        z0 = y,   z1 = y + h*f(t, y),   z(m+1) = z(m-1) + 2*h*f(t + m*h, z(m))
+
+    Retorna z(n), cujo erro tem uma expansão apenas em potências pares de h. dy = f(t, y)
+    é reaproveitado, de modo que o custo é de n - 1 avaliações de f.
+    """
+    h = H/n
+    zAnterior = y
+    z = y + h*dy
+    for m in range(1, n):
+        zAnterior, z = z, zAnterior + 2*h*np.asarray(f(t + m*h, z), dtype = np.float64)
+    return z
+
+def _passosExtrapolacao(f, r0, t0, t_end, h, rtol, atol, kMax = 8, eventos = None, tEventos = None, stats = None,
+                        erros = None):
+    """
+    Gerador com o laço de extrapolação GBS, com o mesmo protocolo (t, y, dy, hUsado) de
+    _passosAdaptativos.
+
+    Em cada macro-passo H, a linha j da tabela começa com o ponto médio modificado com
+    SEQUENCIA_GBS[j] subpassos e é completada pelo esquema de Aitken-Neville em h**2:
+
+        T(j, k) = T(j, k-1) + (T(j, k-1) - T(j-1, k-1))/((n(j)/n(j-k))**2 - 1)
+
+    T(j, j) tem ordem 2*j + 2 e a diferença T(j, j) - T(j, j-1), medida pela normaRMS com
+    rtol e atol, estima o erro local. A tabela cresce até a linha alvo (ou uma além dela) e,
+    como no ODEX (Hairer, Nørsett e Wanner, Solving ODEs I, II.9), a linha alvo e o próximo
+    H são escolhidos pelo menor trabalho (avaliações de f) por unidade de tempo.
+
+    Os eventos são tratados como no _passosAdaptativos: o macro-passo em que algum g troca de
+    sinal é refeito para terminar na raiz, e os segmentos suaves entre as trocas não são
+    atravessados por um mesmo polinômio. Se "erros" for uma lista, a norma do erro estimado
+    de cada passo aceito é anexada a ela.
+    """
+    if stats is not None:
+        f = stats.envolve(f)
+    kMax = min(kMax, len(SEQUENCIA_GBS))
+    if kMax < 2:
+        raise ValueError("A extrapolação precisa de pelo menos duas linhas (kMax >= 2).")
+    sequencia = np.array(SEQUENCIA_GBS[:kMax], dtype = np.float64)
+    #avaliações de f para chegar à linha j, contando a do novo ponto
+    trabalho = np.cumsum(sequencia - 1) + 1
+
+    y = np.array(r0, dtype = np.float64)
+    t = float(t0)
+    compensacao = 0.0
+    dy = np.array(f(t, y), dtype = np.float64)
+    gAnt = [g(t, y) for g in eventos] if eventos else None
+    yield t, y, dy, 0.0
+
+    if h is None:
+        h = passoInicial(f, t, y, dy, 4, rtol, atol)
+    kAlvo = min(3, kMax - 1) #linha (a partir de 0) em que se espera a convergência
+    fatores = np.ones(kMax)
+
+    def previsaoEvento(H, z):
+        """
+        Fração de H até a primeira troca de sinal prevista, interpolando g linearmente entre
+        y e a estimativa z em t + H. Retorna 1 se nenhum g troca de sinal.
+        """
+        s = 1.0
+        for i, g in enumerate(eventos):
+            gz = g(t + H, z)
+            if gAnt[i] != 0 and (gz == 0 or (gz > 0) != (gAnt[i] > 0)):
+                s = min(s, gAnt[i]/(gAnt[i] - gz))
+        return s
+
+    def macroPasso(H, prever = True):
+        """
+        Constrói a tabela até a convergência. Retorna (aceito, yNovo, err, j, sEvento), em que
+        sEvento < 1 indica que a primeira linha já prevê um evento antes de t + H.
+        """
+        anterior = None
+        for j in range(min(kAlvo + 2, kMax)):
+            linha = [pontoMedioModificado(f, t, y, dy, H, int(sequencia[j]))]
+            for k in range(1, j + 1):
+                linha.append(linha[k-1] + (linha[k-1] - anterior[k-1])/((sequencia[j]/sequencia[j-k])**2 - 1))
+            anterior = linha
+            if j == 0:
+                #um evento dentro do passo estragaria a extrapolação: encurta antes de gastar as outras linhas
+                sEvento = previsaoEvento(H, linha[0]) if (eventos and prever) else 1.0
+                if 1E-3 < sEvento < 1: #raízes coladas em t são as do evento que acabou de ser localizado
+                    return False, None, None, 0, sEvento
+                continue
+            err = normaRMS(linha[j] - linha[j-1], y, linha[j], rtol, atol)
+            fatores[j] = 4.0 if err == 0 else min(4.0, max(0.02, 0.94*(0.65/err)**(1/(2*j + 1))))
+            if err <= 1 and j >= kAlvo - 1:
+                return True, linha[j], err, j, 1.0
+        return False, linha[j], err, j, 1.0
+
+    folga = 1E-12*max(1.0, abs(t_end)) if np.isfinite(t_end) else 0.0
+    while (t_end - t > folga):
+        final = h >= t_end - t
+        hPasso = t_end - t if final else h
+        iEvento = None #evento em que o passo termina, depois de refeito
+        gNovo = None
+
+        while (True):
+            aceito, yNovo, err, j, sEvento = macroPasso(hPasso, prever = iEvento is None)
+            if not aceito:
+                if stats is not None:
+                    stats.registraRejeicao(hPasso)
+                #um evento previsto encurta o passo para um pouco além da raiz estimada
+                hPasso = (min(0.99, 1.05*sEvento) if sEvento < 1 else min(fatores[j], 0.5))*hPasso
+                iEvento = None #um passo refeito e rejeitado não chega mais à raiz
+                final = False
+                continue
+
+            tNovo, compNovo = (t_end, 0.0) if final else _somaCompensada(t, compensacao, hPasso)
+            dyNovo = np.asarray(f(tNovo, yNovo), dtype = np.float64)
+            if not eventos:
+                break
+            if iEvento is not None:
+                #o evento localizado fica com o sinal do outro lado; os demais são reavaliados
+                gNovo = [gNovo[i] if i == iEvento else g(tNovo, yNovo) for i, g in enumerate(eventos)]
+                break
+
+            gNovo = [g(tNovo, yNovo) for g in eventos]
+            sEvento = 1.0
+            for i, g in enumerate(eventos):
+                if gAnt[i] != 0 and (gNovo[i] == 0 or (gNovo[i] > 0) != (gAnt[i] > 0)):
+                    s = _localizaEvento(g, gAnt[i], t, hPasso, y, dy, yNovo, dyNovo)
+                    if iEvento is None or s < sEvento:
+                        sEvento, iEvento = s, i
+            if iEvento is None or sEvento >= 1:
+                break
+            #refaz o macro-passo terminando no evento
+            hPasso = sEvento*hPasso
+            final = False
+
+        if eventos:
+            if iEvento is not None and tEventos is not None:
+                tEventos.append((tNovo, iEvento))
+            gAnt = gNovo
+
+        #ordem e passo seguintes pelo menor trabalho por unidade de tempo (linhas 1 a j deste passo)
+        custo = trabalho/fatores
+        kNovo = j
+        if j >= 2 and custo[j-1] < 0.8*custo[j]:
+            kNovo = j - 1
+        elif j == kAlvo and j + 1 < kMax and (j < 2 or custo[j] < 0.9*custo[j-1]):
+            kNovo = j + 1
+        hNovo = hPasso*(fatores[kNovo] if kNovo <= j else fatores[j]*trabalho[j+1]/trabalho[j])
+
+        if erros is not None:
+            erros.append(err)
+        t, compensacao = tNovo, compNovo
+        y, dy = yNovo, dyNovo
+        h, kAlvo = hNovo, kNovo
+
+        yield t, y, dy, hPasso
+
+def odeExtrapolacaoSys(f, r0, t0, t_end, h = None, rtol = 1E-6, atol = 1E-8, kMax = 8, eventos = None, tEventos = None,
+                       bloco = 4096, stats = None, callback = None, dtype = np.float32):
+    """
+     Resolve sistema de EDOs de primeira ordem pela extrapolação de Gragg-Bulirsch-Stoer até
+     o tempo t_end. Cada macro-passo combina pontos médios modificados com números
+     crescentes de subpassos, e a ordem e o passo são adaptados ao erro estimado.
+
+    Parameters
+    ----------
+    f : Function
+        EDOs escritas na forma padrão "r' =  f(t,r)".
+    r0 : Array, lista ou tupla
+        Condições de contorno para as "n" equações.
+    t0 : Float
+        Ponto inicial em que a função é conhecida.
+    t_end : Float
+        Tempo final da integração.
+    h : Float, optional
+        Macro-passo inicial. The default is None, que estima o passo automaticamente.
+    rtol : Float ou Array, optional
+        Tolerância relativa, escalar ou por componente. The default is 1E-6.
+    atol : Float ou Array, optional
+        Tolerância absoluta, escalar ou por componente. The default is 1E-8.
+    kMax : Int, optional
+        Número máximo de linhas da tabela de extrapolação (ordem até 2*kMax). The default is 8.
+    eventos : Lista, optional
+        Funções g(t, r) cujas trocas de sinal terminam um macro-passo, como no odeAdaptativoSys
+        (por exemplo [motor.trocaDeFase], nas trocas da lei da pressão). The default is None.
+    tEventos : Lista, optional
+        Recebe os pares (t, índice) de cada evento localizado. The default is None.
+    bloco : Int, optional
+        Número de linhas de cada bloco de armazenamento. The default is 4096.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados. The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Vetor com os passos aceitos.
+    r : Array
+        Matriz com as imagens correspondentes de t.
+    H : Array
+        Macro-passo utilizado para chegar a cada ponto aceito (H[0] = 0).
+    E : Array
+        Norma RMS ponderada do erro local estimado em cada passo (E[0] = 0); valores <= 1
+        estão dentro de rtol e atol.
+
+    """
+    erros = []
+    passos = _passosExtrapolacao(f, r0, t0, t_end, h, rtol, atol, kMax, eventos, tEventos, stats, erros)
+    passos = _instrumenta(passos, stats, callback)
+
+    shape = np.shape(r0)
+    tb = _BufferCrescente((), np.float64, bloco)
+    rb = _BufferCrescente(shape, dtype, bloco)
+    Hb = _BufferCrescente((), dtype, bloco)
+
+    for tn, y, dy, hn in passos:
+        tb.adiciona(tn)
+        rb.adiciona(y)
+        Hb.adiciona(hn)
+
+    H = Hb.corta()
+    E = np.zeros(len(H), dtype = dtype)
+    E[1:] = erros
+    return tb.corta(dtype), rb.corta(), H, E
+
+#%%
+################################################################################################
+
+#%%
+############################Integração em fluxo (streaming)#################################
+
+def odePassos(f, r0, t0, h=0.01, tableau = None, NUMBER_OF_STEPS = None, t_end = None, adaptativo = False,
+              alpha = 0.9, e = 1E-3, eventos = None, tEventos = None, stats = None, callback = None, controlador = None):
+    """
+    Gerador com os passos de um integrador, para quem precisa processar a trajetória
+    durante a integração (detecção de ciclos, critérios de parada, gravação).
+
+    Parameters
+    ----------
+    Os mesmos de odeStreamSys, exceto "bloco", e os eventos do odeAdaptativoSys
+    (apenas no modo adaptativo).
+
+    Yields
+    ------
+    (t, y, dy, h) para o ponto inicial (h = 0) e para cada passo aceito, em que dy = f(t, y)
+    e h é o passo que levou até t. y e dy são buffers reaproveitados: copie-os para guardar.
+
+    """
+    if adaptativo:
+        tableau = RKF45 if tableau is None else tableau
+        passos = _passosAdaptativos(f, r0, t0, np.inf if t_end is None else t_end, h, alpha, e, tableau,
+                                    eventos, tEventos, stats, controlador)
+    else:
+        if eventos:
+            raise ValueError("A localização de eventos só está disponível no modo adaptativo.")
+        tableau = RK4 if tableau is None else tableau
+        if NUMBER_OF_STEPS is None and t_end is not None:
+            NUMBER_OF_STEPS = int(round((t_end - t0)/h)) + 1
+        passos = _passosFixos(f, r0, t0, h, tableau, NUMBER_OF_STEPS, stats)
+
+    if NUMBER_OF_STEPS is not None:
+        passos = itertools.islice(passos, NUMBER_OF_STEPS)
+
+    return _instrumenta(passos, stats, callback)
+
+def odeStreamSys(f, r0, t0, h=0.01, tableau = None, NUMBER_OF_STEPS = None, t_end = None, adaptativo = False,
+                 alpha = 0.9, e = 1E-3, bloco = None, stats = None, callback = None, dtype = np.float32, controlador = None):
+    """
+    Resolve sistema de EDOs de primeira ordem entregando a trajetória aos poucos, durante a integração.
+    O estado do método é mantido entre as entregas, de modo que a memória usada não depende
+    do número de passos.
+
+    Parameters
+    ----------
+    f :  Function
+        EDOs escritas na forma padrão "r' =  f(t,r)".
+    r0 : Array
+        Condições de contorno para as "n" equações.
+    t0 : Float
+        Ponto inicial em que as funções são conhecidas.
+    h : Float, optional
+        Passo (ou passo inicial, se adaptativo). The default is 0.01.
+    tableau : Tableau, optional
+        Método utilizado. The default is RK4, ou RKF45 se adaptativo.
+    NUMBER_OF_STEPS : Int, optional
+        Número de pontos entregues, contando o inicial. The default is None.
+    t_end : Float, optional
+        Tempo final da integração. Sem NUMBER_OF_STEPS e sem t_end a integração só termina
+        quando o consumidor parar de pedir pontos. The default is None.
+    adaptativo : Bool, optional
+        Se True, usa o laço adaptativo do odeAdaptativoSys. The default is False.
+    alpha: Float optional
+        Fator de segurança do passo adaptativo. The default is 0.9.
+    e: Float, optional
+        Tolerância do passo adaptativo. The default is 1E-3.
+    bloco : Int, optional
+        Se None, entrega cada passo aceito como (t, r); caso contrário, entrega blocos
+        (t, r) com até "bloco" linhas. The default is None.
+    stats : Estatisticas, optional
+        Contadores da integração, como em odeTableauSys. The default is None.
+    callback : Function, optional
+        callback(t, y, dy, h) a cada passo aceito, como em odeTableauSys. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
+    controlador : ControladorPI, optional
+        Controle do passo pela norma RMS com rtol/atol por componente e realimentação PI.
+        Se dado, alpha e e são ignorados. Com h = None, o primeiro passo é estimado
+        automaticamente. The default is None.
+
+    Yields
+    ------
+    t : Float ou Array
+        Instante do passo, ou vetor com os instantes do bloco.
+    r : Array
+        Estado no instante t, ou matriz com os estados do bloco.
+
+    """
+    passos = odePassos(f, r0, t0, h, tableau, NUMBER_OF_STEPS, t_end, adaptativo, alpha, e,
+                       stats = stats, callback = callback, controlador = controlador)
+
+    if bloco is None:
+        for tn, y, dy, hn in passos:
+            yield tn, y.astype(dtype)
+        return
+
+    shape = np.shape(r0)
+    tb = np.empty(bloco, dtype = dtype)
+    rb = np.empty((bloco,) + shape, dtype = dtype)
+    k = 0
+    for tn, y, dy, hn in passos:
+        tb[k] = tn
+        rb[k] = y
+        k += 1
+        if k == bloco:
+            yield tb, rb
+            #novos blocos: o consumidor pode guardar os que já recebeu
+            tb = np.empty(bloco, dtype = dtype)
+            rb = np.empty((bloco,) + shape, dtype = dtype)
+            k = 0
+
+    if k > 0:
+        yield tb[:k], rb[:k]
+
+#%%
+################################################################################################
+
+#%%
+############################Gravação da trajetória em disco#################################
+
+def _reescreveCabecalho(caminho, shape, linhas):
+    """
+    Corrige a forma gravada no cabeçalho de um arquivo .npy, mantendo o tamanho do cabeçalho,
+    e descarta os bytes além das "linhas" primeiras linhas.
+    """
+    with open(caminho, "r+b") as fp:
+        versao = np.lib.format.read_magic(fp)
+        prefixo = fp.tell() + (2 if versao == (1, 0) else 4) #bytes do tamanho do cabeçalho
+        if versao == (1, 0):
+            _, _, dtype = np.lib.format.read_array_header_1_0(fp)
+        else:
+            _, _, dtype = np.lib.format.read_array_header_2_0(fp)
+        inicio = fp.tell() #início dos dados
+
+        forma = (linhas,) + tuple(shape)
+        cabecalho = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (np.lib.format.dtype_to_descr(dtype), forma)
+        fp.seek(prefixo)
+        fp.write((cabecalho.ljust(inicio - prefixo - 1) + "\n").encode("latin1"))
+        fp.truncate(inicio + linhas*int(np.prod(shape, dtype = np.int64))*dtype.itemsize)
+
+class _ColunaNpy:
+    """
+    Arquivo .npy gravado linha a linha. Com a capacidade conhecida, as linhas vão direto para
+    um open_memmap; sem ela, são acumuladas em um bloco e anexadas ao arquivo. Em ambos os
+    casos a forma do cabeçalho é corrigida ao fechar.
+    """
+    def __init__(self, caminho, shape, dtype, capacidade = None, bloco = 4096):
+        self.caminho = caminho
+        self.shape = tuple(shape)
+        self.n = 0
+
+        if capacidade is not None:
+            self.mapa = np.lib.format.open_memmap(caminho, mode = "w+", dtype = dtype, shape = (capacidade,) + self.shape)
+            self.fp = None
+        else:
+            self.mapa = None
+            self.fp = open(caminho, "wb")
+            #forma provisória com muitos dígitos, para que a forma final caiba no mesmo cabeçalho
+            np.lib.format.write_array_header_1_0(self.fp, {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                           "fortran_order": False,
+                                                           "shape": (10**15,) + self.shape})
+            self.bloco = np.empty((bloco,) + self.shape, dtype = dtype)
+            self.k = 0
+
+    def adiciona(self, linha):
+        if self.mapa is not None:
+            self.mapa[self.n] = linha
+        else:
+            self.bloco[self.k] = linha
+            self.k += 1
+            if self.k == len(self.bloco):
+                self._descarrega()
+        self.n += 1
+
+    def _descarrega(self):
+        self.fp.write(self.bloco[:self.k].tobytes())
+        self.k = 0
+
+    def fecha(self):
+        if self.mapa is not None:
+            capacidade = len(self.mapa)
+            self.mapa.flush()
+            self.mapa = None
+            if self.n == capacidade:
+                return
+        else:
+            self._descarrega()
+            self.fp.close()
+        _reescreveCabecalho(self.caminho, self.shape, self.n)
+
+class GravadorTrajetoria:
+    """
+    Destino em disco para a trajetória de um integrador. Cada coluna é um arquivo .npy que
+    outros processos podem abrir com np.load(..., mmap_mode = "r") sem cópia.
+
+    Parameters
+    ----------
+    diretorio : String
+        Pasta onde os arquivos são criados.
+    colunas : Lista ou tupla, optional
+        Nomes das componentes do estado, gravadas em arquivos separados (por exemplo
+        ("w", "theta") gera t.npy, w.npy e theta.npy). Se None, o estado vai inteiro para r.npy.
+        The default is None.
+    passo : Int, optional
+        Decimação: guarda apenas um ponto a cada "passo". The default is 1.
+    porRevolucao : Int, optional
+        Índice da componente angular. Se dado, guarda o ponto inicial e o primeiro ponto após
+        cada múltiplo de 2*pi, ignorando "passo". The default is None.
+    passos : Bool, optional
+        Se True, grava também o passo usado para chegar a cada ponto em H.npy. The default is False.
+    dtype : Dtype, optional
+        Tipo dos dados gravados. The default is np.float32.
+
+    """
+    def __init__(self, diretorio, colunas = None, passo = 1, porRevolucao = None, passos = False, dtype = np.float32):
+        self.diretorio = diretorio
+        self.colunas = None if colunas is None else tuple(colunas)
+        self.passo = passo
+        self.porRevolucao = porRevolucao
+        self.passos = passos
+        self.dtype = dtype
+        self.arquivos = {}
+        self.linhas = 0
+
+    def _caminho(self, nome):
+        return os.path.join(self.diretorio, nome + ".npy")
+
+    def abre(self, shape, total = None):
+        """
+        Cria os arquivos para estados com a forma dada. Se o número total de pontos for
+        conhecido e não houver amostragem por revolução, usa open_memmap com a capacidade exata.
+        """
+        os.makedirs(self.diretorio, exist_ok = True)
+        capacidade = None
+        if total is not None and self.porRevolucao is None:
+            capacidade = (total - 1)//self.passo + 1
+
+        self.arquivos = {"t": _ColunaNpy(self._caminho("t"), (), self.dtype, capacidade)}
+        if self.colunas is None:
+            self.arquivos["r"] = _ColunaNpy(self._caminho("r"), shape, self.dtype, capacidade)
+        else:
+            for nome in self.colunas:
+                self.arquivos[nome] = _ColunaNpy(self._caminho(nome), shape[1:], self.dtype, capacidade)
+        if self.passos:
+            self.arquivos["H"] = _ColunaNpy(self._caminho("H"), (), self.dtype, capacidade)
+
+        self._i = 0
+        self._revolucao = None
+        self.linhas = 0
+
+    def adiciona(self, t, y, h = 0.0):
+        """
+        Recebe um ponto da trajetória e o grava se ele passar pela decimação.
+        """
+        if self.porRevolucao is not None:
+            k = np.floor(y[self.porRevolucao]/(2*np.pi))
+            guarda = self._revolucao is None or k != self._revolucao
+            self._revolucao = k
+        else:
+            guarda = self._i % self.passo == 0
+        self._i += 1
+
+        if not guarda:
+            return
+
+        self.arquivos["t"].adiciona(t)
+        if self.colunas is None:
+            self.arquivos["r"].adiciona(y)
+        else:
+            for i, nome in enumerate(self.colunas):
+                self.arquivos[nome].adiciona(y[i])
+        if self.passos:
+            self.arquivos["H"].adiciona(h)
+        self.linhas += 1
+
+    def fecha(self):
+        for arquivo in self.arquivos.values():
+            arquivo.fecha()
+
+    def grava(self, passos, shape, total = None):
+        """
+        Consome um gerador de passos (t, y, dy, h) dos integradores e fecha os arquivos.
+        """
+        self.abre(shape, total)
+        try:
+            for tn, y, dy, hn in passos:
+                self.adiciona(tn, y, hn)
+        finally:
+            self.fecha()
+        return self
+
+    def carrega(self):
+        """
+        Abre os arquivos gravados como memmaps somente leitura, em um dicionário pelo nome da coluna.
+        """
+        return {nome: np.load(self._caminho(nome), mmap_mode = "r") for nome in self.arquivos}
+
+#%%
+################################################################################################
+
+#%%
+############################Integração em lote (ensembles)##################################
+
+"""
+Implementação dos métodos em lote: M trajetórias avançam juntas, um passo vetorizado por vez.
+"""
+def _avaliaLote(f, t, R, p):
+    """
+    Avalia a função do sistema para todas as trajetórias do lote.
+    Se p for dado, f é chamada como "f(t, R, p)"; caso contrário, como "f(t, R)".
+    """
+    if p is None:
+        return f(t, R)
+    return f(t, R, p)
+
+def _odeTableauLote(f, R0, t0, NUMBER_OF_STEPS, h, p, tableau, stats = None, callback = None, dtype = np.float32):
+    """
+    Laço de passo fixo comum aos métodos em lote.
+    """
+    R0 = np.atleast_2d(np.asarray(R0, dtype = np.float64))
+    M, NUMBER_OF_EQUATIONS = R0.shape
+
+    r = np.zeros([M, NUMBER_OF_STEPS, NUMBER_OF_EQUATIONS], dtype = dtype)
+    t = np.zeros(NUMBER_OF_STEPS, dtype = dtype)
+
+    fLote = lambda tk, Rk: _avaliaLote(f, tk, Rk, p)
+
+    passos = _instrumenta(_passosFixos(fLote, R0, t0, h, tableau, NUMBER_OF_STEPS, stats), stats, callback)
+
+    for n, (tn, y, dy, hn) in enumerate(passos):
+        t[n] = tn
+        r[:, n] = y #atualiza todas as trajetórias de uma só vez
+
+    return t, r
+
+def odeEulerLote(f, R0, t0, NUMBER_OF_STEPS = 100, h=0.01, p = None, stats = None, callback = None, dtype = np.float32):
+    """
+    Resolve M sistemas de EDOs de primeira ordem simultaneamente pelo método de Euler.
+
+    Parameters
+    ----------
+    f :  Function
+        EDOs escritas na forma "R' =  f(t, R)" ou "R' = f(t, R, p)", em que R é uma matriz (M, n)
+        com uma trajetória por linha. Deve retornar uma matriz (M, n).
+    R0 : Array
+        Matriz (M, n) com as condições iniciais de cada trajetória.
+    t0 : Float
+        Ponto inicial em que as funções são conhecidas.
+    NUMBER_OF_STEPS : Int, optional
+         Número de passos executados pelo método. The default is 100.
+    h : Float, optional
+        Passo em que o vetor t é atualizado. The default is 0.01.
+    p : Array, optional
+        Matriz (M, k) com os parâmetros de cada trajetória, repassada a f. The default is None.
+    stats : Estatisticas, optional
+        Se dado, acumula as avaliações de f (uma por lote), os passos, o histograma de h e os
+        tempos da integração. The default is None.
+    callback : Function, optional
+        callback(t, R, dR, h), chamada no ponto inicial (h = 0) e a cada passo do lote.
+        The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Vetor com valores da abcissa.
+    r : Array
+        Matriz (M, NUMBER_OF_STEPS, n) com as imagens correspondentes de t para cada trajetória.
+
+    """
+    return _odeTableauLote(f, R0, t0, NUMBER_OF_STEPS, h, p, EULER, stats, callback, dtype)
+
+def odeHeunLote(f, R0, t0, NUMBER_OF_STEPS = 100, h=0.01, p = None, stats = None, callback = None, dtype = np.float32):
+    """
+    Resolve M sistemas de EDOs de primeira ordem simultaneamente pelo método de Heun.
+
+    Parameters
+    ----------
+    f :  Function
+        EDOs escritas na forma "R' =  f(t, R)" ou "R' = f(t, R, p)", em que R é uma matriz (M, n)
+        com uma trajetória por linha. Deve retornar uma matriz (M, n).
+    R0 : Array
+        Matriz (M, n) com as condições iniciais de cada trajetória.
+    t0 : Float
+        Ponto inicial em que as funções são conhecidas.
+    NUMBER_OF_STEPS : Int, optional
+         Número de passos executados pelo método. The default is 100.
+    h : Float, optional
+        Passo em que o vetor t é atualizado. The default is 0.01.
+    p : Array, optional
+        Matriz (M, k) com os parâmetros de cada trajetória, repassada a f. The default is None.
+    stats : Estatisticas, optional
+        Se dado, acumula as avaliações de f (uma por lote), os passos, o histograma de h e os
+        tempos da integração. The default is None.
+    callback : Function, optional
+        callback(t, R, dR, h), chamada no ponto inicial (h = 0) e a cada passo do lote.
+        The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Vetor com valores da abcissa.
+    r : Array
+        Matriz (M, NUMBER_OF_STEPS, n) com as imagens correspondentes de t para cada trajetória.
+
+    """
+    return _odeTableauLote(f, R0, t0, NUMBER_OF_STEPS, h, p, HEUN, stats, callback, dtype)
+
+def odeRunge_KuttaLote(f, R0, t0, NUMBER_OF_STEPS = 100, h=0.01, p = None, stats = None, callback = None, dtype = np.float32):
+    """
+    Resolve M sistemas de EDOs de primeira ordem simultaneamente pelo método de Runge-Kutta de quarta ordem.
+
+    Parameters
+    ----------
+    f :  Function
+        EDOs escritas na forma "R' =  f(t, R)" ou "R' = f(t, R, p)", em que R é uma matriz (M, n)
+        com uma trajetória por linha. Deve retornar uma matriz (M, n).
+    R0 : Array
+        Matriz (M, n) com as condições iniciais de cada trajetória.
+    t0 : Float
+        Ponto inicial em que as funções são conhecidas.
+    NUMBER_OF_STEPS : Int, optional
+         Número de passos executados pelo método. The default is 100.
+    h : Float, optional
+        Passo em que o vetor t é atualizado. The default is 0.01.
+    p : Array, optional
+        Matriz (M, k) com os parâmetros de cada trajetória, repassada a f. The default is None.
+    stats : Estatisticas, optional
+        Se dado, acumula as avaliações de f (uma por lote), os passos, o histograma de h e os
+        tempos da integração. The default is None.
+    callback : Function, optional
+        callback(t, R, dR, h), chamada no ponto inicial (h = 0) e a cada passo do lote.
+        The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Vetor com valores da abcissa.
+    r : Array
+        Matriz (M, NUMBER_OF_STEPS, n) com as imagens correspondentes de t para cada trajetória.
+
+    """
+    return _odeTableauLote(f, R0, t0, NUMBER_OF_STEPS, h, p, RK4, stats, callback, dtype)
+
+def odeRunge_Kutta_FehlbergLote(f, R0, t0, NUMBER_OF_STEPS = 100, h=0.01, alpha = 0.9, e = 1E-3, p = None, tableau = RKF45,
+                                stats = None, callback = None, dtype = np.float32):
+    """
+     Resolve M sistemas de EDOs de primeira ordem simultaneamente pelo método de Runge-Kutta-Fehlberg.
+     Cada trajetória adapta o seu próprio passo h; quando alguma linha rejeita o passo, a
+     tentativa é refeita com o lote inteiro (passo nulo nas linhas que já o aceitaram), de modo
+     que f sempre recebe as M linhas, como um MotorDoisTempos com parâmetros vetoriais (M,).
+
+     As linhas não são iguais bit a bit às integrações individuais (odeRunge_Kutta_FehlbergSys):
+     f avaliada em uma matriz (M, n) pode arredondar diferente de f em um vetor (n,) (as potências
+     vetorizadas do NumPy, por exemplo), e o controle do passo amplifica a diferença, de modo que
+     as sequências de passos se separam e os pontos de mesmo índice não são comparáveis. No mesmo
+     instante, a diferença entre uma linha e a integração individual é da ordem do erro de
+     integração de cada uma (no motor, menor que o erro de ambas em relação a uma referência).
+
+    Parameters
+    ----------
+    f :  Function
+        EDOs escritas na forma "R' =  f(t, R)" ou "R' = f(t, R, p)", em que R é uma matriz (m, n)
+        e t um vetor (m,) com o tempo de cada linha. Deve retornar uma matriz (m, n).
+    R0 : Array
+        Matriz (M, n) com as condições iniciais de cada trajetória.
+    t0 : Float
+        Ponto inicial em que as funções são conhecidas.
+    NUMBER_OF_STEPS : Int, optional
+        Número de passos executados pelo método. The default is 100.
+    h : Float, optional
+        Passo inicial em que o vetor t é atualizado. The default is 0.01.
+    alpha: Float optional
+        Magnitude na qual q deve ser menor que uma dada expressão para que h seja adpatado.
+    e: Float, optional
+        Tolerância máxima de erro admissível para um determinado passo.
+    p : Array, optional
+        Matriz (M, k) com os parâmetros de cada trajetória, repassada a f. The default is None.
+    tableau : Tableau, optional
+        Par embutido usado no passo e na estimativa do erro. The default is RKF45.
+    stats : Estatisticas, optional
+        Se dado, acumula as avaliações de f (uma por chamada, com todas as linhas),
+        os passos aceitos e rejeitados de cada trajetória, o histograma de h e os tempos.
+        The default is None.
+    callback : Function, optional
+        callback(t, R, dR, h), chamada no ponto inicial e depois que todas as trajetórias
+        aceitam cada passo, com t e h vetores (M,) e dR = None. The default is None.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados (veja odeTableauSys). The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Matriz (M, NUMBER_OF_STEPS) com os valores da abcissa de cada trajetória.
+    r : Array
+        Matriz (M, NUMBER_OF_STEPS, n) com as imagens correspondentes de t para cada trajetória.
+    H : Array
+        Matriz (M, NUMBER_OF_STEPS) com o passo aceito que levou cada trajetória a cada ponto (H[:, 0] = 0).
+
+    """
+    R0 = np.atleast_2d(np.asarray(R0, dtype = np.float64))
+    M, NUMBER_OF_EQUATIONS = R0.shape
+
+    r = np.zeros([M, NUMBER_OF_STEPS, NUMBER_OF_EQUATIONS], dtype = dtype)
+    t = np.zeros([M, NUMBER_OF_STEPS], dtype = dtype)
+    H = np.zeros([M, NUMBER_OF_STEPS], dtype = dtype)
+
+    r[:, 0] = R0
+    t[:, 0] = t0
+
+    inicio = time.perf_counter()
+    if stats is not None:
+        f = stats.envolve(f)
+    if callback is not None:
+        callback(t[:, 0], R0, None, H[:, 0])
+
+    hLote = np.full(M, h, dtype = np.float64) #passo individual de cada trajetória
+    tLote = np.full(M, t0, dtype = np.float64) #tempo de cada trajetória em precisão dupla
+    compLote = np.zeros(M) #arredondamento acumulado em tLote (soma compensada)
+    yLote = R0.copy() #estado corrente de cada trajetória em precisão dupla
+    passo = PassoRK(tableau, (M, NUMBER_OF_EQUATIONS))
+    fLote = lambda tk, Rk: _avaliaLote(f, tk, Rk, p)
+    rNovo = np.empty_like(yLote)
+    expoente = 1/tableau.ordemErro
+
+    for n in range(0, NUMBER_OF_STEPS - 1):
+        pendente = np.arange(M) #trajetórias que ainda não aceitaram o passo n
+        hTentativa = np.zeros(M)
+
+        while (pendente.size > 0):
+            #o lote inteiro é avaliado; as linhas que já aceitaram o passo ficam paradas (h = 0)
+            hTentativa[:] = 0
+            hTentativa[pendente] = hLote[pendente]
+            hc = hTentativa[:, None] #passo em coluna para multiplicar as linhas de K
+
+            passo.passo(fLote, tLote[:, None], yLote, hc, rNovo)
+            r5 = rNovo[pendente]
+            hn = hLote[pendente]
+
+            #O menor q de cada linha corresponde ao maior erro; componentes com erro nulo não limitam o passo.
+            Den = np.max(np.abs(passo.estimaErro(hc)[pendente]), axis = 1)
+            q = np.full(pendente.size, np.inf)
+            np.divide(e*hn, Den, out = q, where = Den != 0)
+            np.power(q, expoente, out = q)
+            q *= alpha
+
+            aceito = q >= 1
+
+            #Trajetórias aceitas: armazena o passo e aumenta h para o próximo
+            ok = pendente[aceito]
+            yLote[ok] = r5[aceito]
+            r[ok, n+1] = r5[aceito]
+            tLote[ok], compLote[ok] = _somaCompensada(tLote[ok], compLote[ok], hn[aceito])
+            t[ok, n+1] = tLote[ok]
+            H[ok, n+1] = hn[aceito]
+            hLote[ok] = np.where(np.isfinite(q[aceito]), q[aceito]*hn[aceito], hn[aceito])
+
+            if stats is not None:
+                stats.registraPasso(hn[aceito])
+                stats.registraRejeicao(hn[~aceito])
+
+            #Trajetórias rejeitadas: diminui o passo e tenta novamente
+            hLote[pendente[~aceito]] = q[~aceito]*hn[~aceito]
+            pendente = pendente[~aceito]
+
+        if callback is not None:
+            callback(t[:, n+1], yLote, None, H[:, n+1])
+
+    if stats is not None:
+        stats.tempoTotal += time.perf_counter() - inicio
+
+    return t, r, H
+
+#%%
+################################################################################################
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Integração do motor de dois tempos com o crank angle como variável independente.
+
+Como theta' = w, trocando t por theta o sistema fica
+
+    dw/dtheta = (g(theta) - (C/I)*w**2)/w,      g(theta) = T3(theta)*(A*R/I)*sin(theta)
+    dt/dtheta = 1/w
+
+e o torque g depende apenas de theta. Em uma malha angular fixa, os nós dos estágios do
+RK4 se repetem a cada revolução: g é tabelado uma vez por geometria e cada passo faz apenas
+três consultas à tabela, sem potências nem cossenos.
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import collections
+
+import numpy as np
+
+#%%
+############################Tabela do torque####################################
+
+_TABELAS = collections.OrderedDict() #cache LRU das tabelas do torque
+_TAMANHO_CACHE = 32
+
+def _chaveMotor(motor):
+    """
+    Identidade da lei da pressão do motor: chaveCache() quando existe (MotorTabelado) ou a
+    geometria de MotorDoisTempos.constantes(), junto com a classe.
+    """
+    chave = motor.chaveCache() if hasattr(motor, "chaveCache") else motor.constantes()
+    return (type(motor), repr(chave))
+
+def tabelaTorque(motor, passosPorRevolucao = 720, theta0 = 0.0):
+    """
+    Torque dividido por I, g(theta), na malha de meio passo de uma revolução que começa
+    em theta0: o elemento j corresponde a theta0 + j*dtheta/2, com dtheta = 2*pi/passosPorRevolucao.
+
+    A pressão vem de motor.pressao, a mesma do lado direito no tempo. As tabelas ficam em um
+    cache LRU pelo motor (a classe e MotorDoisTempos.constantes(), ou chaveCache()), pela malha
+    e pela fase de theta0, e são reaproveitadas entre revoluções e entre integrações.
+    """
+    fase0 = float(np.mod(theta0, 2*np.pi))
+    chave = (_chaveMotor(motor), int(passosPorRevolucao), fase0)
+    if chave in _TABELAS:
+        _TABELAS.move_to_end(chave)
+        return _TABELAS[chave]
+
+    #nós do RK4: início, meio e fim de cada passo, isto é, uma malha de meio passo
+    theta = fase0 + np.arange(2*int(passosPorRevolucao))*(np.pi/int(passosPorRevolucao))
+    tabela = np.asarray(motor.pressao(theta)*float(motor.AR_I)*np.sin(theta), dtype = np.float64)
+    tabela.setflags(write = False)
+
+    _TABELAS[chave] = tabela
+    if len(_TABELAS) > _TAMANHO_CACHE:
+        _TABELAS.popitem(last = False)
+    return tabela
+
+#%%
+############################Integração no domínio do ângulo####################################
+
+def odeAnguloSys(motor, r0, t0, revolucoes = 10, passosPorRevolucao = 720, dtype = np.float32):
+    """
+    Integra o motor pelo RK4 com passo fixo em theta, usando a tabela do torque.
+
+    Parameters
+    ----------
+    motor : MotorDoisTempos
+        Motor com parâmetros escalares.
+    r0 : Array
+        Condições iniciais (w0, theta0), com w0 > 0.
+    t0 : Float
+        Tempo inicial.
+    revolucoes : Float, optional
+        Número de revoluções integradas. The default is 10.
+    passosPorRevolucao : Int, optional
+        Passos em cada revolução. Um número par põe theta = pi na malha quando theta0 é
+        múltiplo de pi, e nenhum passo atravessa a troca de lei da pressão. The default is 720.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados. The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Instantes de cada ponto da malha angular (não uniformes).
+    r : Array
+        Matriz com w e theta em cada ponto, como nos integradores no tempo. Se w chegar a
+        zero (o motor parou), a integração termina no último ponto com w > 0.
+
+    """
+    w0, theta0 = float(r0[0]), float(r0[1])
+    if w0 <= 0:
+        raise ValueError("A integração em theta exige w0 > 0.")
+
+    N = int(passosPorRevolucao)
+    total = int(round(revolucoes*N))
+    dtheta = 2*np.pi/N
+    tabela = tabelaTorque(motor, N, theta0).tolist() #floats do Python: consultas sem overhead do NumPy
+    C_I = float(motor.C_I)
+    meio = 0.5*dtheta
+    sexto = dtheta/6
+
+    w = np.empty(total + 1)
+    t = np.empty(total + 1)
+    w[0], t[0] = w0, t0
+    wn, tn = w0, float(t0)
+
+    n = 0
+    for n in range(total):
+        j = (2*n) % (2*N)
+        g0, g1, g2 = tabela[j], tabela[j+1], tabela[(j+2) % (2*N)]
+
+        k1 = (g0 - C_I*wn*wn)/wn
+        w2 = wn + meio*k1
+        if w2 <= 0:
+            break
+        k2 = (g1 - C_I*w2*w2)/w2
+        w3 = wn + meio*k2
+        if w3 <= 0:
+            break
+        k3 = (g1 - C_I*w3*w3)/w3
+        w4 = wn + dtheta*k3
+        if w4 <= 0:
+            break
+        k4 = (g2 - C_I*w4*w4)/w4
+
+        wNovo = wn + sexto*(k1 + 2*k2 + 2*k3 + k4)
+        if wNovo <= 0:
+            break
+        tn = tn + sexto*(1/wn + 2/w2 + 2/w3 + 1/w4)
+        wn = wNovo
+        w[n+1], t[n+1] = wn, tn
+    else:
+        n = total
+
+    pontos = n + 1
+    r = np.empty((pontos, 2), dtype = dtype)
+    r[:, 0] = w[:pontos]
+    r[:, 1] = theta0 + np.arange(pontos)*dtheta #malha exata, sem acumular arredondamento
+    return t[:pontos].astype(dtype), r
+
+def revolucoesAngulo(t, r, passosPorRevolucao = 720):
+    """
+    Velocidade angular média de cada revolução completa de uma trajetória de odeAnguloSys:
+    2*pi dividido pelo tempo entre pontos separados por passosPorRevolucao passos.
+    """
+    t = np.asarray(t, dtype = np.float64)
+    inicio = t[:len(t) - passosPorRevolucao:passosPorRevolucao]
+    fim = t[passosPorRevolucao::passosPorRevolucao]
+    return 2*np.pi/(fim - inicio)
+
+#%%
+################################################################################################
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de trabalho x precisão dos métodos do EDOs.py no problema do motor.
+
+Cada método é comparado com uma solução de referência de alta precisão. Para cada
+configuração são medidos o tempo de parede, o número de avaliações de f, o pico de
+memória e os erros da velocidade angular final e da convergida (média da última
+revolução). O resultado é gravado em JSON e, opcionalmente, em gráficos.
+
+Uso:
+    python benchmark.py --saida benchmark.json --graficos figuras/
+    python benchmark.py --baseline benchmark.json   (modo de regressão)
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import ciclos
+import EDOs as ed
+from motor import MotorDoisTempos
+
+#%%
+############################Configurações####################################
+
+W0, THETA0, T0 = 50, 0, 0 #condições iniciais do main.py
+
+#(rótulo, função, argumentos): os de passo fixo variam h, o adaptativo varia a tolerância e
+CONFIGURACOES = ([("Euler", ed.odeEulerSys, {"h": h}) for h in (0.01, 0.005, 0.001)] +
+                 [("Heun", ed.odeHeunSys, {"h": h}) for h in (0.05, 0.01, 0.005, 0.001)] +
+                 [("Runge-Kutta", ed.odeRunge_KuttaSys, {"h": h}) for h in (0.05, 0.01, 0.005, 0.001)] +
+                 [("Runge-Kutta-Fehlberg", ed.odeAdaptativoSys, {"h": 0.1, "e": e}) for e in (1E-2, 1E-3, 1E-4, 1E-5)])
+
+class _ContaAvaliacoes:
+    """
+    Envolve f contando as avaliações do lado direito.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.n = 0
+
+    def __call__(self, t, r):
+        self.n += 1
+        return self.f(t, r)
+
+def _executa(funcao, f, t_end, argumentos):
+    """
+    Integra até t_end e retorna (t, r) em float64, para que o arredondamento da saída não
+    entre nos erros medidos.
+    """
+    if funcao is ed.odeAdaptativoSys:
+        t, r, _ = funcao(f, (W0, THETA0), T0, t_end, dtype = np.float64, **argumentos)
+        return t, r
+    h = argumentos["h"]
+    return funcao(f, (W0, THETA0), T0, NUMBER_OF_STEPS = int(round((t_end - T0)/h)) + 1, h = h, dtype = np.float64)
+
+def wMedioUltimaRevolucao(t, r, f):
+    """
+    Velocidade angular média da última revolução completa (2*pi dividido pelo seu período).
+    As passagens por 2*pi*k são localizadas por ciclos.revolucoesNoPasso na interpolação de
+    Hermite dos passos, com as derivadas f(t, r) nos pontos da saída, e não linearmente, o que
+    com passos adaptativos grandes somaria o erro da interpolação ao erro medido.
+    """
+    t = np.asarray(t, dtype = np.float64)
+    r = np.asarray(r, dtype = np.float64)
+    k = np.floor(r[:, 1]/(2*np.pi))
+    i = np.nonzero(np.diff(k) > 0)[0] #passos que cruzam um múltiplo de 2*pi
+    if len(i) == 0:
+        return np.nan
+    passagens = []
+    for j in i[-2:]:
+        dy0 = np.asarray(f(t[j], r[j]), dtype = np.float64)
+        dy1 = np.asarray(f(t[j+1], r[j+1]), dtype = np.float64)
+        passagens += ciclos.revolucoesNoPasso(t[j], r[j], dy0, t[j+1], r[j+1], dy1)
+    if len(passagens) < 2:
+        return np.nan
+    (kA, tA, _), (kB, tB, _) = passagens[-2:]
+    return 2*np.pi*(kB - kA)/(tB - tA)
+
+def referencia(motor, t_end, e = 1E-9):
+    """
+    Solução de referência: Dormand-Prince com tolerância apertada e eventos nas trocas de fase.
+    Retorna (w final, w convergido).
+    """
+    t, r, _ = ed.odeAdaptativoSys(motor, (W0, THETA0), T0, t_end, h = 1E-3, e = e,
+                                  tableau = ed.DOPRI54, eventos = [motor.trocaDeFase])
+    return float(r[-1, 0]), float(wMedioUltimaRevolucao(t, r, motor))
+
+#%%
+############################Execução####################################
+
+def mede(rotulo, funcao, argumentos, motor, t_end, wRef, wConvRef, repeticoes = 3):
+    """
+    Mede uma configuração: melhor tempo entre as repetições, avaliações de f, pico de memória
+    (em uma execução separada, com tracemalloc) e erros em relação à referência.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        f = _ContaAvaliacoes(motor)
+        inicio = time.perf_counter()
+        t, r = _executa(funcao, f, t_end, argumentos)
+        tempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    _executa(funcao, motor, t_end, argumentos)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"metodo": rotulo,
+            "argumentos": argumentos,
+            "tempo": min(tempos),
+            "avaliacoes": f.n,
+            "passos": int(len(t)),
+            "memoriaPico": int(pico),
+            "erroFinal": abs(float(r[-1, 0]) - wRef),
+            "erroConvergido": abs(float(wMedioUltimaRevolucao(t, r, motor)) - wConvRef)}
+
+def executaBenchmark(t_end = 13.0, repeticoes = 3, configuracoes = CONFIGURACOES, progresso = print):
+    """
+    Executa todas as configurações e retorna o dicionário gravado em JSON.
+    """
+    motor = MotorDoisTempos()
+    wRef, wConvRef = referencia(motor, t_end)
+
+    resultados = []
+    for rotulo, funcao, argumentos in configuracoes:
+        resultado = mede(rotulo, funcao, argumentos, motor, t_end, wRef, wConvRef, repeticoes)
+        resultados.append(resultado)
+        if progresso is not None:
+            progresso("%-22s %-20s %8.3f s %9d f %10.3e" % (rotulo, argumentos, resultado["tempo"],
+                                                            resultado["avaliacoes"], resultado["erroConvergido"]))
+
+    return {"t_end": t_end,
+            "referencia": {"wFinal": wRef, "wConvergido": wConvRef},
+            "ambiente": {"python": platform.python_version(), "numpy": np.__version__, "maquina": platform.machine()},
+            "resultados": resultados}
+
+#%%
+############################Gráficos e regressão####################################
+
+def graficos(dados, diretorio):
+    """
+    Grava os gráficos de trabalho x precisão (erro x avaliações de f e erro x tempo).
+    """
+    import os
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    os.makedirs(diretorio, exist_ok = True)
+    for eixo, rotuloEixo in (("avaliacoes", "Avaliações de f"), ("tempo", "Tempo (s)")):
+        fig, ax = plt.subplots()
+        for metodo in dict.fromkeys(res["metodo"] for res in dados["resultados"]):
+            linhas = [res for res in dados["resultados"] if res["metodo"] == metodo]
+            ax.loglog([res[eixo] for res in linhas], [res["erroConvergido"] for res in linhas], "o-", label = metodo)
+        ax.set_title("Trabalho x precisão")
+        ax.set_xlabel(rotuloEixo)
+        ax.set_ylabel("Erro da velocidade angular convergida (rad/s)")
+        ax.grid(True, which = "both")
+        ax.legend()
+        fig.savefig(os.path.join(diretorio, "trabalho_precisao_%s.png" % eixo), dpi = 120)
+        plt.close(fig)
+
+def comparaBaseline(dados, baseline, toleranciaTempo = 1.5, toleranciaErro = 1.1, erroMinimo = 1E-9):
+    """
+    Lista as regressões em relação a um JSON anterior: configurações mais lentas que
+    toleranciaTempo vezes o tempo da baseline ou com erro maior que toleranciaErro vezes
+    o erro da baseline (erros abaixo de erroMinimo são considerados iguais).
+    """
+    anteriores = {(res["metodo"], json.dumps(res["argumentos"], sort_keys = True)): res for res in baseline["resultados"]}
+    regressoes = []
+    for res in dados["resultados"]:
+        base = anteriores.get((res["metodo"], json.dumps(res["argumentos"], sort_keys = True)))
+        if base is None:
+            continue
+        if res["tempo"] > toleranciaTempo*base["tempo"]:
+            regressoes.append("%s %s: tempo %.3f s > %.3f s" % (res["metodo"], res["argumentos"], res["tempo"], base["tempo"]))
+        for erro in ("erroFinal", "erroConvergido"):
+            if res[erro] > max(toleranciaErro*base[erro], erroMinimo):
+                regressoes.append("%s %s: %s %.3e > %.3e" % (res["metodo"], res["argumentos"], erro, res[erro], base[erro]))
+    return regressoes
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--t-end", type = float, default = 13.0, help = "tempo final das integrações")
+    parser.add_argument("--repeticoes", type = int, default = 3, help = "repetições para medir o tempo")
+    parser.add_argument("--saida", help = "arquivo JSON com os resultados")
+    parser.add_argument("--graficos", help = "pasta para os gráficos de trabalho x precisão")
+    parser.add_argument("--baseline", help = "JSON de referência: falha se houver regressão")
+    parser.add_argument("--tolerancia-tempo", type = float, default = 1.5)
+    parser.add_argument("--tolerancia-erro", type = float, default = 1.1)
+    args = parser.parse_args(argv)
+
+    dados = executaBenchmark(args.t_end, args.repeticoes)
+
+    if args.saida:
+        with open(args.saida, "w", encoding = "utf-8") as arquivo:
+            json.dump(dados, arquivo, indent = 2)
+    if args.graficos:
+        graficos(dados, args.graficos)
+
+    if args.baseline:
+        with open(args.baseline, encoding = "utf-8") as arquivo:
+            regressoes = comparaBaseline(dados, json.load(arquivo), args.tolerancia_tempo, args.tolerancia_erro)
+        for regressao in regressoes:
+            print("REGRESSÃO:", regressao)
+        return 1 if regressoes else 0
+    return 0
+
+#%%
+################################################################################################
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Cache em disco das trajetórias de passo fixo, endereçado pelo conteúdo do problema.
+
+A chave é um hash do método (Tableau), do lado direito e dos seus parâmetros, de h, de t0
+e do estado inicial, sem o número de passos. Assim:
+
+    - um pedido mais curto que uma trajetória guardada é respondido com o seu prefixo;
+    - um pedido mais longo retoma a integração do último estado guardado e só calcula
+      os passos que faltam, com o mesmo resultado de uma integração única.
+
+As trajetórias são gravadas em float64 (.npy) e lidas com mmap; o tamanho total da pasta é
+limitado e os arquivos usados há mais tempo são removidos primeiro.
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import hashlib
+import os
+import types
+
+import numpy as np
+
+import EDOs as ed
+
+#%%
+############################Chave do problema####################################
+
+def _nomesGlobais(codigo):
+    """
+    Nomes (co_names) lidos pelo código e pelas funções definidas dentro dele.
+    """
+    nomes = set(codigo.co_names)
+    for constante in codigo.co_consts:
+        if hasattr(constante, "co_names"):
+            nomes |= _nomesGlobais(constante)
+    return nomes
+
+def _descreveValor(valor, vistos):
+    """
+    Descrição estável de um valor lido pelo lado direito (global ou variável capturada).
+    """
+    if isinstance(valor, types.ModuleType):
+        return "módulo " + valor.__name__
+    if isinstance(valor, type):
+        return "classe %s.%s" % (valor.__module__, valor.__qualname__)
+    if isinstance(valor, np.ndarray):
+        return repr((valor.dtype.str, valor.shape, hashlib.sha256(np.ascontiguousarray(valor).tobytes()).hexdigest()))
+    if hasattr(valor, "chaveCache") or hasattr(valor, "parametros") or hasattr(valor, "__code__"):
+        return identidade(valor, vistos)
+    texto = repr(valor)
+    if " at 0x" in texto or " object at " in texto:
+        raise TypeError("Não é possível identificar %r para o cache: defina f.chaveCache()." % (valor,))
+    return texto
+
+def identidade(f, vistos = None):
+    """
+    Descrição estável do lado direito usada na chave.
+
+    Usa f.chaveCache() se existir; senão, a classe e f.parametros() (como em MotorDoisTempos);
+    senão, o nome qualificado, o bytecode, os valores padrão, as variáveis capturadas e os
+    valores das variáveis globais lidas pela função (como uma constante K em "lambda t, r: K*r").
+    Valores sem descrição estável (objetos cujo repr é apenas o endereço) geram TypeError.
+    """
+    if hasattr(f, "chaveCache"):
+        return repr(f.chaveCache())
+    if hasattr(f, "parametros"):
+        parametros = f.parametros()
+        return repr((type(f).__module__, type(f).__qualname__,
+                     sorted((nome, np.asarray(valor).tolist()) for nome, valor in parametros.items())))
+    codigo = getattr(f, "__code__", None)
+    if codigo is None:
+        raise TypeError("Não é possível identificar %r para o cache: defina f.chaveCache()." % (f,))
+
+    vistos = set() if vistos is None else vistos
+    if id(f) in vistos: #função recursiva ou que se referem umas às outras
+        return repr((f.__module__, f.__qualname__))
+    vistos.add(id(f))
+
+    celulas = tuple(_descreveValor(c.cell_contents, vistos) for c in (f.__closure__ or ()))
+    espaco = getattr(f, "__globals__", {})
+    globais = tuple((nome, _descreveValor(espaco[nome], vistos)) for nome in sorted(_nomesGlobais(codigo))
+                    if nome in espaco)
+    return repr((f.__module__, f.__qualname__, codigo.co_code.hex(), repr(codigo.co_consts),
+                 repr(f.__defaults__), celulas, globais))
+
+def chave(f, r0, t0, h, tableau):
+    """
+    Hash SHA-256 do problema de passo fixo, sem o número de passos.
+    """
+    sha = hashlib.sha256()
+    sha.update(identidade(f).encode())
+    for array in (tableau.A, tableau.b, tableau.c):
+        sha.update(np.ascontiguousarray(array, dtype = np.float64).tobytes())
+    r0 = np.asarray(r0, dtype = np.float64)
+    sha.update(repr(r0.shape).encode())
+    sha.update(r0.tobytes())
+    sha.update(np.array([t0, h], dtype = np.float64).tobytes())
+    return sha.hexdigest()
+
+#%%
+############################Cache####################################
+
+class CacheResultados:
+    """
+    Cache de trajetórias de passo fixo em uma pasta.
+
+    Parameters
+    ----------
+    diretorio : String
+        Pasta dos arquivos do cache.
+    tamanhoMax : Int, optional
+        Tamanho máximo da pasta em bytes. The default is 2**30 (1 GiB).
+
+    """
+    def __init__(self, diretorio, tamanhoMax = 2**30):
+        self.diretorio = diretorio
+        self.tamanhoMax = tamanhoMax
+        os.makedirs(diretorio, exist_ok = True)
+        self.acertos = 0 #respondidos pelo prefixo de uma trajetória guardada
+        self.retomadas = 0 #continuados a partir do último estado guardado
+        self.faltas = 0 #integrados desde o início
+
+    def _caminho(self, k):
+        return os.path.join(self.diretorio, k + ".npy")
+
+    def odeTableauSys(self, f, r0, t0, NUMBER_OF_STEPS = 100, h=0.01, tableau = ed.RK4, dtype = np.float32):
+        """
+        Mesmo resultado de EDOs.odeTableauSys, usando e atualizando o cache.
+        """
+        k = chave(f, r0, t0, h, tableau)
+        caminho = self._caminho(k)
+        guardado = np.load(caminho, mmap_mode = "r") if os.path.exists(caminho) else None
+
+        if guardado is not None and len(guardado) >= NUMBER_OF_STEPS:
+            self.acertos += 1
+            r = np.array(guardado[:NUMBER_OF_STEPS], dtype = dtype)
+            del guardado
+            os.utime(caminho) #uso recente, para a remoção LRU
+        else:
+            if guardado is None:
+                self.faltas += 1
+                inicio, r0Passos, partes = 0, r0, []
+            else:
+                self.retomadas += 1
+                inicio = len(guardado) - 1
+                r0Passos, partes = np.array(guardado[-1]), [np.array(guardado[:-1])]
+            del guardado
+
+            passos = ed._passosFixos(f, r0Passos, t0, h, tableau, NUMBER_OF_STEPS - inicio, n0 = inicio)
+            novos = np.empty((NUMBER_OF_STEPS - inicio,) + np.shape(r0), dtype = np.float64)
+            for n, (tn, y, dy, hn) in enumerate(passos):
+                novos[n] = y
+            completo = np.concatenate(partes + [novos])
+
+            #o sufixo .tmp fica fora de tamanho() e _limita() de outros processos durante a gravação;
+            #com um arquivo aberto, np.save não acrescenta .npy ao nome
+            temporario = caminho + ".%d.tmp" % os.getpid()
+            with open(temporario, "wb") as arquivo:
+                np.save(arquivo, completo)
+            os.replace(temporario, caminho)
+            self._limita()
+            r = completo.astype(dtype)
+
+        t = (float(t0) + np.arange(NUMBER_OF_STEPS)*h).astype(dtype) #os mesmos t0 + n*h de _passosFixos
+        return t, r
+
+    def tamanho(self):
+        return sum(os.path.getsize(os.path.join(self.diretorio, nome)) for nome in os.listdir(self.diretorio)
+                   if nome.endswith(".npy"))
+
+    def _limita(self):
+        """
+        Remove os arquivos usados há mais tempo até a pasta caber em tamanhoMax.
+        """
+        arquivos = []
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith(".npy"):
+                info = os.stat(os.path.join(self.diretorio, nome))
+                arquivos.append((info.st_mtime, info.st_size, nome))
+        arquivos.sort()
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        #o arquivo mais recente (o que acabou de ser gravado) nunca é removido
+        for _, tamanho, nome in arquivos[:-1]:
+            if total <= self.tamanhoMax:
+                break
+            try:
+                os.remove(os.path.join(self.diretorio, nome))
+            except FileNotFoundError: #removido por outro processo
+                pass
+            total -= tamanho
+
+    def limpa(self):
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith(".npy"):
+                os.remove(os.path.join(self.diretorio, nome))
+
+#%%
+################################################################################################
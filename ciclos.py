@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Análise por ciclo (revolução do crank) das trajetórias do motor de dois tempos.
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import collections
+
+import numpy as np
+
+import EDOs as ed
+
+CONVERGIU, NAO_CONVERGIU, PAROU = 0, 1, 2 #status comuns das buscas do regime (mapa, orbita)
+
+#%%
+############################Passagens de theta por 2*pi*k####################################
+
+def localizaCruzamento(t0, y0, dy0, t1, y1, dy1, indice, alvo, iteracoes = 60):
+    """
+    Instante em que a componente "indice" atinge "alvo" dentro do passo [t0, t1], usando a
+    interpolação de Hermite do passo e o método da bisseção.
+
+    Returns
+    -------
+    t : Float
+        Instante da passagem.
+    s : Float
+        Posição relativa da passagem no passo, (t - t0)/(t1 - t0).
+
+    """
+    h = t1 - t0
+    a, b = 0.0, 1.0
+    ga = y0[indice] - alvo
+
+    for _ in range(iteracoes):
+        s = 0.5*(a + b)
+        g = ed.interpolaHermite(s, h, y0[indice], dy0[indice], y1[indice], dy1[indice]) - alvo
+        if (g > 0) == (ga > 0):
+            a, ga = s, g
+        else:
+            b = s
+        if b - a < 1E-15:
+            break
+
+    s = 0.5*(a + b)
+    return t0 + s*h, s
+
+def revolucoesNoPasso(t0, y0, dy0, t1, y1, dy1, indiceAngulo = 1):
+    """
+    Lista das passagens do ângulo por múltiplos de 2*pi dentro do passo [t0, t1], em ordem.
+    Cada item é (k, t, s): a passagem por 2*pi*k no instante t, na posição relativa s do passo.
+    Se o ângulo diminui (motor girando ao contrário), k decresce. Um passo com ângulo não
+    finito não tem passagens.
+    """
+    if not (np.isfinite(y0[indiceAngulo]) and np.isfinite(y1[indiceAngulo])):
+        return []
+    kA = np.floor(y0[indiceAngulo]/(2*np.pi))
+    kB = np.floor(y1[indiceAngulo]/(2*np.pi))
+    if kB > kA:
+        alvos = np.arange(kA + 1, kB + 1)
+    elif kB < kA:
+        alvos = np.arange(kA, kB, -1)
+    else:
+        return []
+    return [(int(k),) + localizaCruzamento(t0, y0, dy0, t1, y1, dy1, indiceAngulo, 2*np.pi*k) for k in alvos]
+
+#%%
+############################Estatísticas por ciclo####################################
+
+#Linha da tabela de ciclos
+CICLO_DTYPE = np.dtype([("k", np.int64), #revolução: de 2*pi*k a 2*pi*(k+1)
+                        ("t", np.float64), #instante de início da revolução
+                        ("periodo", np.float64),
+                        ("wInicial", np.float64), #seção de Poincaré: w na passagem por 2*pi*k
+                        ("wMedio", np.float64),
+                        ("wMin", np.float64),
+                        ("wMax", np.float64),
+                        ("flutuacao", np.float64), #(wMax - wMin)/wMedio
+                        ("anguloTorqueMax", np.float64)]) #crank angle (mod 2*pi) do maior torque
+
+class _AcumuladorCiclo:
+    """
+    Estatísticas de uma revolução acumuladas passo a passo.
+    """
+    def __init__(self, k, t, w):
+        self.k = k
+        self.t = t
+        self.wInicial = w
+        self.wMin = w
+        self.wMax = w
+        self.torqueMax = -np.inf
+        self.anguloTorqueMax = np.nan
+
+    def adiciona(self, w, torque = None, angulo = None):
+        self.wMin = min(self.wMin, w)
+        self.wMax = max(self.wMax, w)
+        if torque is not None and torque > self.torqueMax:
+            self.torqueMax = torque
+            self.anguloTorqueMax = angulo % (2*np.pi)
+
+    def fecha(self, k, t, w):
+        self.adiciona(w)
+        periodo = t - self.t
+        wMedio = 2*np.pi*(k - self.k)/periodo
+        return (self.k, self.t, periodo, self.wInicial, wMedio, self.wMin, self.wMax,
+                (self.wMax - self.wMin)/wMedio, self.anguloTorqueMax)
+
+def odeCiclos(f, r0, t0, h=0.01, tableau = None, NUMBER_OF_STEPS = None, t_end = None, adaptativo = False,
+              indiceVelocidade = 0, indiceAngulo = 1, torque = None, alpha = 0.9, e = 1E-3, retornaParada = False):
+    """
+    Integra o sistema e, em vez da trajetória, retorna uma tabela com uma linha por revolução.
+
+    As passagens de theta por 2*pi*k são localizadas na interpolação de Hermite de cada passo,
+    e as estatísticas de cada revolução são acumuladas durante a integração, sem guardar os passos.
+    Se o motor parar (w <= 0 ou estado não finito), a integração termina ali.
+
+    Parameters
+    ----------
+    f : Function
+        EDOs escritas na forma padrão "r' =  f(t,r)".
+    r0 : Array
+        Condições iniciais.
+    t0 : Float
+        Tempo inicial.
+    h : Float, optional
+        Passo (ou passo inicial, se adaptativo). The default is 0.01.
+    tableau : Tableau, optional
+        Método utilizado. The default is RK4, ou RKF45 se adaptativo.
+    NUMBER_OF_STEPS : Int, optional
+        Número de pontos da integração, contando o inicial. The default is None.
+    t_end : Float, optional
+        Tempo final da integração. The default is None.
+    adaptativo : Bool, optional
+        Se True, usa o laço adaptativo. The default is False.
+    indiceVelocidade : Int, optional
+        Índice da velocidade angular no vetor de estado. The default is 0.
+    indiceAngulo : Int, optional
+        Índice do crank angle no vetor de estado. The default is 1.
+    torque : Function, optional
+        torque(t, r, dr) usado para localizar o pico de torque. The default is None, que usa
+        a aceleração angular dr[indiceVelocidade] (o torque líquido dividido por I).
+    alpha: Float optional
+        Fator de segurança do passo adaptativo. The default is 0.9.
+    e: Float, optional
+        Tolerância do passo adaptativo. The default is 1E-3.
+    retornaParada : Bool, optional
+        Se True, retorna também "parou". The default is False.
+
+    Returns
+    -------
+    tabela : Array
+        Array estruturado com dtype CICLO_DTYPE, uma linha por revolução completa.
+    parou : Bool
+        Apenas com retornaParada: se a integração terminou porque o motor parou.
+
+    """
+    iv, ia = indiceVelocidade, indiceAngulo
+    passos = ed.odePassos(f, r0, t0, h, tableau, NUMBER_OF_STEPS, t_end, adaptativo, alpha, e)
+
+    linhas = []
+    ciclo = None
+    tAnt = None
+    yAnt = np.empty(np.shape(r0))
+    dyAnt = np.empty(np.shape(r0))
+    parou = False
+
+    for t, y, dy, hn in passos:
+        if not np.all(np.isfinite(y)):
+            parou = True
+            break
+        if tAnt is None:
+            k0 = y[ia]/(2*np.pi)
+            if k0 == np.floor(k0): #começa exatamente no início de uma revolução
+                ciclo = _AcumuladorCiclo(int(k0), t, y[iv])
+        else:
+            for k, tk, s in revolucoesNoPasso(tAnt, yAnt, dyAnt, t, y, dy, ia):
+                wk = ed.interpolaHermite(s, t - tAnt, yAnt[iv], dyAnt[iv], y[iv], dy[iv])
+                if ciclo is not None:
+                    linhas.append(ciclo.fecha(k, tk, wk))
+                ciclo = _AcumuladorCiclo(k, tk, wk)
+
+        if ciclo is not None:
+            T = dy[iv] if torque is None else torque(t, y, dy)
+            ciclo.adiciona(y[iv], T, y[ia])
+
+        if y[iv] <= 0: #o motor parou
+            parou = True
+            break
+        tAnt = t
+        np.copyto(yAnt, y)
+        np.copyto(dyAnt, dy)
+
+    tabela = np.array(linhas, dtype = CICLO_DTYPE)
+    return (tabela, parou) if retornaParada else tabela
+
+#%%
+############################Regime permanente####################################
+
+RegimePermanente = collections.namedtuple("RegimePermanente", ["w", "t", "ciclos", "convergiu", "parou"])
+
+def odeRegimePermanente(f, r0, t0, h=0.01, tableau = None, adaptativo = False, tol = 1E-4, t_max = 100.0,
+                        indiceVelocidade = 0, indiceAngulo = 1, confirmacoes = 2, janela = 4, alpha = 0.9, e = 1E-3,
+                        paciencia = 40):
+    """
+    Integra até a velocidade angular média por revolução convergir e interrompe a integração.
+
+    A média de theta' em uma revolução é 2*pi dividido pelo tempo da revolução; no motor,
+    theta' = w, então essa é a velocidade angular média do ciclo. As médias se aproximam do
+    regime como uma contração com fator lambda perto de 1 (~0.96 no motor), de modo que a
+    variação entre revoluções subestima a distância até o regime por (1 - lambda)/lambda.
+
+    Por isso as médias das últimas 3*janela revoluções são agrupadas em três blocos de
+    "janela" revoluções, com médias B0, B1 e B2, e o erro de B2 é estimado como no
+    mapa.convergeRevolucoes, |B2 - B1|*q/(1 - q), em que q = (B2 - B1)/(B1 - B0) é a
+    contração de um bloco. Com passo fixo, as médias por ciclo flutuam com a fase dos passos
+    na revolução; o ruído de um bloco, sigma, é estimado pelos resíduos das médias em torno de
+    uma reta. q é a mediana das últimas estimativas feitas quando B1 - B0 se destacava desse
+    ruído (são exigidas ao menos "janela" delas), e a incerteza sqrt(2)*sigma de B2 - B1 é
+    somada a |B2 - B1| na estimativa do erro.
+
+    A integração para quando o erro fica abaixo de tol*B2 em "confirmacoes" revoluções
+    seguidas. Uma tolerância abaixo do ruído das médias do integrador não é atingida: quando
+    a estimativa do erro passa "paciencia" revoluções sem cair abaixo de 0.9 vezes a menor
+    anterior, a integração para sem convergir, antes de t_max.
+
+    Parameters
+    ----------
+    f : Function
+        EDOs escritas na forma padrão "r' =  f(t,r)".
+    r0 : Array
+        Condições iniciais.
+    t0 : Float
+        Tempo inicial.
+    h : Float, optional
+        Passo (ou passo inicial, se adaptativo). The default is 0.01.
+    tableau : Tableau, optional
+        Método utilizado. The default is RK4, ou RKF45 se adaptativo.
+    adaptativo : Bool, optional
+        Se True, usa o laço adaptativo. The default is False.
+    tol : Float, optional
+        Erro relativo estimado da velocidade angular média do regime. The default is 1E-4.
+    t_max : Float, optional
+        Tempo máximo de integração, caso não haja convergência. The default is 100.0.
+    indiceVelocidade : Int, optional
+        Índice da velocidade angular no vetor de estado. The default is 0.
+    indiceAngulo : Int, optional
+        Índice do crank angle no vetor de estado. The default is 1.
+    confirmacoes : Int, optional
+        Número de revoluções seguidas que devem satisfazer a tolerância. The default is 2.
+    janela : Int, optional
+        Revoluções em cada bloco da estimativa do erro. The default is 4.
+    alpha: Float optional
+        Fator de segurança do passo adaptativo. The default is 0.9.
+    e: Float, optional
+        Tolerância do passo adaptativo. The default is 1E-3.
+    paciencia : Int, optional
+        Revoluções sem redução da estimativa do erro até a integração parar sem convergir.
+        The default is 40.
+
+    Returns
+    -------
+    RegimePermanente
+        Tupla (w, t, ciclos, convergiu, parou) com a média das velocidades angulares médias
+        das últimas "janela" revoluções (a última, se ainda não houver 3*janela revoluções),
+        o instante em que a integração parou, o número de revoluções completas usadas, se a
+        tolerância foi atingida e se a integração terminou antes porque o motor parou
+        (w <= 0 ou estado não finito).
+
+    """
+    passos = ed.odePassos(f, r0, t0, h, tableau, t_end = t_max, adaptativo = adaptativo, alpha = alpha, e = e)
+
+    tAnt = None
+    yAnt = np.empty(np.shape(r0))
+    dyAnt = np.empty(np.shape(r0))
+
+    kRev = tRev = None #última passagem por 2*pi*k
+    medias = collections.deque(maxlen = 3*janela) #médias por ciclo das últimas revoluções
+    ciclosJanela = np.arange(3*janela)
+    contracoes = collections.deque(maxlen = 3*janela) #últimos fatores de contração confiáveis de um bloco
+    wMedio = np.nan
+    ciclos = 0
+    estaveis = 0
+    menorErro, cicloMenor = np.inf, 0 #menor estimativa do erro e a revolução em que ocorreu
+
+    for t, y, dy, hn in passos:
+        if not np.all(np.isfinite(y)):
+            return RegimePermanente(float(wMedio), float(tAnt), ciclos, False, True)
+        if tAnt is not None:
+            for k, tk, _ in revolucoesNoPasso(tAnt, yAnt, dyAnt, t, y, dy, indiceAngulo):
+                if tRev is not None:
+                    medias.append(2*np.pi*(k - kRev)/(tk - tRev))
+                    wMedio = medias[-1]
+                    ciclos += 1
+                    if len(medias) == medias.maxlen:
+                        B0, B1, B2 = np.mean(np.reshape(medias, (3, janela)), axis = 1)
+                        wMedio = B2
+                        residuos = medias - np.polyval(np.polyfit(ciclosJanela, medias, 1), ciclosJanela)
+                        sigma = np.sqrt(np.sum(residuos**2)/(3*janela - 2)/janela) #ruído da média de um bloco
+                        if abs(B1 - B0) > 3*np.sqrt(2)*sigma and 0 < (B2 - B1)/(B1 - B0) < 1:
+                            contracoes.append((B2 - B1)/(B1 - B0))
+                        erro = np.inf
+                        if len(contracoes) >= janela:
+                            q = np.median(contracoes)
+                            erro = (abs(B2 - B1) + np.sqrt(2)*sigma)*q/(1 - q)
+                        estaveis = estaveis + 1 if erro <= tol*abs(B2) else 0
+                        if estaveis >= confirmacoes:
+                            return RegimePermanente(float(wMedio), float(tk), ciclos, True, False)
+                        if erro < 0.9*menorErro:
+                            menorErro, cicloMenor = erro, ciclos
+                        elif ciclos - cicloMenor >= paciencia: #a estimativa chegou ao ruído
+                            return RegimePermanente(float(wMedio), float(tk), ciclos, False, False)
+                kRev, tRev = k, tk
+
+        if y[indiceVelocidade] <= 0: #o motor parou
+            return RegimePermanente(float(wMedio), float(t), ciclos, False, True)
+        tAnt = t
+        np.copyto(yAnt, y)
+        np.copyto(dyAnt, dy)
+
+    return RegimePermanente(float(wMedio), float(tAnt), ciclos, False, False)
+
+#%%
+################################################################################################
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Backend compilado (Numba) para integrar o motor de dois tempos.
+
+O laço de integração inteiro e o lado direito do motor são compilados juntos, sem
+chamadas ao interpretador em cada estágio. Se o Numba não estiver instalado, as
+mesmas funções usam o caminho em NumPy do EDOs.py.
+
+O lado direito compilado é a lei analítica do MotorDoisTempos, lida de motor.constantes().
+Outros lados direitos (o MotorTabelado ou subclasses, por exemplo) e motores com parâmetros
+vetoriais são integrados pelo caminho em NumPy com backend = "auto", e recusados com
+backend = "numba".
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import numpy as np
+
+import EDOs as ed
+from motor import MotorDoisTempos
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_DISPONIVEL = numba is not None
+
+def _compila(func):
+    """
+    Compila a função com numba.njit quando o Numba está disponível.
+    """
+    if numba is None:
+        return func
+    return numba.njit(cache = True)(func)
+
+#%%
+############################Kernels compilados####################################
+
+@_compila
+def _rhsMotor(w, theta, c):
+    """
+    Lado direito do motor para um estado escalar. c é a tupla de MotorDoisTempos.constantes().
+    """
+    AR_I, C_I, KExpansao, KCompressao, R, x0, n = c
+    fase = theta % (2*np.pi)
+    K = KExpansao if fase <= np.pi else KCompressao
+    T3 = K*(R - R*np.cos(fase) + x0)**(-n)
+    return T3*(AR_I*np.sin(theta)) - C_I*w*w, w
+
+@_compila
+def _estagios(A, cNos, K, y, yEstagio, t, h, c):
+    """
+    Calcula os estágios 1..s-1 de um passo, com K[0] já preenchido.
+    """
+    s = K.shape[0]
+    for i in range(1, s):
+        for m in range(2):
+            acc = y[m]
+            for j in range(i):
+                if A[i, j] != 0:
+                    acc += (A[i, j]*h)*K[j, m]
+            yEstagio[m] = acc
+        K[i, 0], K[i, 1] = _rhsMotor(yEstagio[0], yEstagio[1], c)
+
+@_compila
+def _combina(y, pesos, K, h, out):
+    """
+    out = y + h*sum(pesos_j*K_j).
+    """
+    for m in range(2):
+        acc = y[m]
+        for j in range(K.shape[0]):
+            if pesos[j] != 0:
+                acc += (pesos[j]*h)*K[j, m]
+        out[m] = acc
+
+@_compila
+def _rkFixoMotor(A, b, cNos, fsal, y0, t0, NUMBER_OF_STEPS, h, c, t, r):
+    """
+    Laço de passo fixo do odeTableauSys para o motor, gravando em t e r.
+    """
+    s = b.shape[0]
+    K = np.empty((s, 2))
+    y = y0.copy()
+    yNovo = np.empty(2)
+    yEstagio = np.empty(2)
+
+    tn = t0
+    t[0] = tn
+    r[0, 0] = y[0]
+    r[0, 1] = y[1]
+    K[0, 0], K[0, 1] = _rhsMotor(y[0], y[1], c)
+
+    for n in range(1, NUMBER_OF_STEPS):
+        _estagios(A, cNos, K, y, yEstagio, tn, h, c)
+        _combina(y, b, K, h, yNovo)
+        y[0] = yNovo[0]
+        y[1] = yNovo[1]
+        tn = t0 + n*h #sem acumular o arredondamento das somas
+        if fsal:
+            K[0, 0] = K[s-1, 0]
+            K[0, 1] = K[s-1, 1]
+        else:
+            K[0, 0], K[0, 1] = _rhsMotor(y[0], y[1], c)
+        t[n] = tn
+        r[n, 0] = y[0]
+        r[n, 1] = y[1]
+
+@_compila
+def _rkAdaptativoMotor(A, b, d, cNos, fsal, expoente, y0, t0, t_end, h, alpha, e, c, capacidade):
+    """
+    Laço adaptativo do odeAdaptativoSys para o motor. Retorna (t, r, H) já cortados.
+    """
+    s = b.shape[0]
+    K = np.empty((s, 2))
+    y = y0.copy()
+    yNovo = np.empty(2)
+    yEstagio = np.empty(2)
+    erro = np.zeros(2)
+
+    tb = np.empty(capacidade)
+    rb = np.empty((capacidade, 2))
+    Hb = np.empty(capacidade)
+
+    t = t0
+    comp = 0.0 #arredondamento acumulado em t (soma compensada de Kahan)
+    tb[0] = t
+    rb[0, 0] = y[0]
+    rb[0, 1] = y[1]
+    Hb[0] = 0.0
+    n = 1
+    K[0, 0], K[0, 1] = _rhsMotor(y[0], y[1], c)
+
+    while t_end - t > 1E-12*max(1.0, abs(t_end)):
+        final = h >= t_end - t
+        hPasso = t_end - t if final else h
+
+        while True:
+            _estagios(A, cNos, K, y, yEstagio, t, hPasso, c)
+            _combina(y, b, K, hPasso, yNovo)
+            erro[0] = 0.0
+            erro[1] = 0.0
+            _combina(erro, d, K, hPasso, erro)
+            Den = max(abs(erro[0]), abs(erro[1]))
+
+            if Den == 0:
+                q = -1.0 #q não calculado
+                break
+
+            q = alpha*((e*hPasso/Den)**expoente)
+
+            if q < 1:
+                hPasso = q*hPasso
+                final = False
+            else:
+                break
+
+        if final:
+            t = t_end
+        else:
+            yk = hPasso - comp
+            tk = t + yk
+            comp = (tk - t) - yk
+            t = tk
+        y[0] = yNovo[0]
+        y[1] = yNovo[1]
+        if fsal:
+            K[0, 0] = K[s-1, 0]
+            K[0, 1] = K[s-1, 1]
+        else:
+            K[0, 0], K[0, 1] = _rhsMotor(y[0], y[1], c)
+
+        h = hPasso if q < 0 else q*hPasso
+
+        if n == tb.shape[0]: #dobra a capacidade dos buffers
+            tb2 = np.empty(2*n)
+            rb2 = np.empty((2*n, 2))
+            Hb2 = np.empty(2*n)
+            tb2[:n] = tb
+            rb2[:n] = rb
+            Hb2[:n] = Hb
+            tb, rb, Hb = tb2, rb2, Hb2
+        tb[n] = t
+        rb[n, 0] = y[0]
+        rb[n, 1] = y[1]
+        Hb[n] = hPasso
+        n += 1
+
+    return tb[:n], rb[:n], Hb[:n]
+
+#%%
+############################Interface####################################
+
+def _compilavel(motor):
+    """
+    O kernel compilado reproduz apenas o MotorDoisTempos com parâmetros escalares reais.
+    """
+    return type(motor) is MotorDoisTempos and all(np.ndim(p) == 0 and np.isrealobj(p) for p in motor.parametros().values())
+
+def _escolheBackend(backend, motor):
+    if backend not in ("auto", "numba", "numpy"):
+        raise ValueError("Backend desconhecido: %r" % backend)
+    if backend == "numpy":
+        return backend
+    if backend == "auto":
+        return "numba" if NUMBA_DISPONIVEL and _compilavel(motor) else "numpy"
+    if not NUMBA_DISPONIVEL:
+        raise ImportError("O backend 'numba' precisa do pacote numba instalado.")
+    if not _compilavel(motor):
+        raise TypeError("O backend 'numba' integra apenas o MotorDoisTempos com parâmetros escalares, e não %s."
+                        % type(motor).__name__)
+    return backend
+
+def _pesosErro(tableau):
+    return tableau.b - tableau.bErro
+
+def odeMotorSys(motor, r0, t0, NUMBER_OF_STEPS = 100, h=0.01, tableau = ed.RK4, backend = "auto", dtype = np.float32):
+    """
+    Integra o motor com passo fixo, no backend compilado quando disponível.
+
+    Parameters
+    ----------
+    motor : Function
+        Lado direito do motor. Apenas o MotorDoisTempos com parâmetros escalares usa o
+        backend compilado.
+    r0 : Array
+        Condições iniciais (w0, theta0).
+    t0 : Float
+        Tempo inicial.
+    NUMBER_OF_STEPS : Int, optional
+        Número de passos executados pelo método. The default is 100.
+    h : Float, optional
+        Passo em que o vetor t é atualizado. The default is 0.01.
+    tableau : Tableau, optional
+        Método utilizado. The default is ed.RK4.
+    backend : String, optional
+        "numba", "numpy" ou "auto" (numba se estiver instalado e o motor for compilável).
+        The default is "auto".
+    dtype : Dtype, optional
+        Tipo dos arrays retornados. The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Vetor com valores da abcissa.
+    r : Array
+        Matriz (NUMBER_OF_STEPS, 2) com w e theta.
+
+    """
+    if _escolheBackend(backend, motor) == "numpy":
+        return ed.odeTableauSys(motor, r0, t0, NUMBER_OF_STEPS, h, tableau, dtype = dtype)
+
+    t = np.zeros(NUMBER_OF_STEPS, dtype = dtype)
+    r = np.zeros([NUMBER_OF_STEPS, 2], dtype = dtype)
+    _rkFixoMotor(tableau.A, tableau.b, tableau.c, tableau.fsal, np.array(r0, dtype = np.float64),
+                 float(t0), NUMBER_OF_STEPS, float(h), motor.constantes(), t, r)
+    return t, r
+
+def odeMotorAdaptativoSys(motor, r0, t0, t_end, h=0.01, alpha = 0.9, e = 1E-3, tableau = ed.RKF45, backend = "auto",
+                          dtype = np.float32):
+    """
+    Integra o motor com passo adaptativo até t_end, no backend compilado quando disponível.
+
+    Parameters
+    ----------
+    motor : Function
+        Lado direito do motor. Apenas o MotorDoisTempos com parâmetros escalares usa o
+        backend compilado.
+    r0 : Array
+        Condições iniciais (w0, theta0).
+    t0 : Float
+        Tempo inicial.
+    t_end : Float
+        Tempo final da integração.
+    h : Float, optional
+        Passo inicial. The default is 0.01.
+    alpha: Float optional
+        Magnitude na qual q deve ser menor que uma dada expressão para que h seja adpatado.
+    e: Float, optional
+        Tolerância máxima de erro admissível para um determinado passo.
+    tableau : Tableau, optional
+        Par embutido utilizado. The default is ed.RKF45.
+    backend : String, optional
+        "numba", "numpy" ou "auto" (numba se estiver instalado e o motor for compilável).
+        The default is "auto".
+    dtype : Dtype, optional
+        Tipo dos arrays retornados. The default is np.float32.
+
+    Returns
+    -------
+    t : Array
+        Vetor com os passos aceitos.
+    r : Array
+        Matriz com w e theta em cada passo aceito.
+    H : Array
+        Passo utilizado para chegar a cada ponto aceito (H[0] = 0).
+
+    """
+    if _escolheBackend(backend, motor) == "numpy":
+        return ed.odeAdaptativoSys(motor, r0, t0, t_end, h, alpha, e, tableau, dtype = dtype)
+
+    t, r, H = _rkAdaptativoMotor(tableau.A, tableau.b, _pesosErro(tableau), tableau.c, tableau.fsal,
+                                 1/tableau.ordemErro, np.array(r0, dtype = np.float64), float(t0),
+                                 float(t_end), float(h), float(alpha), float(e), motor.constantes(), 4096)
+    return t.astype(dtype), r.astype(dtype), H.astype(dtype)
+
+def verificaParidade(motor = None, r0 = (50, 0), t_end = 2.0, h = 0.001, tol = 1E-10):
+    """
+    Compara os backends numba e numpy no mesmo problema, em float64, e retorna a maior
+    diferença relativa entre as trajetórias de passo fixo (RK4) e adaptativo (RKF45).
+    Gera AssertionError se alguma passar de tol (ou se os passos adaptativos aceitos forem
+    outros, o que dá diferença infinita). Sem o Numba, não há o que comparar, e o resultado
+    é {"ignorado": motivo}.
+    """
+    if not NUMBA_DISPONIVEL:
+        return {"ignorado": "numba não está instalado"}
+
+    motor = MotorDoisTempos() if motor is None else motor
+    N = int(round(t_end/h)) + 1
+
+    _, rc = odeMotorSys(motor, r0, 0, N, h, backend = "numba", dtype = np.float64)
+    _, rp = odeMotorSys(motor, r0, 0, N, h, backend = "numpy", dtype = np.float64)
+    _, ac, _ = odeMotorAdaptativoSys(motor, r0, 0, t_end, 0.1, backend = "numba", dtype = np.float64)
+    _, ap, _ = odeMotorAdaptativoSys(motor, r0, 0, t_end, 0.1, backend = "numpy", dtype = np.float64)
+
+    fixo = np.max(np.abs(rc - rp)/np.maximum(np.abs(rp), 1))
+    adaptativo = np.inf if ac.shape != ap.shape else np.max(np.abs(ac - ap)/np.maximum(np.abs(ap), 1))
+    diferencas = {"fixo": float(fixo), "adaptativo": float(adaptativo)}
+    if not (fixo <= tol and adaptativo <= tol):
+        raise AssertionError("Os backends numba e numpy divergem além de %g: %r" % (tol, diferencas))
+    return diferencas
+
+#%%
+################################################################################################
+
+if __name__ == "__main__":
+    import sys
+
+    try:
+        print(verificaParidade())
+    except AssertionError as erro:
+        print(erro, file = sys.stderr)
+        sys.exit(1)
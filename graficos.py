@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Gráficos das trajetórias do motor sem interface gráfica (backend Agg), gravados em arquivos.
+
+As curvas são decimadas antes de desenhadas: com min/max por pixel ou com o LTTB
+(Largest-Triangle-Three-Buckets), ambos preservam os picos da velocidade angular. As figuras
+padrão do main.py (comparação dos passos e dos métodos) são desenhadas em paralelo, cada uma
+em um processo do pool.
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import concurrent.futures
+import os
+
+import numpy as np
+
+import varredura
+
+#%%
+############################Decimação####################################
+
+def decimaMinMax(t, y, pixels = 2000):
+    """
+    Índices dos pontos que mantêm o mínimo e o máximo de y em cada uma de "pixels" faixas
+    iguais de t, além do primeiro e do último ponto. Retorna no máximo 2*pixels + 2 índices,
+    em ordem crescente; em uma tela de "pixels" colunas o traço é o mesmo da curva completa.
+    """
+    t = np.asarray(t, dtype = np.float64)
+    y = np.asarray(y, dtype = np.float64)
+    if len(t) <= 2*pixels + 2:
+        return np.arange(len(t))
+
+    largura = (t[-1] - t[0])/pixels
+    faixa = np.minimum(((t - t[0])/largura).astype(np.intp), pixels - 1) if largura > 0 else np.zeros(len(t), np.intp)
+    #ordena por faixa e depois por y: o primeiro de cada faixa é o mínimo e o último é o máximo
+    ordem = np.lexsort((y, faixa))
+    faixaOrdenada = faixa[ordem]
+    inicio = np.flatnonzero(np.r_[True, faixaOrdenada[1:] != faixaOrdenada[:-1]])
+    fim = np.r_[inicio[1:], len(ordem)] - 1
+    return np.unique(np.concatenate(([0, len(t) - 1], ordem[inicio], ordem[fim])))
+
+def decimaLTTB(t, y, pontos = 2000):
+    """
+    Índices escolhidos pelo Largest-Triangle-Three-Buckets (Steinarsson, 2013): o primeiro e o
+    último ponto e, em cada um dos pontos - 2 grupos do meio, o que forma o triângulo de maior
+    área com o ponto escolhido no grupo anterior e a média do grupo seguinte.
+    """
+    t = np.asarray(t, dtype = np.float64)
+    y = np.asarray(y, dtype = np.float64)
+    N = len(t)
+    if pontos >= N or pontos < 3:
+        return np.arange(N)
+
+    limites = np.linspace(1, N - 1, pontos - 1).astype(np.intp) #pontos - 2 grupos em [1, N - 1)
+    indices = np.empty(pontos, dtype = np.intp)
+    indices[0], indices[-1] = 0, N - 1
+    a = 0
+    for i in range(pontos - 2):
+        inicio, fim = limites[i], limites[i+1]
+        proximo = slice(fim, limites[i+2]) if i + 2 < len(limites) else slice(N - 1, N)
+        tMedio, yMedio = t[proximo].mean(), y[proximo].mean()
+        #área (a menos do fator 1/2) do triângulo com o ponto anterior e a média do grupo seguinte
+        area = np.abs((t[a] - tMedio)*(y[inicio:fim] - y[a]) - (t[a] - t[inicio:fim])*(yMedio - y[a]))
+        a = inicio + int(np.argmax(area))
+        indices[i+1] = a
+    return indices
+
+def decima(t, y, pontos = 2000, metodo = "minmax"):
+    """
+    Retorna (t, y) decimados por "minmax" (pontos é o número de pixels) ou "lttb".
+    """
+    if metodo == "minmax":
+        indices = decimaMinMax(t, y, pontos)
+    elif metodo == "lttb":
+        indices = decimaLTTB(t, y, pontos)
+    else:
+        raise ValueError("Decimação desconhecida: %r" % metodo)
+    return np.asarray(t)[indices], np.asarray(y)[indices]
+
+#%%
+############################Figuras padrão####################################
+
+H = [0.1, 0.05, 0.01, 0.001] #passos do main.py
+
+def _passos(metodo, t_end):
+    return [("h =" + str(h), {"metodo": metodo, "h": h, "t_end": t_end}, "-") for h in H]
+
+def _unico(metodo, t_end, estilo):
+    return [("h =" + str(H[2]), {"metodo": metodo, "h": H[2], "t_end": t_end}, estilo)]
+
+def _adaptativo(t_end):
+    return [("h0 =" + str(H[0]), {"metodo": "Runge-Kutta-Fehlberg", "h": H[0], "t_end": t_end, "adaptativo": True}, "y--")]
+
+def _metodos(t_end):
+    return ([(metodo, {"metodo": metodo, "h": H[2], "t_end": t_end}, "-") for metodo in ("Euler", "Heun", "Runge-Kutta")] +
+            [("Runge-Kutta-Fehlberg", {"metodo": "Runge-Kutta-Fehlberg", "h": H[0], "t_end": t_end, "adaptativo": True}, "--")])
+
+#(arquivo, título, curvas): cada curva é (rótulo, caso no formato de varredura.PADRAO, estilo)
+FIGURAS = [("euler_passos_13s", "Método de Euler", _passos("Euler", 13)),
+           ("euler_passos_0.5s", "Método de Euler", _passos("Euler", 0.5)),
+           ("euler_13s", "Método de Euler", _unico("Euler", 13, "r--")),
+           ("euler_0.5s", "Método de Euler", _unico("Euler", 0.5, "r--")),
+           ("heun_13s", "Método de Heun", _unico("Heun", 13, "b--")),
+           ("heun_0.5s", "Método de Heun", _unico("Heun", 0.5, "b--")),
+           ("runge_kutta_12s", "Método de Runge-Kutta de 4º ordem", _unico("Runge-Kutta", 12, "g--")),
+           ("runge_kutta_0.5s", "Método de Runge-Kutta de 4º ordem", _unico("Runge-Kutta", 0.5, "g--")),
+           ("rkf_13s", "Método de Runge-Kutta-Fehlberg", _adaptativo(13)),
+           ("rkf_0.5s", "Método de Runge-Kutta-Fehlberg", _adaptativo(0.5)),
+           ("metodos_13s", "Comparação dos métodos", _metodos(13)),
+           ("metodos_0.5s", "Comparação dos métodos", _metodos(0.5))]
+
+def desenhaFigura(figura, diretorio, formato = "png", pontos = 2000, decimacao = "minmax", diretorioCache = None):
+    """
+    Integra as curvas de uma figura de FIGURAS, decima e grava a figura em diretorio.
+    Retorna o caminho do arquivo.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    arquivo, titulo, curvas = figura
+    fig, ax = plt.subplots()
+    for rotulo, caso, estilo in curvas:
+        t, r = varredura.integraCaso(caso, diretorioCache)
+        ax.plot(*decima(t, r[:, 0], pontos, decimacao), estilo, label = rotulo)
+    ax.set_title(titulo)
+    ax.set_xlabel("tempo (s)")
+    ax.set_ylabel("Velocidade angular (rad/s)")
+    ax.legend()
+    ax.grid()
+
+    caminho = os.path.join(diretorio, arquivo + "." + formato)
+    fig.savefig(caminho)
+    plt.close(fig)
+    return caminho
+
+def geraFiguras(diretorio, figuras = None, processos = None, formato = "png", pontos = 2000, decimacao = "minmax",
+                diretorioCache = None):
+    """
+    Desenha as figuras em paralelo e grava os arquivos em diretorio.
+
+    Parameters
+    ----------
+    diretorio : String
+        Pasta dos arquivos.
+    figuras : List, optional
+        Figuras no formato de FIGURAS. The default is None (FIGURAS).
+    processos : Int, optional
+        Número de processos. 0 desenha tudo no processo atual. The default is None (os.cpu_count()).
+    formato : String, optional
+        Extensão aceita pelo matplotlib ("png", "pdf", "svg", ...). The default is "png".
+    pontos : Int, optional
+        Pixels (minmax) ou pontos (lttb) de cada curva decimada. The default is 2000.
+    decimacao : String, optional
+        "minmax" ou "lttb". The default is "minmax".
+    diretorioCache : String, optional
+        Pasta de um cache.CacheResultados para as integrações de passo fixo. The default is None.
+
+    Returns
+    -------
+    caminhos : List
+        Arquivos gravados, na ordem das figuras.
+
+    """
+    figuras = FIGURAS if figuras is None else figuras
+    os.makedirs(diretorio, exist_ok = True)
+    argumentos = (diretorio, formato, pontos, decimacao, diretorioCache)
+    processos = os.cpu_count() if processos is None else processos
+
+    if processos == 0:
+        return [desenhaFigura(figura, *argumentos) for figura in figuras]
+    with concurrent.futures.ProcessPoolExecutor(max_workers = min(processos, len(figuras))) as executor:
+        futuros = [executor.submit(desenhaFigura, figura, *argumentos) for figura in figuras]
+        return [futuro.result() for futuro in futuros]
+
+#%%
+############################Figuras da varredura####################################
+
+def figuraVarredura(tabela, caminho, x = "h", y = "wMedio", grupo = "metodo"):
+    """
+    Grava o gráfico de uma coluna de resultado de varredura.executaVarredura em função de uma
+    entrada, com uma curva para cada valor de "grupo" (ou uma só, se grupo for None).
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    tabela = tabela[tabela["concluido"]]
+    fig, ax = plt.subplots()
+    grupos = np.unique(tabela[grupo]) if grupo is not None else [None]
+    for valor in grupos:
+        linhas = tabela if valor is None else tabela[tabela[grupo] == valor]
+        linhas = linhas[np.argsort(linhas[x], kind = "stable")]
+        ax.plot(linhas[x], linhas[y], "o-", label = None if valor is None else str(valor))
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    if grupo is not None:
+        ax.legend()
+    ax.grid()
+    fig.savefig(caminho)
+    plt.close(fig)
+    return caminho
+
+#%%
+################################################################################################
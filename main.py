@@ -2,195 +2,222 @@
 """
 Created on Thu Dec  3 16:36:30 2020
 
+Linha de comando do estudo do motor de dois tempos.
+
+Uso:
+    python main.py resolve --metodo Euler --h 0.01 --t-end 13 --formato csv
+    python main.py resolve --metodo Runge-Kutta-Fehlberg --adaptativo --e 1E-4 --saida rkf.npz
+    python main.py varredura --grade metodo=Euler,Heun --grade h=0.01,0.001 --saida tabela.csv
+    python main.py figuras --diretorio figuras/ --formato pdf
+    python main.py orbita --parametro P3=9E6 --saida ciclo.csv
+
+Apenas argparse é importado no início: NumPy, os integradores e o matplotlib são carregados
+pelo subcomando que os usa.
+
 @author: Widmark Kaue and Luana Gomes
 """
+import argparse
+import sys
 
-import numpy as np
-import matplotlib.pylab as plt
-import EDOs as ed
-
-#%% Implementando função e setando as condições iniciais
+#%%
+############################Estudo do trabalho####################################
 
 w0 = 50 #frequência angular inicial
 theta0 = 0 #crank angle inicial
 t0 = 0 #tempo inicial
 h = [0.1, 0.05, 0.01, 0.001] #passos tempos utilizados
- 
-             
-
-
-def f(t,r):
-    w, theta = r #criando os vetores de ângulo e velocidade angular
-    
-    R = 0.305 #Raio do flywheel em metros
-    x0 = 0.0254 #Espaçamento mínimo quando o pistão está em compressão
-    I = 3.171 #momento de inércia do flywheel em kgm^2
-    C = 0.0113 #momento de inércia em kgm^2
-    theta1 = np.pi #crank angle inicial para o processo de expansão em rad
-    theta3 = 0 #crank angle inicial para o processo de compressão em rad
-    n = 1.3 #Identidficador do processo politrópico
-    A = 0.00188 #área de seção transversal do pistão em m^2
-    P1 = 0.1E6 #pressão inicial de compressão em Pa
-    P3 = 10.3E6 #pressão inicial de expansão em Pa
-    
-    T1 = (A*R/I)*np.sin(theta)
-    T2 = (C/I)*(w**2)
-    
-    
-    while(theta > 2*np.pi):
-        theta = theta - 2*np.pi
-            
-    if (theta >= 0 and theta <= np.pi):
-        T3 = P3*((R - R*np.cos(theta3) + x0)/(R - R*np.cos(theta) + x0))**n
-       
-        
-    elif(theta > np.pi and theta <= 2*np.pi):
-        T3 = P1*((R - R*np.cos(theta1) + x0)/(R - R*np.cos(theta) + x0))**n
-    
-    
-    return np.array([T3*T1 - T2, w] )
-
-
-
-#%%                             Método de Euler
-
-
-
-# =============================================================================
-# #Comparação dos passos de tempo até 12 segundos
-# =============================================================================
-
-for i in range (len(h)):
-    t, r = ed.odeEulerSys(f, (w0, theta0), t0, NUMBER_OF_STEPS = int(13/h[i]), h = h[i])
-    plt.title("Método de Euler")
-    plt.xlabel("tempo (s)")
-    plt.ylabel("Velovidade angular (rad/s)")
-    plt.plot(t,r[:,0], label = "h =" + str(h[i]))
-    plt.legend()
-
-plt.grid()
-plt.show()
-
-# =============================================================================
-# # Comparação dos passos de tempo até 0.5 segundos
-# =============================================================================
-    
-for i in range (len(h)):
-    t, r = ed.odeEulerSys(f, (w0, theta0), t0, NUMBER_OF_STEPS = int(0.5/h[i]), h = h[i])
-    plt.title("Método de Euler")
-    plt.xlabel("tempo (s)")
-    plt.ylabel("Velovidade angular (rad/s)")
-    plt.plot(t,r[:,0], label = "h =" + str(h[i]))
-    plt.legend()
-
-plt.grid()   
-plt.show()
-
-# =============================================================================
-# Gráficos da velocidade angular com o passo de 0.01
-# =============================================================================
-
-t, r = ed.odeEulerSys(f, (w0, theta0), t0, NUMBER_OF_STEPS = int(13/h[2]), h = h[2])
-plt.title("Método de Euler")
-plt.xlabel("tempo (s)")
-plt.ylabel("Velovidade angular (rad/s)")
-plt.plot(t,r[:,0], "r--" ,label = "h =" + str(h[2]))
-plt.legend()
-
-plt.grid()
-plt.show()
-
-
-t, r = ed.odeEulerSys(f, (w0, theta0), t0, NUMBER_OF_STEPS = int(0.5/h[2]), h = h[2])
-plt.title("Método de Euler")
-plt.xlabel("tempo (s)")
-plt.ylabel("Velovidade angular (rad/s)")
-plt.plot(t,r[:,0], "r--" ,label = "h =" + str(h[2]))
-plt.legend()
-
-plt.grid()
-plt.show()
-
-
-#%%                            Método de Heun
-
-# =============================================================================
-# Gráficos da velocidade angular com o passo de 0.01
-# =============================================================================
-
-t, r = ed.odeHeunSys(f, (w0, theta0), t0, NUMBER_OF_STEPS = int(13/h[2]), h = h[2])
-plt.title("Metodo de Heun ")
-plt.xlabel("tempo (s)")
-plt.ylabel("Velovidade angular (rad/s)")
-plt.plot(t,r[:,0],"b--", label = "h =" + str(h[2]))
-plt.legend()
-
-plt.grid()
-plt.show()
-
-t, r = ed.odeHeunSys(f, (w0, theta0), t0, NUMBER_OF_STEPS = int(0.5/h[2]), h = h[2])
-plt.title("Método de Heun")
-plt.xlabel("tempo (s)")
-plt.ylabel("Velovidade angular (rad/s)")
-plt.plot(t,r[:,0],"b--", label = "h =" + str(h[2]))
-plt.legend()
-
-plt.grid()   
-plt.show()    
-
-    
-#%%                        Método de Runge Kutta de 4º ordem
-
-# =============================================================================
-# Gráficos da velocidade angular com o passo de 0.01
-# =============================================================================
-
-t, r = ed.odeRunge_KuttaSys(f, (w0, theta0), t0, NUMBER_OF_STEPS = int(12/h[2]), h = h[2])
-plt.title("Método de Runge-Kutta de 4º ordem ")
-plt.xlabel("tempo (s)")
-plt.ylabel("Velovidade angular (rad/s)")
-plt.plot(t,r[:,0],"g--", label = "h =" + str(h[2]))
-plt.legend()
-plt.grid()
-plt.show()
-    
-t, r = ed.odeRunge_KuttaSys(f, (w0, theta0), t0, NUMBER_OF_STEPS = int(0.5/h[2]), h = h[2])
-plt.title("Método de Runge-Kutta de 4º ordem ")
-plt.xlabel("tempo (s)")
-plt.ylabel("Velovidade angular (rad/s)")
-plt.plot(t,r[:,0],"g--", label = "h =" + str(h[2]))
-plt.legend()
-
-plt.grid()   
-plt.show() 
-    
-#%%                        Método de Runge-Kutta-Fehlberg
-
-# =============================================================================
-# Gráficos da velocidade angular com o passo inicial de 0.1
-# =============================================================================
-
-
-t, r, H = ed.odeRunge_Kutta_FehlbergSys(f, (w0, theta0), t0, NUMBER_OF_STEPS = int(38/h[0]), h = h[0])
-plt.title("Método de Runge-Kutta-Fehlberg ")
-plt.xlabel("tempo (s)")
-plt.ylabel("Velovidade angular (rad/s)")
-plt.plot(t,r[:,0],"y--", label = "h0 =" + str(h[0]))
-plt.legend()
-plt.grid()
-plt.show() 
-
-t, r, H = ed.odeRunge_Kutta_FehlbergSys(f, (w0, theta0), t0, NUMBER_OF_STEPS = int(1.3/h[0]), h = h[0])
-plt.title("Método de Runge-Kutta-Fehlberg ")
-plt.xlabel("tempo (s)")
-plt.ylabel("Velovidade angular (rad/s)")
-plt.plot(t,r[:,0],"y--", label = "h0 =" + str(h[0]))
-plt.legend()
-plt.grid()
-plt.show() 
-    
 
+# O motor usa as constantes do trabalho (os padrões de MotorDoisTempos): R = 0.305 m, x0 = 0.0254 m,
+# I = 3.171 kgm^2, C = 0.0113 kgm^2, n = 1.3, A = 0.00188 m^2, P1 = 0.1E6 Pa e P3 = 10.3E6 Pa.
+# As figuras do estudo (Euler, Heun, Runge-Kutta e Runge-Kutta-Fehlberg) estão em graficos.FIGURAS.
 
+FORMATOS = ("csv", "json", "npz", "npy")
+
+#%%
+############################Saída####################################
+
+def _valor(texto):
+    """
+    Converte um valor da linha de comando em bool (true/false), int ou float quando possível.
+    """
+    if texto.lower() in ("true", "false"):
+        return texto.lower() == "true"
+    for tipo in (int, float):
+        try:
+            return tipo(texto)
+        except ValueError:
+            pass
+    return texto
+
+def _atribuicoes(lista, multiplos = False):
+    """
+    Lê entradas NOME=VALOR (ou NOME=V1,V2,... se multiplos) em um dicionário.
+    """
+    saida = {}
+    for item in lista or ():
+        nome, sep, texto = item.partition("=")
+        if not sep:
+            raise SystemExit("Entrada inválida %r: use NOME=VALOR." % item)
+        saida[nome] = [_valor(v) for v in texto.split(",")] if multiplos else _valor(texto)
+    return saida
+
+def grava(tabela, formato, saida = None):
+    """
+    Grava um array estruturado em csv, json, npz (uma entrada por coluna) ou npy. Sem "saida",
+    csv e json vão para a saída padrão.
+    """
+    import numpy as np
+
+    if formato in ("npz", "npy") and saida is None:
+        raise SystemExit("O formato %s exige --saida." % formato)
+    if formato == "npy":
+        np.save(saida, tabela)
+        return
+    if formato == "npz":
+        np.savez(saida, **{nome: tabela[nome] for nome in tabela.dtype.names})
+        return
+
+    arquivo = sys.stdout if saida is None else open(saida, "w", encoding = "utf-8", newline = "")
+    try:
+        if formato == "json":
+            import json
+            json.dump([{nome: linha[nome].item() for nome in tabela.dtype.names} for linha in tabela], arquivo, indent = 1)
+            arquivo.write("\n")
+        else:
+            import csv
+            escritor = csv.writer(arquivo)
+            escritor.writerow(tabela.dtype.names)
+            escritor.writerows(linha.tolist() for linha in tabela)
+    finally:
+        if saida is not None:
+            arquivo.close()
+
+def _confereMetodo(parser, metodo, adaptativo):
+    """
+    Falha com parser.error se metodo não for um Tableau de EDOs.TABLEAUS ou, com adaptativo,
+    se o Tableau não tiver estimativa de erro.
+    """
+    import EDOs as ed
+
+    if metodo not in ed.TABLEAUS:
+        parser.error("método desconhecido %r; use um de: %s" % (metodo, ", ".join(ed.TABLEAUS)))
+    if adaptativo and ed.TABLEAUS[metodo].ordemErro is None:
+        parser.error("o método %r não tem estimativa de erro e não serve ao passo adaptativo; use um de: %s"
+                     % (metodo, ", ".join(nome for nome, tab in ed.TABLEAUS.items() if tab.ordemErro is not None)))
+
+#%%
+############################Subcomandos####################################
+
+def resolve(args):
+    import numpy as np
+    import varredura
+
+    if args.metodo is None:
+        args.metodo = "Runge-Kutta-Fehlberg" if args.adaptativo else "Runge-Kutta"
+    _confereMetodo(args.parser, args.metodo, args.adaptativo)
+    caso = {"metodo": args.metodo, "h": args.h, "t_end": args.t_end, "adaptativo": args.adaptativo,
+            "e": args.e, "w0": args.w0, "theta0": args.theta0, "t0": args.t0, "tabela": args.tabela}
+    caso.update(_atribuicoes(args.parametro))
+    t, r = varredura.integraCaso(caso, args.cache, dtype = np.float64) #em float32, o CSV mostraria t = 0.009999999776482582
+
+    tabela = np.zeros(len(t), dtype = [("t", np.float64), ("w", np.float64), ("theta", np.float64)])
+    tabela["t"], tabela["w"], tabela["theta"] = t, r[:, 0], r[:, 1]
+    grava(tabela, args.formato, args.saida)
+    return 0
+
+def executaVarredura(args):
+    import varredura
+
+    grade = _atribuicoes(args.grade, multiplos = True)
+    for caso in varredura.casos(grade):
+        entrada = dict(varredura.PADRAO, **caso)
+        _confereMetodo(args.parser, entrada["metodo"], entrada["adaptativo"])
+    tabela = varredura.executaVarredura(grade, processos = args.processos)
+    grava(tabela, args.formato, args.saida)
+    return 0
+
+def figuras(args):
+    import graficos
+
+    caminhos = graficos.geraFiguras(args.diretorio, processos = args.processos, formato = args.formato,
+                                    pontos = args.pontos, decimacao = args.decimacao, diretorioCache = args.cache)
+    for caminho in caminhos:
+        print(caminho)
+    return 0
+
+def orbita(args):
+    import numpy as np
+    import orbita
+    from motor import MotorDoisTempos
+
+    motor = MotorDoisTempos(**_atribuicoes(args.parametro))
+    o = orbita.orbitaPeriodica(motor, args.w0, args.tol, passosPorRevolucao = args.passos, metodo = args.metodo)
+    print("wSecao = %.10g rad/s, w medio = %.10g rad/s, periodo = %.10g s, multiplicador = %.10g (%s), "
+          "iteracoes = %d, status = %d" % (o.wSecao, o.w, o.periodo, o.multiplicador,
+                                           "estável" if o.estavel else "instável", o.iteracoes, o.status),
+          file = sys.stderr)
+    if o.t is None:
+        return 1
+    tabela = np.zeros(len(o.t), dtype = [("t", np.float64), ("w", np.float64), ("theta", np.float64)])
+    tabela["t"], tabela["w"], tabela["theta"] = o.t, o.r[:, 0], o.r[:, 1]
+    grava(tabela, args.formato, args.saida)
+    return 0 if o.status == orbita.CONVERGIU else 1
+
+def argumentos():
+    parser = argparse.ArgumentParser(description = "Estudo do motor a combustão interna de dois tempos.")
+    sub = parser.add_subparsers(dest = "comando", required = True)
+
+    p = sub.add_parser("resolve", help = "integra um método ou configuração")
+    p.add_argument("--metodo", help = "nome de um Tableau de EDOs.TABLEAUS; o padrão é Runge-Kutta, ou "
+                   "Runge-Kutta-Fehlberg com --adaptativo")
+    p.add_argument("--h", type = float, default = h[2], help = "passo (ou passo inicial, se adaptativo)")
+    p.add_argument("--t-end", type = float, default = 13.0)
+    p.add_argument("--adaptativo", action = "store_true", help = "usa o controle de passo do RKF")
+    p.add_argument("--e", type = float, default = 1E-3, help = "tolerância do passo adaptativo")
+    p.add_argument("--w0", type = float, default = w0)
+    p.add_argument("--theta0", type = float, default = theta0)
+    p.add_argument("--t0", type = float, default = t0)
+    p.add_argument("--tabela", action = "store_true", help = "usa a pressão tabelada (tabelas.MotorTabelado)")
+    p.add_argument("--parametro", action = "append", metavar = "NOME=VALOR", help = "parâmetro do motor, p. ex. P3=9E6")
+    p.add_argument("--cache", help = "pasta de cache.CacheResultados (passo fixo)")
+    p.add_argument("--formato", choices = FORMATOS, default = "csv")
+    p.add_argument("--saida", help = "arquivo de saída; csv e json vão para a saída padrão se omitido")
+    p.set_defaults(executa = resolve, parser = p)
+
+    p = sub.add_parser("varredura", help = "executa uma varredura em paralelo")
+    p.add_argument("--grade", action = "append", required = True, metavar = "NOME=V1,V2,...",
+                   help = "entrada de varredura.PADRAO ou parâmetro do motor e os seus valores")
+    p.add_argument("--processos", type = int, help = "0 executa no processo atual")
+    p.add_argument("--formato", choices = FORMATOS, default = "csv")
+    p.add_argument("--saida")
+    p.set_defaults(executa = executaVarredura, parser = p)
+
+    p = sub.add_parser("figuras", help = "grava as figuras do estudo")
+    p.add_argument("--diretorio", default = "figuras")
+    p.add_argument("--formato", default = "png", help = "extensão aceita pelo matplotlib")
+    p.add_argument("--processos", type = int, help = "0 desenha no processo atual")
+    p.add_argument("--pontos", type = int, default = 2000, help = "pontos de cada curva decimada")
+    p.add_argument("--decimacao", choices = ("minmax", "lttb"), default = "minmax")
+    p.add_argument("--cache", help = "pasta de cache.CacheResultados (passo fixo)")
+    p.set_defaults(executa = figuras)
+
+    p = sub.add_parser("orbita", help = "ciclo limite pelo método do tiro")
+    p.add_argument("--w0", type = float, default = w0, help = "estimativa inicial de w em theta = 0")
+    p.add_argument("--tol", type = float, default = 1E-10)
+    p.add_argument("--passos", type = int, default = 720, help = "passos em theta por revolução")
+    p.add_argument("--metodo", choices = ("newton", "broyden"), default = "newton")
+    p.add_argument("--parametro", action = "append", metavar = "NOME=VALOR", help = "parâmetro do motor, p. ex. P3=9E6")
+    p.add_argument("--formato", choices = FORMATOS, default = "csv")
+    p.add_argument("--saida", help = "arquivo da revolução da órbita; csv e json vão para a saída padrão se omitido")
+    p.set_defaults(executa = orbita)
+    return parser
+
+def main(argv = None):
+    args = argumentos().parse_args(argv)
+    return args.executa(args)
 
 #%%
+################################################################################################
 
+if __name__ == "__main__":
+    sys.exit(main())
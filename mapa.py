@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Mapas de operação do motor (velocidade angular convergida em uma grade de parâmetros)
+por continuação numérica.
+
+Os pontos da grade são percorridos em ziguezague, de modo que cada ponto é vizinho do
+anterior. Cada um começa do estado convergido dos pontos anteriores (com um preditor linear
+ao longo do caminho), e não de w0: só um transiente curto de reacomodação é integrado.
+
+A convergência é medida no mapa de uma revolução, w(2*pi*(k+1)) = P(w(2*pi*k)), integrado
+no domínio do ângulo (angular.odeAnguloSys). Como P é uma contração com fator lambda perto
+de 1, o erro até o ponto fixo é estimado por |dw|*lambda/(1 - lambda), e não apenas pela
+variação dw entre revoluções, e a iteração é acelerada pelo Delta^2 de Aitken.
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import collections
+
+import numpy as np
+
+import angular
+from ciclos import CONVERGIU, NAO_CONVERGIU, PAROU
+from motor import MotorDoisTempos
+
+#%%
+############################Ordem de continuação####################################
+
+def ordemContinuacao(forma):
+    """
+    Lista dos índices de uma grade com a forma dada em ziguezague (código de Gray misto):
+    dois índices consecutivos diferem em uma unidade em um único eixo.
+    """
+    ordem = []
+    for indice in np.ndindex(*forma):
+        caminho = []
+        soma = 0
+        for i, n in zip(indice, forma):
+            #o eixo anda para trás quando a soma dos eixos anteriores, já refletidos, é ímpar
+            i = n - 1 - i if soma % 2 else i
+            caminho.append(i)
+            soma += i
+        ordem.append(tuple(caminho))
+    return ordem
+
+#%%
+############################Ponto fixo do mapa de uma revolução####################################
+
+DOBRA = 3 #ponto em que a partida de w0 convergiu em outro ramo, além de CONVERGIU, NAO_CONVERGIU e PAROU
+
+Ponto = collections.namedtuple("Ponto", ["w", "wSecao", "revolucoes", "status"])
+
+def convergeRevolucoes(motor, w0, tol = 1E-6, maxRevolucoes = 2000, passosPorRevolucao = 360, acelera = True):
+    """
+    Itera o mapa de uma revolução a partir de w0 em theta = 0 até o ponto fixo.
+
+    Com "acelera", a cada duas revoluções seguidas com a mesma taxa de contração lambda
+    (0 < lambda < 1) o w da seção salta para o limite previsto pelo Delta^2 de Aitken,
+    w + dw*lambda/(1 - lambda), e a iteração recomeça dali (método de Steffensen).
+
+    Returns
+    -------
+    Ponto
+        Tupla (w, wSecao, revolucoes, status) com a velocidade angular média da última
+        revolução, o w em theta = 0 (mod 2*pi), o número de revoluções integradas e o status
+        (CONVERGIU, NAO_CONVERGIU ou PAROU, se w chegou a zero).
+
+    """
+    w = float(w0)
+    if not w > 0:
+        return Ponto(np.nan, np.nan, 0, PAROU)
+    dwAnt = None
+    wMedio = np.nan
+    for k in range(1, maxRevolucoes + 1):
+        t, r = angular.odeAnguloSys(motor, (w, 0.0), 0.0, revolucoes = 1, passosPorRevolucao = passosPorRevolucao,
+                                    dtype = np.float64)
+        if len(t) <= passosPorRevolucao: #o motor parou durante a revolução
+            return Ponto(np.nan, np.nan, k, PAROU)
+        wNovo = float(r[-1, 0])
+        wMedio = 2*np.pi/float(t[-1])
+        dw = wNovo - w
+        w = wNovo
+        if dw == 0:
+            return Ponto(wMedio, w, k, CONVERGIU)
+        if dwAnt is None:
+            dwAnt = dw
+            continue
+
+        fator = dw/dwAnt #taxa de contração estimada
+        dwAnt = dw
+        if not 0 < fator < 1:
+            continue
+        correcao = dw*fator/(1 - fator) #distância estimada até o ponto fixo
+        if abs(correcao) <= tol*abs(w):
+            return Ponto(wMedio, w, k, CONVERGIU)
+        if acelera and abs(correcao) <= 0.5*abs(w):
+            w += correcao
+            dwAnt = None
+    return Ponto(wMedio, w, maxRevolucoes, NAO_CONVERGIU)
+
+#%%
+############################Mapa de operação####################################
+
+MapaOperacao = collections.namedtuple("MapaOperacao", ["parametros", "valores", "w", "wSecao", "status", "revolucoes"])
+
+def mapaOperacao(grade, motor = None, w0 = 50.0, tol = 1E-6, maxRevolucoes = 2000, passosPorRevolucao = 360,
+                 salto = 0.25, acelera = True, progresso = None):
+    """
+    Velocidade angular convergida em uma grade de parâmetros do motor, por continuação.
+
+    Parameters
+    ----------
+    grade : Dict
+        Nome do parâmetro de MotorDoisTempos -> valores, por exemplo
+        {"P3": np.linspace(8E6, 12E6, 21), "C": [0.01, 0.0113, 0.013]}.
+        A ordem das chaves é a ordem dos eixos do mapa.
+    motor : MotorDoisTempos, optional
+        Motor com os demais parâmetros. The default is None (MotorDoisTempos()).
+    w0 : Float, optional
+        Velocidade angular inicial em theta = 0, usada no primeiro ponto e quando a
+        continuação falha. The default is 50.0.
+    tol : Float, optional
+        Erro relativo estimado do ponto fixo em cada ponto. The default is 1E-6.
+    maxRevolucoes : Int, optional
+        Limite de revoluções por ponto. The default is 2000.
+    passosPorRevolucao : Int, optional
+        Passos do RK4 em theta por revolução. The default is 360.
+    salto : Float, optional
+        Variação relativa de w entre vizinhos acima da qual a continuação é conferida com uma
+        partida de w0. The default is 0.25.
+    acelera : Bool, optional
+        Usa a aceleração de Aitken em convergeRevolucoes. The default is True.
+    progresso : Function, optional
+        progresso(concluidos, total), chamada a cada ponto. The default is None.
+
+    Returns
+    -------
+    MapaOperacao
+        Tupla com os nomes dos parâmetros, os seus valores e as grades w (velocidade angular
+        média da revolução convergida), wSecao (w em theta = 0 mod 2*pi), status
+        (CONVERGIU, NAO_CONVERGIU, PAROU ou DOBRA) e revolucoes (integradas em cada ponto).
+
+        Quando a continuação falha ou salta mais que "salto" em relação ao vizinho, o ponto é
+        refeito com uma partida de w0. Se ela convergir no ramo dos vizinhos (w em theta = 0
+        a menos de "salto" do vizinho), o ponto fica com ela e CONVERGIU; se convergir em outro
+        ramo, com ela e DOBRA. Se ela também falhar, o ponto fica com o resultado e o status
+        da continuação (NAO_CONVERGIU ou PAROU, se ela falhou).
+
+    """
+    motor = MotorDoisTempos() if motor is None else motor
+    parametros = tuple(grade)
+    valores = tuple(np.asarray(grade[nome], dtype = np.float64) for nome in parametros)
+    forma = tuple(len(v) for v in valores)
+
+    w = np.full(forma, np.nan, dtype = np.float32)
+    wSecao = np.full(forma, np.nan, dtype = np.float32)
+    status = np.full(forma, NAO_CONVERGIU, dtype = np.int8)
+    revolucoes = np.zeros(forma, dtype = np.int32)
+
+    ordem = ordemContinuacao(forma)
+    caminho = [] #(índice, wSecao) dos últimos pontos convergidos do caminho
+    for n, indice in enumerate(ordem):
+        pontoMotor = motor.substitui(**{nome: valores[i][j] for i, (nome, j) in enumerate(zip(parametros, indice))})
+
+        #preditor: extrapolação linear se os dois últimos pontos andaram no mesmo eixo e sentido
+        partida = w0
+        if caminho:
+            partida = caminho[-1][1]
+            if len(caminho) >= 2:
+                (i0, w0Ant), (i1, w1Ant) = caminho[-2], caminho[-1]
+                passoAnt = np.subtract(i1, i0)
+                passo = np.subtract(indice, i1)
+                if np.array_equal(passoAnt, passo) and np.abs(passo).sum() == 1:
+                    eixo = int(np.flatnonzero(passo)[0])
+                    x0, x1, x2 = valores[eixo][i0[eixo]], valores[eixo][i1[eixo]], valores[eixo][indice[eixo]]
+                    partida = w1Ant + (w1Ant - w0Ant)*(x2 - x1)/(x1 - x0)
+
+        ponto = convergeRevolucoes(pontoMotor, partida, tol, maxRevolucoes, passosPorRevolucao, acelera)
+        total = ponto.revolucoes
+
+        vizinho = caminho[-1][1] if caminho else None
+        suspeito = bool(caminho) and (ponto.status != CONVERGIU or abs(ponto.wSecao - vizinho) > salto*abs(vizinho))
+        if suspeito:
+            frio = convergeRevolucoes(pontoMotor, w0, tol, maxRevolucoes, passosPorRevolucao, acelera)
+            total += frio.revolucoes
+            if frio.status == CONVERGIU:
+                #DOBRA só quando a partida de w0 cai em outro ramo, e não quando a continuação apenas falhou
+                ponto = frio._replace(status = DOBRA) if abs(frio.wSecao - vizinho) > salto*abs(vizinho) else frio
+
+        w[indice], wSecao[indice] = ponto.w, ponto.wSecao
+        status[indice], revolucoes[indice] = ponto.status, total
+
+        if ponto.status in (CONVERGIU, DOBRA):
+            #depois de uma dobra, o caminho recomeça no ramo novo, sem o preditor
+            caminho = caminho[-1:] + [(indice, ponto.wSecao)] if ponto.status == CONVERGIU else [(indice, ponto.wSecao)]
+        else:
+            caminho = []
+        if progresso is not None:
+            progresso(n + 1, len(ordem))
+
+    return MapaOperacao(parametros, valores, w, wSecao, status, revolucoes)
+
+def salvaMapa(mapa, caminho):
+    """
+    Grava um MapaOperacao em um .npz compactado.
+    """
+    np.savez_compressed(caminho, parametros = np.array(mapa.parametros), w = mapa.w, wSecao = mapa.wSecao,
+                        status = mapa.status, revolucoes = mapa.revolucoes,
+                        **{"valores_" + nome: v for nome, v in zip(mapa.parametros, mapa.valores)})
+
+def carregaMapa(caminho):
+    with np.load(caminho) as dados:
+        parametros = tuple(str(nome) for nome in dados["parametros"])
+        return MapaOperacao(parametros, tuple(dados["valores_" + nome] for nome in parametros), dados["w"],
+                            dados["wSecao"], dados["status"], dados["revolucoes"])
+
+#%%
+################################################################################################
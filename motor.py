@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Modelo do motor a combustão interna de dois tempos simplificado.
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import numpy as np
+
+#%%
+############################Modelo do motor####################################
+
+def _parametro(valor):
+    """
+    Parâmetro em float64; valores complexos são mantidos, para as derivadas por passo complexo.
+    """
+    valor = np.asarray(valor)
+    return valor if np.iscomplexobj(valor) else valor.astype(np.float64)
+
+class MotorDoisTempos:
+    """
+    Motor de dois tempos descrito pelo sistema r = [w, theta]:
+
+        w'     = T3(theta)*(A*R/I)*sin(theta) - (C/I)*w**2
+        theta' = w
+
+    em que T3 é a pressão no cilindro, dada pela lei politrópica da expansão
+    (0 <= theta <= pi) ou da compressão (pi < theta < 2*pi).
+
+    As constantes que não dependem do estado são calculadas uma única vez no
+    construtor. Os parâmetros podem ser escalares ou vetores (M,), caso em que
+    cada linha de um lote (M, 2) de estados usa o seu próprio motor.
+
+    Parameters
+    ----------
+    R : Float ou Array, optional
+        Raio do flywheel em metros. The default is 0.305.
+    x0 : Float ou Array, optional
+        Espaçamento mínimo quando o pistão está em compressão. The default is 0.0254.
+    I : Float ou Array, optional
+        Momento de inércia do flywheel em kgm^2. The default is 3.171.
+    C : Float ou Array, optional
+        Coeficiente de amortecimento em kgm^2. The default is 0.0113.
+    n : Float ou Array, optional
+        Identificador do processo politrópico. The default is 1.3.
+    A : Float ou Array, optional
+        Área de seção transversal do pistão em m^2. The default is 0.00188.
+    P1 : Float ou Array, optional
+        Pressão inicial de compressão em Pa. The default is 0.1E6.
+    P3 : Float ou Array, optional
+        Pressão inicial de expansão em Pa. The default is 10.3E6.
+
+    """
+    PARAMETROS = ("R", "x0", "I", "C", "n", "A", "P1", "P3")
+
+    def __init__(self, R = 0.305, x0 = 0.0254, I = 3.171, C = 0.0113, n = 1.3, A = 0.00188, P1 = 0.1E6, P3 = 10.3E6):
+        self.R = _parametro(R)
+        self.x0 = _parametro(x0)
+        self.I = _parametro(I)
+        self.C = _parametro(C)
+        self.n = _parametro(n)
+        self.A = _parametro(A)
+        self.P1 = _parametro(P1)
+        self.P3 = _parametro(P3)
+
+        theta1 = np.pi #crank angle inicial para o processo de expansão em rad
+        theta3 = 0 #crank angle inicial para o processo de compressão em rad
+
+        self.AR_I = self.A*self.R/self.I #fator do torque
+        self.C_I = self.C/self.I #fator do amortecimento
+        #numeradores das leis politrópicas, que não dependem de theta
+        self.KExpansao = self.P3*(self.R - self.R*np.cos(theta3) + self.x0)**self.n
+        self.KCompressao = self.P1*(self.R - self.R*np.cos(theta1) + self.x0)**self.n
+
+    def parametros(self):
+        """
+        Retorna um dicionário com os parâmetros do motor, aceito pelo construtor.
+        """
+        return {nome: getattr(self, nome) for nome in self.PARAMETROS}
+
+    def substitui(self, **parametros):
+        """
+        Retorna um novo motor com os parâmetros dados trocados.
+        """
+        novos = self.parametros()
+        novos.update(parametros)
+        return MotorDoisTempos(**novos)
+
+    def constantes(self):
+        """
+        Retorna a tupla (AR_I, C_I, KExpansao, KCompressao, R, x0, n) em floats,
+        usada pelos kernels compilados. Só é válida para motores escalares.
+        """
+        return (float(self.AR_I), float(self.C_I), float(self.KExpansao), float(self.KCompressao),
+                float(self.R), float(self.x0), float(self.n))
+
+    def pressao(self, theta):
+        """
+        Pressão no cilindro T3 para o crank angle theta (escalar ou array).
+        """
+        fase = np.mod(theta, 2*np.pi)
+        #seleção sem desvios entre as leis de expansão e compressão
+        K = np.where(fase <= np.pi, self.KExpansao, self.KCompressao)
+        return K*(self.R - self.R*np.cos(fase) + self.x0)**(-self.n)
+
+    def derivadaPressao(self, theta):
+        """
+        Derivada dT3/dtheta da pressão no cilindro (escalar ou array).
+        """
+        fase = np.mod(theta, 2*np.pi)
+        K = np.where(fase <= np.pi, self.KExpansao, self.KCompressao)
+        folga = self.R - self.R*np.cos(fase) + self.x0
+        return -self.n*K*folga**(-self.n - 1)*self.R*np.sin(fase)
+
+    def jacobiano(self, t, r):
+        """
+        Jacobiano analítico df/dr, (2, 2) para um estado ou (..., 2, 2) para um lote:
+
+            [[-2*(C/I)*w, (A*R/I)*(T3'(theta)*sin(theta) + T3(theta)*cos(theta))],
+             [1,          0                                                     ]]
+        """
+        r = np.asarray(r)
+        w = r[..., 0]
+        theta = r[..., 1]
+
+        J = np.zeros(np.shape(w) + (2, 2))
+        J[..., 0, 0] = -2*self.C_I*w
+        J[..., 0, 1] = self.AR_I*(self.derivadaPressao(theta)*np.sin(theta) + self.pressao(theta)*np.cos(theta))
+        J[..., 1, 0] = 1
+        return J
+
+    def derivadaParametros(self, t, r):
+        """
+        Derivadas analíticas df/dp em relação aos parâmetros, (2, 8) para um estado ou
+        (..., 2, 8) para um lote, com as colunas na ordem de PARAMETROS. Com a pressão
+        escrita como T3 = P*(N/F)**n, em que F = R - R*cos(theta) + x0 e N = x0 (expansão,
+        P = P3) ou N = 2*R + x0 (compressão, P = P1):
+
+            dT3/dR = n*T3*(dN/dR/N - (1 - cos(theta))/F),   dT3/dx0 = n*T3*(1/N - 1/F),
+            dT3/dn = T3*log(N/F),   dT3/dP = (N/F)**n
+        """
+        r = np.asarray(r)
+        w = r[..., 0]
+        theta = r[..., 1]
+
+        fase = np.mod(theta, 2*np.pi)
+        expansao = fase <= np.pi
+        F = self.R - self.R*np.cos(fase) + self.x0
+        N = np.where(expansao, self.x0, 2*self.R + self.x0)
+        razao = (N/F)**self.n
+        T3 = np.where(expansao, self.P3, self.P1)*razao
+
+        dT3 = {"R": self.n*T3*(np.where(expansao, 0.0, 2.0)/N - (1 - np.cos(fase))/F),
+               "x0": self.n*T3*(1/N - 1/F),
+               "n": T3*np.log(N/F),
+               "P1": np.where(expansao, 0.0, razao),
+               "P3": np.where(expansao, razao, 0.0)}
+
+        seno = np.sin(theta)
+        torque = T3*self.AR_I*seno
+        linha = {"R": self.A/self.I*seno*(T3 + self.R*dT3["R"]),
+                 "I": -(torque - self.C_I*w*w)/self.I,
+                 "C": -w*w/self.I,
+                 "A": T3*self.R/self.I*seno}
+        for nome in ("x0", "n", "P1", "P3"):
+            linha[nome] = self.AR_I*seno*dT3[nome]
+
+        D = np.zeros(np.shape(w) + (2, len(self.PARAMETROS)), dtype = np.result_type(T3, np.float64))
+        for j, nome in enumerate(self.PARAMETROS):
+            D[..., 0, j] = linha[nome]
+        return D
+
+    def trocaDeFase(self, t, r):
+        """
+        Função de evento para os integradores adaptativos: troca de sinal quando theta passa
+        por um múltiplo de pi, onde a pressão muda entre as leis de expansão e compressão.
+        """
+        return np.sin(np.asarray(r)[..., 1])
+
+    def __call__(self, t, r):
+        """
+        Lado direito "r' = f(t, r)". Aceita um estado (2,) ou um lote (..., 2).
+        """
+        r = np.asarray(r)
+        w = r[..., 0]
+        theta = r[..., 1]
+
+        T1 = self.AR_I*np.sin(theta)
+        T2 = self.C_I*w*w
+
+        return np.stack((self.pressao(theta)*T1 - T2, w), axis = -1)
+
+#%%
+################################################################################################
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Órbita periódica (ciclo limite) do motor pelo método do tiro (shooting).
+
+O regime convergido é uma órbita de uma revolução: o w* em theta = 0 (mod 2*pi) tal que
+P(w*) = w*, em que P é o mapa de uma revolução. Em vez de integrar o transiente até a
+convergência (milhares de revoluções, já que P contrai apenas por lambda ~ 0.96 a cada uma),
+F(w) = P(w) - w é resolvida por Newton ou por Broyden, cada iteração uma única revolução.
+
+A revolução é integrada com theta como variável independente pelos integradores de passo fixo
+do EDOs.py (odeTableauSys), junto com a equação variacional, que dá a derivada do mapa:
+
+    dw/dtheta = f_w/w,      dt/dtheta = 1/w,
+    dv/dtheta = (df_w/dw/w - f_w/w**2)*v,      dtau/dtheta = -v/w**2,
+
+com v = dw/dw0 e tau = dt/dw0. No fim da revolução, v = P'(w0) é o multiplicador de
+estabilidade da órbita (estável se |P'| < 1) e tau é a derivada do período.
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import collections
+
+import numpy as np
+
+from ciclos import CONVERGIU, NAO_CONVERGIU, PAROU
+import EDOs as ed
+from motor import MotorDoisTempos
+
+#%%
+############################Revolução no domínio do ângulo####################################
+
+class SistemaAngular:
+    """
+    Lado direito em theta do estado y = [w, t] (ou [w, t, v, tau] com a equação variacional)
+    de um motor autônomo "r' = f(t, r)", com r = (w, theta) e theta' = w.
+
+    Parameters
+    ----------
+    motor : MotorDoisTempos
+        Motor com parâmetros escalares.
+    variacional : Bool, optional
+        Inclui v = dw/dw0 e tau = dt/dw0. The default is True.
+
+    """
+    def __init__(self, motor, variacional = True):
+        self.motor = motor
+        self.variacional = variacional
+        jacobiano = getattr(motor, "jacobiano", None)
+        self._jacobiano = jacobiano if jacobiano is not None else (lambda t, r: ed.jacobianoNumerico(motor, t, r))
+
+    def __call__(self, theta, y):
+        w, t = y[0], y[1]
+        r = np.array((w, theta))
+        dw = float(self.motor(t, r)[0])
+        if not self.variacional:
+            return np.array((dw/w, 1/w))
+
+        v, tau = y[2], y[3]
+        a = float(self._jacobiano(t, r)[0, 0])/w - dw/(w*w)
+        return np.array((dw/w, 1/w, a*v, -v/(w*w)))
+
+def revolucao(motor, wSecao, t0 = 0.0, passosPorRevolucao = 720, tableau = ed.RK4, variacional = True):
+    """
+    Integra uma revolução a partir de (wSecao, theta = 0) com passo fixo em theta.
+
+    Parameters
+    ----------
+    motor : MotorDoisTempos
+        Motor com parâmetros escalares.
+    wSecao : Float
+        Velocidade angular em theta = 0, com wSecao > 0.
+    t0 : Float, optional
+        Tempo inicial. The default is 0.0.
+    passosPorRevolucao : Int, optional
+        Passos em theta. Um número par põe theta = pi na malha, e nenhum passo atravessa a
+        troca de lei da pressão. The default is 720.
+    tableau : Tableau, optional
+        Método de Runge-Kutta explícito. The default is RK4.
+    variacional : Bool, optional
+        Integra também v = dw/dw0 e tau = dt/dw0. The default is True.
+
+    Returns
+    -------
+    theta : Array
+        Malha angular, (passosPorRevolucao + 1,).
+    y : Array
+        Matriz com [w, t] (ou [w, t, v, tau]) em cada ponto. Contém valores não finitos ou
+        w <= 0 se o motor parou durante a revolução.
+
+    """
+    N = int(passosPorRevolucao)
+    y0 = [float(wSecao), float(t0), 1.0, 0.0] if variacional else [float(wSecao), float(t0)]
+    with np.errstate(all = "ignore"):
+        return ed.odeTableauSys(SistemaAngular(motor, variacional), y0, 0.0, N + 1, 2*np.pi/N, tableau,
+                                dtype = np.float64)
+
+def _parou(y):
+    return not (np.all(np.isfinite(y)) and np.all(y[:, 0] > 0))
+
+#%%
+############################Tiro####################################
+
+Orbita = collections.namedtuple("Orbita", ["wSecao", "w", "periodo", "multiplicador", "estavel", "t", "r",
+                                           "iteracoes", "revolucoes", "status"])
+
+def orbitaPeriodica(motor = None, w0 = 50.0, tol = 1E-10, maxIteracoes = 30, passosPorRevolucao = 720,
+                    tableau = ed.RK4, metodo = "newton"):
+    """
+    Ciclo limite do motor: resolve P(w) = w em theta = 0 (mod 2*pi) pelo método do tiro.
+
+    Parameters
+    ----------
+    motor : MotorDoisTempos, optional
+        Motor com parâmetros escalares. The default is None (MotorDoisTempos()).
+    w0 : Float, optional
+        Estimativa inicial de w em theta = 0. The default is 50.0.
+    tol : Float, optional
+        Resíduo relativo |P(w) - w|/w aceito. The default is 1E-10.
+    maxIteracoes : Int, optional
+        Limite de iterações. The default is 30.
+    passosPorRevolucao : Int, optional
+        Passos em theta de cada revolução. The default is 720.
+    tableau : Tableau, optional
+        Método de Runge-Kutta explícito das revoluções. The default is RK4.
+    metodo : String, optional
+        "newton" integra a equação variacional em todas as iterações. "broyden" a integra
+        apenas na primeira e depois atualiza a derivada pelas secantes, com revoluções sem a
+        equação variacional; o multiplicador é então a última secante. The default is "newton".
+
+    Returns
+    -------
+    Orbita
+        Tupla com wSecao (w* em theta = 0), w (velocidade angular média, 2*pi/periodo), periodo,
+        multiplicador (P'(w*)), estavel (|P'(w*)| < 1), t e r (a revolução da órbita, r com w
+        e theta como nos integradores no tempo), iteracoes, revolucoes (integradas) e status
+        (CONVERGIU, NAO_CONVERGIU ou PAROU, se o motor parou em uma revolução). Com
+        NAO_CONVERGIU, todos os campos são os da última revolução integrada, a partir de wSecao.
+
+        CONVERGIU indica apenas que o tiro convergiu: o Newton também converge para órbitas
+        instáveis, e a estabilidade é dada por "estavel". No MotorDoisTempos, em u = w**2 a
+        revolução é linear (du/dtheta = 2*g(theta) - 2*(C/I)*u), o mapa é afim e toda órbita
+        em que w > 0 tem multiplicador exp(-4*pi*C/I) ~ 0.956. Um multiplicador muito diferente
+        indica uma revolução mal resolvida em que w quase zera (dw/dtheta é singular em w = 0):
+        por isso a órbita convergida é conferida com uma revolução de 2*passosPorRevolucao
+        passos. Se nela o motor parar, o status é PAROU (como no mapa.convergeRevolucoes); se
+        P(w*) mudar mais de 1E-3*w*, NAO_CONVERGIU.
+
+    """
+    if metodo not in ("newton", "broyden"):
+        raise ValueError("Método desconhecido: %r" % metodo)
+    motor = MotorDoisTempos() if motor is None else motor
+    w = float(w0)
+    if not w > 0:
+        raise ValueError("O tiro exige w0 > 0.")
+
+    derivada = None #P'(w) - 1
+    anterior = None #(w, F(w)) da iteração anterior, para a secante do Broyden
+    integrada = None #(w, theta, y, derivada) da última revolução completa
+    status = NAO_CONVERGIU
+    revolucoes = 0
+    for k in range(1, maxIteracoes + 1):
+        variacional = metodo == "newton" or derivada is None
+        theta, y = revolucao(motor, w, 0.0, passosPorRevolucao, tableau, variacional)
+        revolucoes += 1
+        if _parou(y):
+            if anterior is None:
+                status = PAROU
+                break
+            #o passo foi longe demais: volta para a metade do caminho
+            w = 0.5*(w + anterior[0])
+            continue
+
+        F = y[-1, 0] - w
+        if variacional:
+            derivada = y[-1, 2] - 1
+        elif F != anterior[1]:
+            derivada = (F - anterior[1])/(w - anterior[0])
+        integrada = (w, theta, y, derivada)
+        if abs(F) <= tol*abs(w):
+            status = CONVERGIU
+            break
+
+        anterior = (w, F)
+        passo = -F/derivada
+        while w + passo <= 0: #amortece passos que levariam w a zero
+            passo *= 0.5
+        w += passo
+
+    if status == CONVERGIU:
+        #confere a órbita em uma malha duas vezes mais fina
+        _, yFino = revolucao(motor, w, 0.0, 2*passosPorRevolucao, tableau, variacional = False)
+        revolucoes += 1
+        if _parou(yFino):
+            status = PAROU
+        elif abs(yFino[-1, 0] - w) > 1E-3*abs(w):
+            status = NAO_CONVERGIU
+
+    if status == PAROU:
+        return Orbita(w, np.nan, np.nan, np.nan, False, None, None, k, revolucoes, PAROU)
+
+    #sem convergência, o resultado é o da última revolução integrada, e não o próximo iterado
+    w, theta, y, derivada = integrada
+    periodo = float(y[-1, 1])
+    r = np.empty((len(theta), 2))
+    r[:, 0], r[:, 1] = y[:, 0], theta
+    multiplicador = derivada + 1
+    return Orbita(w, 2*np.pi/periodo, periodo, multiplicador, bool(abs(multiplicador) < 1), y[:, 1], r, k,
+                  revolucoes, status)
+
+#%%
+################################################################################################
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Análise de sensibilidade direta (forward sensitivity) do motor em relação aos seus parâmetros.
+
+Com S = dr/dp (matriz 2 x P), as equações de sensibilidade são
+
+    S' = J(t, r) S + df/dp(t, r),      S(t0) = 0
+
+e são integradas junto com o sistema, em um único estado aumentado [r, S], pelos
+integradores do EDOs.py. O jacobiano e df/dp são os analíticos do MotorDoisTempos
+(jacobiano e derivadaParametros) quando existem; senão, df/dp é calculado por passo complexo
+e o jacobiano por diferenças finitas.
+
+As derivadas do regime convergido vêm da órbita periódica (sensibilidadeOrbita): o ponto fixo
+w* = P(w*, p) do mapa de uma revolução dá dw*/dp = (1 - dP/dw)**-1 * dP/dp, sem integrar o
+transiente, em que S se acomoda bem mais devagar que w.
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import collections
+import warnings
+
+import numpy as np
+
+import ciclos
+import EDOs as ed
+import orbita
+
+#%%
+############################Derivadas por passo complexo####################################
+
+def derivadaParametrosComplexa(motor, nomes, t, r, passo = 1E-30):
+    """
+    df/dp pelo passo complexo, Im(f(p + i*h))/h, exato até o arredondamento. O motor deve
+    aceitar parâmetros complexos em "substitui" (como o MotorDoisTempos). Retorna (..., 2, P).
+    """
+    parametros = motor.parametros()
+    colunas = []
+    for nome in nomes:
+        valor = parametros[nome]
+        h = passo*np.maximum(np.abs(valor), 1.0)
+        colunas.append(np.imag(motor.substitui(**{nome: valor + 1j*h})(t, r))/h)
+    return np.stack(colunas, axis = -1)
+
+#%%
+############################Sistema aumentado####################################
+
+class SistemaSensibilidade:
+    """
+    Lado direito do sistema aumentado z = [r, S.ravel()], com S = dr/dp de forma (n, P).
+
+    Parameters
+    ----------
+    motor : Function
+        Lado direito "r' = f(t, r)" com parâmetros (por exemplo MotorDoisTempos).
+    nomes : Lista ou tupla
+        Parâmetros das colunas de S.
+    dimensao : Int, optional
+        Número de equações de f. The default is 2.
+
+    """
+    def __init__(self, motor, nomes, dimensao = 2):
+        self.motor = motor
+        self.nomes = tuple(nomes)
+        self.n = dimensao
+        self.P = len(self.nomes)
+
+        analiticas = getattr(motor, "derivadaParametros", None)
+        if analiticas is not None and all(nome in motor.PARAMETROS for nome in self.nomes):
+            colunas = [motor.PARAMETROS.index(nome) for nome in self.nomes]
+            self._derivadaParametros = lambda t, r: analiticas(t, r)[..., colunas]
+        else:
+            self._derivadaParametros = lambda t, r: derivadaParametrosComplexa(motor, self.nomes, t, r)
+
+        jacobiano = getattr(motor, "jacobiano", None)
+        self._jacobiano = jacobiano if jacobiano is not None else (lambda t, r: ed.jacobianoNumerico(motor, t, r))
+
+    def estadoInicial(self, r0, S0 = None):
+        """
+        z0 = [r0, S0], com S0 = 0 (condições iniciais que não dependem dos parâmetros) se omitido.
+        """
+        S0 = np.zeros((self.n, self.P)) if S0 is None else np.asarray(S0, dtype = np.float64)
+        return np.concatenate((np.asarray(r0, dtype = np.float64), S0.ravel()))
+
+    def separa(self, z):
+        """
+        Divide estados aumentados (..., n + n*P) em r (..., n) e S (..., n, P).
+        """
+        z = np.asarray(z)
+        return z[..., :self.n], z[..., self.n:].reshape(z.shape[:-1] + (self.n, self.P))
+
+    def __call__(self, t, z):
+        r, S = self.separa(z)
+        dr = np.asarray(self.motor(t, r), dtype = np.float64)
+        dS = np.matmul(self._jacobiano(t, r), S) + self._derivadaParametros(t, r)
+        return np.concatenate((dr, dS.reshape(dS.shape[:-2] + (-1,))), axis = -1)
+
+    def trocaDeFase(self, t, z):
+        """
+        Evento das trocas da lei da pressão sobre o estado aumentado.
+        """
+        return self.motor.trocaDeFase(t, np.asarray(z)[..., :self.n])
+
+#%%
+############################Integração####################################
+
+def odeSensibilidadeSys(motor, r0, t0, t_end, parametros = None, h = None, controlador = None, tableau = ed.DOPRI54,
+                        eventos = True, dtype = np.float64):
+    """
+    Integra o motor e as suas sensibilidades em relação aos parâmetros em uma única execução
+    adaptativa (odeAdaptativoSys), com o passo controlado também pelo erro de S.
+
+    Parameters
+    ----------
+    motor : MotorDoisTempos
+        Motor com parâmetros escalares.
+    r0 : Array
+        Condições iniciais (w0, theta0).
+    t0 : Float
+        Tempo inicial.
+    t_end : Float
+        Tempo final.
+    parametros : Lista ou tupla, optional
+        Parâmetros das colunas de S. The default is None (motor.PARAMETROS).
+    h : Float, optional
+        Passo inicial. The default is None (automático).
+    controlador : ControladorPI, optional
+        Controle do passo. The default is None (ControladorPI(rtol = 1E-8, atol = 1E-8)).
+    tableau : Tableau, optional
+        Par embutido. The default is DOPRI54.
+    eventos : Bool, optional
+        Termina os passos nas trocas da lei da pressão, onde df/dp e J são descontínuos.
+        The default is True.
+    dtype : Dtype, optional
+        Tipo dos arrays retornados. The default is np.float64.
+
+    Returns
+    -------
+    t : Array
+        Vetor com os passos aceitos.
+    r : Array
+        Matriz (N, 2) com a trajetória.
+    S : Array
+        Sensibilidades dr/dp, (N, 2, P), com as colunas na ordem de "parametros".
+
+    """
+    parametros = motor.PARAMETROS if parametros is None else parametros
+    sistema = SistemaSensibilidade(motor, parametros, np.size(r0))
+    controlador = ed.ControladorPI(rtol = 1E-8, atol = 1E-8) if controlador is None else controlador
+
+    t, z, _ = ed.odeAdaptativoSys(sistema, sistema.estadoInicial(r0), t0, t_end, h = h, tableau = tableau,
+                                  eventos = [sistema.trocaDeFase] if eventos else None, controlador = controlador,
+                                  dtype = dtype)
+    r, S = sistema.separa(z)
+    return t, r, S
+
+def sensibilidadeVelocidadeMedia(motor, t, r, S, parametros = None, indiceVelocidade = 0, indiceAngulo = 1, tol = 1E-4):
+    """
+    Velocidade angular média da última revolução completa, 2*pi/T, e a sua derivada em relação
+    aos parâmetros, a partir de uma saída de odeSensibilidadeSys.
+
+    O instante tk da passagem por 2*pi*k depende dos parâmetros por theta(tk, p) = 2*pi*k, de
+    modo que dtk/dp = -S_theta(tk)/w(tk). As passagens são localizadas, e r e S interpolados
+    nelas, pela interpolação de Hermite dos passos (ciclos.revolucoesNoPasso), com as derivadas
+    do sistema aumentado nas extremidades.
+
+    A derivada só é a da velocidade convergida depois que S se acomoda, o que demora mais que
+    o transiente de w: para a derivada convergida, use sensibilidadeOrbita. Se a trajetória
+    tiver três revoluções completas, as derivadas das duas últimas são comparadas, e um aviso
+    (RuntimeWarning) é emitido se alguma mudou mais que tol em relação ao seu valor.
+
+    Parameters
+    ----------
+    motor : MotorDoisTempos
+        Motor integrado em odeSensibilidadeSys.
+    t, r, S : Array
+        Saída de odeSensibilidadeSys.
+    parametros : Lista ou tupla, optional
+        Parâmetros das colunas de S. The default is None (motor.PARAMETROS).
+    tol : Float, optional
+        Mudança relativa aceita entre as derivadas das duas últimas revoluções.
+        The default is 1E-4.
+
+    Returns
+    -------
+    wMedio : Float
+        Velocidade angular média da última revolução completa.
+    dwMedio : Array
+        Derivadas dwMedio/dp, (P,).
+
+    """
+    parametros = motor.PARAMETROS if parametros is None else parametros
+    sistema = SistemaSensibilidade(motor, parametros, np.shape(r)[-1])
+    t = np.asarray(t, dtype = np.float64)
+    r = np.asarray(r, dtype = np.float64)
+    S = np.asarray(S, dtype = np.float64)
+
+    #passagens (tk, dtk/dp), da última para trás
+    passagens = []
+    k = np.floor(r[:, indiceAngulo]/(2*np.pi))
+    for j in np.nonzero(k[1:] != k[:-1])[0][::-1]:
+        z0, z1 = sistema.estadoInicial(r[j], S[j]), sistema.estadoInicial(r[j+1], S[j+1])
+        dz0, dz1 = sistema(t[j], z0), sistema(t[j+1], z1)
+        for _, tk, s in reversed(ciclos.revolucoesNoPasso(t[j], z0, dz0, t[j+1], z1, dz1, indiceAngulo)):
+            rk, Sk = sistema.separa(ed.interpolaHermite(s, t[j+1] - t[j], z0, dz0, z1, dz1))
+            passagens.append((tk, -Sk[indiceAngulo]/rk[indiceVelocidade]))
+        if len(passagens) >= 3:
+            break
+    if len(passagens) < 2:
+        raise ValueError("A trajetória não tem uma revolução completa.")
+
+    def media(ultima, primeira):
+        periodo = ultima[0] - primeira[0]
+        return 2*np.pi/periodo, -2*np.pi/periodo**2*(ultima[1] - primeira[1])
+
+    wMedio, dwMedio = media(passagens[0], passagens[1])
+    if len(passagens) >= 3:
+        _, dwAnterior = media(passagens[1], passagens[2])
+        if np.any(np.abs(dwMedio - dwAnterior) > tol*np.abs(dwMedio)):
+            warnings.warn("As sensibilidades ainda não se acomodaram: a derivada da velocidade média "
+                          "mudou mais que tol na última revolução (use sensibilidadeOrbita).",
+                          RuntimeWarning, stacklevel = 2)
+    return wMedio, dwMedio
+
+#%%
+############################Sensibilidade da órbita periódica####################################
+
+class SistemaAngularSensibilidade(orbita.SistemaAngular):
+    """
+    Lado direito em theta de y = [w, t, v, tau, vp, taup] para uma revolução, com as equações
+    variacionais de orbita.SistemaAngular e, para os P parâmetros, vp = dw/dp e taup = dt/dp
+    (w0 fixo):
+
+        dvp/dtheta = (df_w/dw/w - f_w/w**2)*vp + (df_w/dp)/w,      dtaup/dtheta = -vp/w**2
+
+    Parameters
+    ----------
+    motor : MotorDoisTempos
+        Motor com parâmetros escalares.
+    nomes : Lista ou tupla
+        Parâmetros de vp e taup.
+
+    """
+    def __init__(self, motor, nomes):
+        super().__init__(motor, variacional = True)
+        self.P = len(nomes)
+        self._derivadaParametros = SistemaSensibilidade(motor, nomes)._derivadaParametros
+
+    def __call__(self, theta, y):
+        w, t, v = y[0], y[1], y[2]
+        vp = y[4:4 + self.P]
+        r = np.array((w, theta))
+        dw = float(self.motor(t, r)[0])
+        a = float(self._jacobiano(t, r)[0, 0])/w - dw/(w*w)
+        dfp = np.real(self._derivadaParametros(t, r)[0])
+        return np.concatenate(((dw/w, 1/w, a*v, -v/(w*w)), a*vp + dfp/w, -vp/(w*w)))
+
+SensibilidadeOrbita = collections.namedtuple("SensibilidadeOrbita", ["wSecao", "w", "dwSecao", "dw", "multiplicador"])
+
+def sensibilidadeOrbita(motor, parametros = None, orbitaMotor = None, passosPorRevolucao = 720,
+                        tableau = ed.RK4):
+    """
+    Derivadas da órbita periódica (o regime convergido) em relação aos parâmetros, sem o
+    transiente: com P(w, p) o mapa de uma revolução e w* = P(w*, p),
+
+        dw*/dp = (1 - dP/dw)**-1 * dP/dp,      dT/dp = dt/dp + (dt/dw0)*dw*/dp,
+
+    em que T é o período, integrados em uma revolução a partir de w* (SistemaAngularSensibilidade).
+    A velocidade média é 2*pi/T, e dw/dp = -2*pi/T**2*dT/dp.
+
+    Parameters
+    ----------
+    motor : MotorDoisTempos
+        Motor com parâmetros escalares.
+    parametros : Lista ou tupla, optional
+        Parâmetros das derivadas. The default is None (motor.PARAMETROS).
+    orbitaMotor : Orbita, optional
+        Órbita convergida do motor (orbita.orbitaPeriodica). The default is None (calculada
+        com passosPorRevolucao e tableau).
+    passosPorRevolucao : Int, optional
+        Passos em theta da revolução. The default is 720.
+    tableau : Tableau, optional
+        Método de Runge-Kutta explícito da revolução. The default is RK4.
+
+    Returns
+    -------
+    SensibilidadeOrbita
+        Tupla com wSecao (w* em theta = 0), w (velocidade angular média), dwSecao (dw*/dp, (P,)),
+        dw (dw/dp da velocidade média, (P,)) e multiplicador (dP/dw em w*).
+
+    """
+    parametros = motor.PARAMETROS if parametros is None else tuple(parametros)
+    if orbitaMotor is None:
+        orbitaMotor = orbita.orbitaPeriodica(motor, passosPorRevolucao = passosPorRevolucao, tableau = tableau)
+    if orbitaMotor.status != ciclos.CONVERGIU:
+        raise ValueError("A órbita periódica do motor não convergiu.")
+
+    P = len(parametros)
+    N = int(passosPorRevolucao)
+    y0 = np.zeros(4 + 2*P)
+    y0[0], y0[2] = orbitaMotor.wSecao, 1.0
+    with np.errstate(all = "ignore"):
+        _, y = ed.odeTableauSys(SistemaAngularSensibilidade(motor, parametros), y0, 0.0, N + 1, 2*np.pi/N,
+                                tableau, dtype = np.float64)
+    _, periodo, derivada, tau = y[-1, :4]
+    dwSecao = y[-1, 4:4 + P]/(1 - derivada)
+    dperiodo = y[-1, 4 + P:] + tau*dwSecao
+    return SensibilidadeOrbita(orbitaMotor.wSecao, 2*np.pi/periodo, dwSecao, -2*np.pi/periodo**2*dperiodo,
+                               derivada)
+
+#%%
+################################################################################################
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Tabelas da pressão no cilindro T3(theta), construídas uma vez por geometria e guardadas
+em um cache LRU, opcionalmente persistido em disco.
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import collections
+import hashlib
+import os
+
+import numpy as np
+
+from motor import MotorDoisTempos
+
+#%%
+############################Tabela da pressão####################################
+
+class TabelaPressao:
+    """
+    T3(theta) tabelada em malhas uniformes separadas para a expansão (0 <= theta <= pi) e para
+    a compressão (pi < theta < 2*pi), de modo que nenhuma interpolação atravessa a troca de lei.
+
+    A interpolação linear usa apenas os valores nos nós; a cúbica é a de Hermite com as
+    derivadas analíticas (MotorDoisTempos.derivadaPressao). Depois de construída, a tabela mede
+    o erro relativo em três pontos internos de cada intervalo e, se "tolerancia" for dada,
+    dobra o número de pontos até atingi-la.
+
+    Parameters
+    ----------
+    R, x0, n, P1, P3 : Float
+        Parâmetros do motor que definem a pressão (veja MotorDoisTempos).
+    pontos : Int, optional
+        Intervalos de cada meia-volta. The default is 4096.
+    metodo : String, optional
+        "cubica" ou "linear". The default is "cubica".
+    tolerancia : Float, optional
+        Erro relativo máximo aceito. The default is None (usa "pontos" como dado).
+
+    """
+    PONTOS_MAX = 2**22
+
+    def __init__(self, R = 0.305, x0 = 0.0254, n = 1.3, P1 = 0.1E6, P3 = 10.3E6, pontos = 4096, metodo = "cubica",
+                 tolerancia = None):
+        if metodo not in ("cubica", "linear"):
+            raise ValueError("Interpolação desconhecida: %r" % metodo)
+        self.chave = (float(R), float(x0), float(n), float(P1), float(P3))
+        self.metodo = metodo
+        self.tolerancia = tolerancia
+        self._motor = MotorDoisTempos(R = R, x0 = x0, n = n, P1 = P1, P3 = P3)
+
+        while True:
+            self._constroi(int(pontos))
+            self.erroRelativo = self._mede()
+            if tolerancia is None or self.erroRelativo <= tolerancia:
+                break
+            if 2*pontos > self.PONTOS_MAX:
+                raise ValueError("Tolerância %g não atingida com %d pontos (erro %g)." % (tolerancia, pontos, self.erroRelativo))
+            pontos = 2*pontos
+
+    def _constroi(self, pontos):
+        self.pontos = pontos
+        self.dtheta = np.pi/pontos
+        theta = np.arange(pontos + 1)*self.dtheta
+        #extremos fechados de cada lei: [0, pi] na expansão e [pi, 2*pi] na compressão
+        K = np.stack((np.full(pontos + 1, float(self._motor.KExpansao)),
+                      np.full(pontos + 1, float(self._motor.KCompressao))))
+        fase = np.stack((theta, theta + np.pi))
+        R, x0, n = self.chave[0], self.chave[1], self.chave[2]
+        folga = R - R*np.cos(fase) + x0
+        self.valores = K*folga**(-n)
+        self.derivadas = -n*K*folga**(-n - 1)*R*np.sin(fase)
+        self._coeficientes()
+
+    def _coeficientes(self):
+        """
+        Polinômio de cada intervalo na variável local s em [0, 1], em potências crescentes,
+        com os intervalos da expansão seguidos pelos da compressão: uma única consulta por ponto.
+        """
+        y0, y1 = self.valores[:, :-1].ravel(), self.valores[:, 1:].ravel()
+        if self.metodo == "linear":
+            self.coef = np.stack((y0, y1 - y0), axis = -1)
+            return
+        h = self.dtheta
+        d0, d1 = h*self.derivadas[:, :-1].ravel(), h*self.derivadas[:, 1:].ravel()
+        self.coef = np.stack((y0, d0, 3*(y1 - y0) - 2*d0 - d1, 2*(y0 - y1) + d0 + d1), axis = -1)
+
+    def _mede(self):
+        s = np.array([0.25, 0.5, 0.75])
+        theta = ((np.arange(self.pontos)[:, None] + s)*self.dtheta).ravel()
+        theta = np.concatenate((theta, theta + np.pi))
+        exato = self._motor.pressao(theta)
+        return float(np.max(np.abs(self(theta) - exato)/np.abs(exato)))
+
+    def __call__(self, theta):
+        """
+        Pressão T3 interpolada para theta (escalar ou array).
+        """
+        x = np.mod(theta, 2*np.pi)/self.dtheta
+        #um nó exato fica no fim do intervalo anterior: theta = pi ainda é expansão, como em T3
+        k = np.maximum(np.ceil(x).astype(np.intp) - 1, 0)
+        s = x - k
+        c = self.coef[k]
+        if self.metodo == "linear":
+            return c[..., 0] + s*c[..., 1]
+        return c[..., 0] + s*(c[..., 1] + s*(c[..., 2] + s*c[..., 3]))
+
+    def salva(self, caminho):
+        np.savez(caminho, chave = np.array(self.chave), pontos = self.pontos, metodo = self.metodo,
+                 valores = self.valores, derivadas = self.derivadas, erroRelativo = self.erroRelativo)
+
+    @classmethod
+    def carrega(cls, caminho):
+        """
+        Lê uma tabela gravada por "salva", sem recalcular os nós.
+        """
+        with np.load(caminho) as dados:
+            tabela = cls.__new__(cls)
+            tabela.chave = tuple(float(v) for v in dados["chave"])
+            R, x0, n, P1, P3 = tabela.chave
+            tabela._motor = MotorDoisTempos(R = R, x0 = x0, n = n, P1 = P1, P3 = P3)
+            tabela.metodo = str(dados["metodo"])
+            tabela.tolerancia = None
+            tabela.pontos = int(dados["pontos"])
+            tabela.dtheta = np.pi/tabela.pontos
+            tabela.valores = dados["valores"]
+            tabela.derivadas = dados["derivadas"]
+            tabela.erroRelativo = float(dados["erroRelativo"])
+        tabela._coeficientes()
+        return tabela
+
+#%%
+############################Cache LRU####################################
+
+class CacheTabelas:
+    """
+    Cache LRU de TabelaPressao indexado por (R, x0, n, P1, P3) e pelas opções da tabela.
+
+    Parameters
+    ----------
+    tamanho : Int, optional
+        Número máximo de tabelas na memória. The default is 16.
+    diretorio : String, optional
+        Se dado, as tabelas são gravadas nesta pasta e lidas dela antes de serem construídas,
+        o que também as compartilha entre processos de uma varredura. The default is None.
+
+    """
+    def __init__(self, tamanho = 16, diretorio = None):
+        self.tamanho = tamanho
+        self.diretorio = diretorio
+        self.tabelas = collections.OrderedDict()
+        self.acertos = 0
+        self.faltas = 0
+
+    def _arquivo(self, chave):
+        nome = hashlib.sha1(repr(chave).encode()).hexdigest()[:20]
+        return os.path.join(self.diretorio, "pressao_%s.npz" % nome)
+
+    def obtem(self, R, x0, n, P1, P3, pontos = 4096, metodo = "cubica", tolerancia = None):
+        chave = (float(R), float(x0), float(n), float(P1), float(P3), int(pontos), metodo, tolerancia)
+        if chave in self.tabelas:
+            self.acertos += 1
+            self.tabelas.move_to_end(chave)
+            return self.tabelas[chave]
+
+        self.faltas += 1
+        tabela = None
+        if self.diretorio is not None and os.path.exists(self._arquivo(chave)):
+            tabela = TabelaPressao.carrega(self._arquivo(chave))
+        if tabela is None:
+            tabela = TabelaPressao(R, x0, n, P1, P3, pontos, metodo, tolerancia)
+            if self.diretorio is not None:
+                os.makedirs(self.diretorio, exist_ok = True)
+                temporario = self._arquivo(chave) + ".%d.npz" % os.getpid()
+                tabela.salva(temporario)
+                os.replace(temporario, self._arquivo(chave)) #outro processo pode estar gravando a mesma tabela
+
+        self.tabelas[chave] = tabela
+        if len(self.tabelas) > self.tamanho:
+            self.tabelas.popitem(last = False)
+        return tabela
+
+#Cache usado por padrão (apenas na memória)
+CACHE = CacheTabelas()
+
+def tabelaPressao(motor, pontos = 4096, metodo = "cubica", tolerancia = None, cache = None):
+    """
+    Tabela da pressão para a geometria de um MotorDoisTempos escalar, pelo cache dado ou por CACHE.
+    """
+    cache = CACHE if cache is None else cache
+    return cache.obtem(motor.R, motor.x0, motor.n, motor.P1, motor.P3, pontos, metodo, tolerancia)
+
+#%%
+############################Motor com a pressão tabelada####################################
+
+class MotorTabelado(MotorDoisTempos):
+    """
+    MotorDoisTempos cujo lado direito usa a TabelaPressao da sua geometria em vez de
+    np.cos e da potência fracionária. Os parâmetros devem ser escalares.
+
+    Parameters
+    ----------
+    Os de MotorDoisTempos, mais:
+    pontos, metodo, tolerancia : optional
+        Opções da tabela (veja TabelaPressao).
+    cache : CacheTabelas, optional
+        Cache de onde a tabela é obtida. The default is None (CACHE).
+
+    """
+    def __init__(self, R = 0.305, x0 = 0.0254, I = 3.171, C = 0.0113, n = 1.3, A = 0.00188, P1 = 0.1E6, P3 = 10.3E6,
+                 pontos = 4096, metodo = "cubica", tolerancia = None, cache = None):
+        super().__init__(R, x0, I, C, n, A, P1, P3)
+        self.opcoesTabela = {"pontos": pontos, "metodo": metodo, "tolerancia": tolerancia, "cache": cache}
+        self.tabela = tabelaPressao(self, **self.opcoesTabela)
+
+    def substitui(self, **parametros):
+        novos = self.parametros()
+        novos.update(self.opcoesTabela)
+        novos.update(parametros)
+        return MotorTabelado(**novos)
+
+    def chaveCache(self):
+        """
+        Identidade do lado direito para cache.CacheResultados: os parâmetros e as opções da tabela.
+        """
+        opcoes = {nome: valor for nome, valor in self.opcoesTabela.items() if nome != "cache"}
+        return ("MotorTabelado", sorted((nome, float(valor)) for nome, valor in self.parametros().items()),
+                sorted(opcoes.items()))
+
+    def pressao(self, theta):
+        return self.tabela(theta)
+
+#%%
+################################################################################################
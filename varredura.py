@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Varredura de métodos, passos e parâmetros do motor em paralelo, com um pool de processos.
+
+@author: Widmark Kaue and Luana Gomes
+"""
+import concurrent.futures
+import itertools
+import os
+import time
+
+import numpy as np
+
+import EDOs as ed
+import ciclos
+import tabelas
+from motor import MotorDoisTempos
+
+#%%
+############################Casos da varredura####################################
+
+#Valores usados quando a grade não define a entrada; "tabela" usa a pressão tabelada (tabelas.MotorTabelado)
+PADRAO = {"metodo": "Runge-Kutta", "h": 0.01, "adaptativo": False, "e": 1E-3,
+          "w0": 50.0, "theta0": 0.0, "t0": 0.0, "t_end": 13.0, "tabela": False}
+
+#Colunas de resultado de cada caso
+RESULTADO_DTYPE = [("wMedio", np.float64), #velocidade angular média da última revolução completa
+                   ("flutuacao", np.float64), #flutuação cíclica da última revolução completa
+                   ("ciclos", np.int64),
+                   ("tempo", np.float64), #tempo de parede do caso em segundos
+                   ("parou", np.bool_), #o motor parou (w <= 0) antes de t_end
+                   ("concluido", np.bool_)]
+
+def casos(grade):
+    """
+    Lista de casos (dicionários) do produto cartesiano da grade, na ordem de itertools.product.
+
+    Parameters
+    ----------
+    grade : Dict
+        Nome da entrada -> lista de valores. As entradas podem ser as de PADRAO ou os
+        parâmetros de MotorDoisTempos; "metodo" é o nome de um Tableau de ed.TABLEAUS.
+
+    """
+    nomes = list(grade)
+    return [dict(zip(nomes, valores)) for valores in itertools.product(*(grade[nome] for nome in nomes))]
+
+def _entrada(caso):
+    """
+    Caso completado com PADRAO e o motor correspondente.
+    """
+    entrada = dict(PADRAO)
+    entrada.update(caso)
+    parametros = {nome: entrada[nome] for nome in MotorDoisTempos.PARAMETROS if nome in entrada}
+    motor = tabelas.MotorTabelado(**parametros) if entrada["tabela"] else MotorDoisTempos(**parametros)
+    return entrada, motor
+
+def integraCaso(caso, diretorioCache = None, dtype = np.float32):
+    """
+    Integra um caso até t_end e retorna (t, r), sem a análise por ciclo, com arrays do tipo
+    dtype. Os de passo fixo usam cache.CacheResultados se diretorioCache for dado.
+    """
+    entrada, motor = _entrada(caso)
+    r0, t0, h, tableau = (entrada["w0"], entrada["theta0"]), entrada["t0"], entrada["h"], ed.TABLEAUS[entrada["metodo"]]
+
+    if entrada["adaptativo"]:
+        t, r, _ = ed.odeAdaptativoSys(motor, r0, t0, entrada["t_end"], h = h, e = entrada["e"], tableau = tableau,
+                                      dtype = dtype)
+        return t, r
+    N = int(round((entrada["t_end"] - t0)/h)) + 1
+    if diretorioCache is None:
+        return ed.odeTableauSys(motor, r0, t0, NUMBER_OF_STEPS = N, h = h, tableau = tableau, dtype = dtype)
+    import cache
+    return cache.CacheResultados(diretorioCache).odeTableauSys(motor, r0, t0, N, h, tableau, dtype = dtype)
+
+def executaCaso(caso):
+    """
+    Integra um caso e resume a última revolução completa com ciclos.odeCiclos.
+    """
+    entrada, motor = _entrada(caso)
+
+    inicio = time.perf_counter()
+    tabela, parou = ciclos.odeCiclos(motor, (entrada["w0"], entrada["theta0"]), entrada["t0"], h = entrada["h"],
+                                     tableau = ed.TABLEAUS[entrada["metodo"]], t_end = entrada["t_end"],
+                                     adaptativo = entrada["adaptativo"], e = entrada["e"], retornaParada = True)
+    tempo = time.perf_counter() - inicio
+
+    if len(tabela) == 0:
+        return (np.nan, np.nan, 0, tempo, parou, True)
+    return (tabela["wMedio"][-1], tabela["flutuacao"][-1], len(tabela), tempo, parou, True)
+
+def _executaBloco(bloco):
+    return [executaCaso(caso) for caso in bloco]
+
+#%%
+############################Execução em paralelo####################################
+
+def _tabela(lista, grade):
+    """
+    Tabela estruturada com as entradas de cada caso e colunas de resultado vazias.
+    """
+    campos = []
+    for nome, valores in grade.items():
+        tipo = np.asarray(valores).dtype
+        campos.append((nome, "U32" if tipo.kind in "US" else tipo))
+    tabela = np.zeros(len(lista), dtype = campos + RESULTADO_DTYPE)
+    for nome in grade:
+        tabela[nome] = [caso[nome] for caso in lista]
+    for nome in ("wMedio", "flutuacao", "tempo"):
+        tabela[nome] = np.nan
+    return tabela
+
+def executaVarredura(grade, processos = None, tamanhoBloco = None, progresso = None, cancelar = None):
+    """
+    Executa todos os casos da grade em um pool de processos e junta os resultados em uma tabela.
+
+    Parameters
+    ----------
+    grade : Dict
+        Nome da entrada -> lista de valores (veja "casos").
+    processos : Int, optional
+        Número de processos. 0 executa tudo no processo atual. The default is None (os.cpu_count()).
+    tamanhoBloco : Int, optional
+        Número de casos enviados de uma vez a cada processo. The default is None, que divide
+        os casos em cerca de quatro blocos por processo.
+    progresso : Function, optional
+        progresso(concluidos, total), chamada sempre que um bloco termina. The default is None.
+    cancelar : threading.Event, optional
+        Quando ativado, os blocos pendentes são cancelados e a tabela parcial é retornada.
+        The default is None.
+
+    Um KeyboardInterrupt (Ctrl+C) também cancela os blocos pendentes e retorna a tabela
+    parcial, sem esperar os blocos em execução.
+
+    Returns
+    -------
+    tabela : Array
+        Array estruturado com uma linha por caso, na ordem de "casos(grade)": as entradas da
+        grade seguidas de RESULTADO_DTYPE. Casos cancelados ficam com concluido = False.
+
+    """
+    lista = casos(grade)
+    tabela = _tabela(lista, grade)
+    total = len(lista)
+    processos = os.cpu_count() if processos is None else processos
+
+    if tamanhoBloco is None:
+        tamanhoBloco = max(1, total//(4*max(1, processos)))
+    blocos = [(inicio, lista[inicio:inicio + tamanhoBloco]) for inicio in range(0, total, tamanhoBloco)]
+
+    concluidos = 0
+
+    def guarda(inicio, resultados):
+        nonlocal concluidos
+        for i, resultado in enumerate(resultados):
+            linha = tabela[inicio + i]
+            for (nome, _), valor in zip(RESULTADO_DTYPE, resultado):
+                linha[nome] = valor
+        concluidos += len(resultados)
+        if progresso is not None:
+            progresso(concluidos, total)
+
+    if processos == 0:
+        try:
+            for inicio, bloco in blocos:
+                if cancelar is not None and cancelar.is_set():
+                    break
+                guarda(inicio, _executaBloco(bloco))
+        except KeyboardInterrupt:
+            pass #o bloco interrompido fica com concluido = False
+        return tabela
+
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers = processos)
+    interrompido = False
+    try:
+        futuros = {executor.submit(_executaBloco, bloco): inicio for inicio, bloco in blocos}
+        pendentes = set(futuros)
+        while pendentes:
+            if cancelar is not None and cancelar.is_set():
+                break
+            prontos, pendentes = concurrent.futures.wait(pendentes, timeout = 0.5,
+                                                         return_when = concurrent.futures.FIRST_COMPLETED)
+            for futuro in prontos:
+                guarda(futuros[futuro], futuro.result())
+    except KeyboardInterrupt:
+        interrompido = True
+    finally:
+        #cancela o que não começou; depois de um KeyboardInterrupt não espera os blocos em execução
+        executor.shutdown(wait = not interrompido, cancel_futures = True)
+
+    return tabela
+
+#%%
+################################################################################################